@@ -0,0 +1,165 @@
+"""
+Black level and contrast ratio from stacked frames.
+
+A single 8-bit frame of a black patch is mostly sensor noise, so the ROI is
+stacked over many frames: each frame is read into one reusable buffer,
+linearized with cv2.LUT into a second one and summed with cv2.accumulate
+into a float32 accumulator. Nothing is allocated per frame, so long stacks
+only cost capture time. An optional dark frame (lens covered) removes the
+sensor's own offset and fixed-pattern noise.
+"""
+import os
+import time
+import cv2
+import numpy as np
+from color_math import SRGB_TO_XYZ, srgb_to_linear
+from camera_response import CameraResponse
+
+
+class FrameStacker:
+    """Running sum of linearized ROIs (float32) plus per-frame luminance statistics."""
+    def __init__(self, roi_shape, lut_bgr):
+        self.lut = np.ascontiguousarray(lut_bgr, dtype=np.float32).reshape(1, 256, 3)
+        self.linear = np.empty(roi_shape, np.float32)
+        self.acc = np.zeros(roi_shape, np.float32)
+        self._y_weights = SRGB_TO_XYZ[1][::-1]  # BGR
+        self.reset()
+
+    def reset(self):
+        self.acc[:] = 0
+        self.count = 0
+        self._y_sum = 0.0
+        self._y_sq = 0.0
+
+    def add(self, roi):
+        cv2.LUT(roi, self.lut, dst=self.linear)
+        cv2.accumulate(self.linear, self.acc)
+        y = float(np.dot(cv2.mean(self.linear)[:3], self._y_weights))
+        self._y_sum += y
+        self._y_sq += y * y
+        self.count += 1
+
+    def mean_image(self):
+        """Per-pixel mean, linear BGR."""
+        return self.acc / max(self.count, 1)
+
+    def luminance_stderr(self):
+        """Standard error of the stacked mean luminance, from the frame-to-frame spread."""
+        if self.count < 2:
+            return float("inf")
+        mean = self._y_sum / self.count
+        var = max(self._y_sq / self.count - mean * mean, 0.0) * self.count / (self.count - 1)
+        return float(np.sqrt(var / self.count))
+
+
+def camera_lut_bgr(camera):
+    """256 x 3 (BGR) code value -> linear light table of the camera (response, else sRGB)."""
+    if camera.response is not None:
+        return camera.response._lut_bgr
+    return np.repeat(srgb_to_linear(np.arange(256) / 255.0)[:, None], 3, axis=1).astype(np.float32)
+
+
+def stack_roi(camera, frames, region_size=100, stacker=None):
+    """Stacks `frames` frames of the centre ROI. Returns the FrameStacker (None without frames)."""
+    first = camera.get_frame()
+    if first is None:
+        return None
+    buffer = np.empty_like(first)
+    roi = camera.center_roi(buffer, region_size)  # a view: refreshed by every read_into
+    if stacker is None:
+        stacker = FrameStacker(roi.shape, camera_lut_bgr(camera))
+    for _ in range(frames):
+        if not camera.read_into(buffer):
+            break
+        stacker.add(roi)
+    return stacker if stacker.count else None
+
+
+def dark_frame_path(camera_name, resolution):
+    # .npy: np.save appends it to any other extension, which load_dark_frame would then miss
+    directory, name = os.path.split(CameraResponse.cache_path(camera_name, resolution))
+    return os.path.join(directory, "dark_" + os.path.splitext(name)[0] + ".npy")
+
+
+def capture_dark_frame(camera, frames=128, region_size=100, save=True):
+    """Mean linear ROI with the lens covered. Cached per camera + resolution."""
+    stacker = stack_roi(camera, frames, region_size)
+    if stacker is None:
+        return None
+    dark = stacker.mean_image()
+    if save:
+        path = dark_frame_path(camera.camera_name, camera.get_resolution())
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.save(path, dark)
+        print(f"Dark frame disimpan: {path}")
+    return dark
+
+
+def load_dark_frame(camera, region_size=100):
+    path = dark_frame_path(camera.camera_name, camera.get_resolution())
+    if not os.path.exists(path):
+        return None
+    dark = np.load(path)
+    return dark if dark.shape[:2] == (region_size, region_size) else None
+
+
+def measure_black_level(camera, show_patch, black_frames=128, white_frames=16, region_size=100,
+                        settle=1.0, dark=None):
+    """
+    Stacks white and black patches and returns a dict with the black level relative
+    to white (per channel and as luminance), the contrast ratio and its noise floor.
+    `dark` is an optional dark frame from capture_dark_frame (same ROI size).
+    The black stack needs at least 2 frames for its noise floor; a black whose
+    floor is unknown is reported as unresolved (contrast_ratio None).
+    """
+    black_frames = max(black_frames, 2)
+    results = {}
+    for name, rgb, frames in (("white", (255, 255, 255), white_frames), ("black", (0, 0, 0), black_frames)):
+        show_patch(rgb)
+        time.sleep(settle)
+        t0 = time.perf_counter()
+        stacker = stack_roi(camera, frames, region_size)
+        if stacker is None:
+            return None
+        image = stacker.mean_image()
+        if dark is not None and dark.shape == image.shape:
+            image -= dark
+        b, g, r = image.reshape(-1, 3).mean(axis=0)
+        results[name] = (np.array([r, g, b]), stacker.luminance_stderr(), stacker.count)
+        print(f"Stack {name}: {stacker.count} frame dalam {time.perf_counter() - t0:.2f}s")
+
+    white, _, _ = results["white"]
+    black, black_err, count = results["black"]
+    y_white = float(SRGB_TO_XYZ[1] @ white)
+    y_black = float(SRGB_TO_XYZ[1] @ black)
+    if y_white <= 0:
+        return None
+    # A black indistinguishable from the noise floor only bounds the contrast from below
+    resolved = y_black > 2 * black_err
+    floor = max(y_black, 2 * black_err)
+    return {
+        "black_rgb": tuple(float(v) for v in np.clip(black / np.maximum(white, 1e-9), 0, None)),
+        "black_relative": y_black / y_white,
+        "contrast_ratio": y_white / floor if 0 < floor < np.inf else None,
+        "contrast_is_lower_bound": not resolved,
+        "black_stderr": black_err / y_white,
+        "frames": count,
+        "dark_subtracted": dark is not None,
+    }
+
+
+if __name__ == "__main__":
+    from camera_handler import CameraHandler
+    from camera_simulator import SimulatedCamera, SimulatedCapture, SimulatedDisplay
+
+    sim = SimulatedCapture(SimulatedDisplay(black_level=0.001, response_time=0.0),
+                           SimulatedCamera(noise_sigma=2.0, latency=0.0))
+    handler = CameraHandler(backend=sim)
+    handler.start()
+    for frames in (2, 32, 256):
+        result = measure_black_level(handler, handler.set_displayed_patch, black_frames=frames, settle=0.0)
+        bound = ">" if result["contrast_is_lower_bound"] else ""
+        contrast = f"{bound}{result['contrast_ratio']:.0f}:1" if result["contrast_ratio"] else "tidak terukur"
+        print(f"  {frames:3d} frame: black {result['black_relative'] * 100:.3f}% "
+              f"(+- {result['black_stderr'] * 100:.3f}%), kontras {contrast}")
+    print("Ground truth: black 0.100%, kontras 1000:1")
@@ -0,0 +1,70 @@
+"""
+Bootstrap confidence intervals for the calibration fit, all resamples at once.
+
+A resample is represented by its per-sample counts (B, N) instead of copied
+data: weighted normal equations of every resample are then one matrix product
+against the precomputed per-sample outer products, and all B systems go
+through a single batched np.linalg.solve.
+"""
+import numpy as np
+
+
+def bootstrap_counts(n, resamples=1000, rng=None):
+    """(B, n) counts: how often each sample is drawn in each resample."""
+    rng = np.random.default_rng() if rng is None else rng
+    draws = rng.integers(0, n, (resamples, n)) + (np.arange(resamples) * n)[:, None]
+    return np.bincount(draws.ravel(), minlength=resamples * n).reshape(resamples, n).astype(float)
+
+
+def bootstrap_lstsq(F, Y, counts, weights=None, ridge=1e-9):
+    """
+    Weighted least squares Y ~ F @ C for every resample. F (N, P), Y (N, Q),
+    counts (B, N), weights (N,) fixed per-sample weights (e.g. a robust fit's).
+    Returns (B, P, Q).
+    """
+    n, p = F.shape
+    c = counts if weights is None else counts * weights[None, :]
+    outer = (F[:, :, None] * F[:, None, :]).reshape(n, p * p)
+    gram = (c @ outer).reshape(-1, p, p)
+    cross = (c @ (F[:, :, None] * Y[:, None, :]).reshape(n, -1)).reshape(-1, p, Y.shape[1])
+    lam = ridge * np.trace(gram, axis1=1, axis2=2)[:, None, None] / p
+    return np.linalg.solve(gram + lam * np.eye(p), cross)
+
+
+def bootstrap_slope(x, y, counts):
+    """Ordinary least-squares slope of y on x (with intercept) per resample. Returns (B,)."""
+    s = counts.sum(axis=1)
+    sx, sy = counts @ x, counts @ y
+    sxx, sxy = counts @ (x * x), counts @ (x * y)
+    denom = s * sxx - sx * sx
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(denom > 0, (s * sxy - sx * sy) / denom, np.nan)
+
+
+def weighted_means(values, counts):
+    """Mean of per-sample `values` (N,) or (B, N) under each resample's counts."""
+    return (counts * values).sum(axis=1) / counts.sum(axis=1)
+
+
+def interval(samples, level=0.95, axis=0):
+    """Percentile interval (low, high), NaNs (degenerate resamples) ignored."""
+    tail = (1.0 - level) / 2 * 100
+    return tuple(np.nanpercentile(samples, [tail, 100 - tail], axis=axis))
+
+
+if __name__ == "__main__":
+    import time
+    rng = np.random.default_rng(0)
+    n = 63
+    true = np.array([[1.1, -0.05, 0.0], [-0.08, 1.05, -0.04], [0.02, -0.06, 1.12]])
+    X = rng.random((n, 3))
+    Y = X @ true + rng.normal(0, 0.01, (n, 3))
+
+    t0 = time.perf_counter()
+    counts = bootstrap_counts(n, 1000, rng)
+    coefs = bootstrap_lstsq(X, Y, counts)
+    low, high = interval(coefs)
+    ms = (time.perf_counter() - t0) * 1000
+    inside = np.mean((low <= true) & (true <= high))
+    print(f"1000 resample x {n} sampel: {ms:.1f} ms, {inside:.0%} koefisien dalam interval 95%")
+    print(f"Lebar interval rata-rata: {np.mean(high - low):.4f}")
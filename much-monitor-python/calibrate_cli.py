@@ -0,0 +1,168 @@
+"""
+Headless calibration: the run_sequence of the GUI without the GUI.
+
+    python -m calibrate_cli --simulate --icc out/profile.icc --report out/report.json
+    python -m calibrate_cli --camera 0 --display tk --patches grid:9 --wp D50 --gamma 2.4
+    python -m calibrate_cli --camera 0 --display tk --record run.mmsess
+    python -m calibrate_cli --replay run.mmsess --camera-name "iPhone Camera"
+
+Runs the app's calibration sequence (calibration_runner: camera response,
+flicker, black level, gamma seed, journaled patches, outlier re-measure,
+held-out verification) with a patch_display display instead of the window,
+and writes the ICC profile, a .ti3 and a JSON report with the metrics and the
+time of every stage. Exit status is 0 when a profile was produced.
+"""
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from calibration_history import json_default, main_display_id
+from calibration_runner import CalibrationRunner, DisplayUI
+from camera_handler import CameraHandler
+from patch_display import DISPLAYS
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m calibrate_cli", description="Headless Much Monitor calibration")
+    source = parser.add_argument_group("camera and display")
+    source.add_argument("--simulate", action="store_true", help="simulated display + camera (CI)")
+    source.add_argument("--seed", type=int, default=0, help="simulator noise seed")
+    source.add_argument("--replay", default=None, metavar="PATH",
+                        help="camera frames from a recorded session (.mmsess) instead of a camera; "
+                             "give the recorded camera's --camera-name to use its cached response")
+    source.add_argument("--camera", type=int, default=0, help="camera index")
+    source.add_argument("--camera-name", default=None)
+    source.add_argument("--display", choices=sorted(DISPLAYS), default=None,
+                        help="patch display (default: null with --simulate/--replay, else tk)")
+    source.add_argument("--display-id", default=None,
+                        help="display id in the history (default: main display, \"simulator\" with --simulate, "
+                             "\"replay\" with --replay)")
+    run = parser.add_argument_group("run")
+    run.add_argument("--patches", default="fixed", help='"adaptive", "fixed" or a patch set (gray:N, grid:N, .ti1, .csv)')
+    run.add_argument("--wp", default="D65", choices=["D65", "D50"], help="target white point")
+    run.add_argument("--gamma", type=float, default=2.2, help="target gamma")
+    run.add_argument("--no-gamma-seed", action="store_true", help="skip the Lagom gamma capture")
+    run.add_argument("--no-verify", action="store_true", help="skip the held-out verification")
+    run.add_argument("--dark-frame", action="store_true",
+                     help="record a new dark frame first (asks to cover the lens; not with --simulate)")
+    run.add_argument("--resume", action="store_true",
+                     help="continue the last unfinished run of this camera and patch set (its journal)")
+    out = parser.add_argument_group("output")
+    out.add_argument("--icc", default=None, help="ICC profile path (default: calibration_output/profile_<ts>.icc)")
+    out.add_argument("--ti3", default=None, help="measurements as CGATS .ti3")
+    out.add_argument("--report", default=None, help="JSON report path (default: stdout)")
+    out.add_argument("--history", action="store_true", help="also record the session in the calibration history")
+    out.add_argument("--record", default=None, metavar="PATH",
+                     help="record every camera frame and the patch on screen (.mmsess, for --replay)")
+    args = parser.parse_args(argv)
+    if args.simulate and args.replay:
+        parser.error("--simulate and --replay are two different cameras")
+    if args.dark_frame and (args.simulate or args.replay):
+        parser.error("--dark-frame needs a real camera")
+    if args.record and args.replay:
+        parser.error("--record of a --replay would only copy the recording")
+    return args
+
+
+def make_camera(args):
+    if args.simulate:
+        from camera_simulator import SimulatedCapture
+        return CameraHandler(camera_index=0, mock_mode=True, backend=SimulatedCapture(seed=args.seed),
+                             camera_name=args.camera_name or "Simulator")
+    if args.replay:
+        from session_recorder import SessionReplay
+        # With the recorded camera's name its cached response is used as in the original run.
+        # Realtime: flicker bursts and settle polling read for a time, not a frame count
+        return CameraHandler(camera_index=0, mock_mode=True, backend=SessionReplay(args.replay, realtime=True),
+                             camera_name=args.camera_name or "Replay")
+    return CameraHandler(camera_index=args.camera, camera_name=args.camera_name)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Progress (including the modules' own prints) goes to stderr, the report to stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        report = calibrate(args)
+    text = json.dumps(report, indent=2, default=json_default)
+    if args.report:
+        with open(args.report, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0 if report["ok"] else 1
+
+
+def calibrate(args):
+    """Runs a calibration as configured by parse_args; returns the report dict."""
+    if not (args.simulate or (args.replay and not args.camera_name)):
+        return _calibrate(args)
+    # The simulated (or unnamed replayed) camera's response and dark frame must
+    # not come from or land in the real camera cache
+    import camera_response
+    real_cache = camera_response.CACHE_DIR
+    camera_response.CACHE_DIR = tempfile.mkdtemp(prefix="much_monitor_sim_")
+    try:
+        return _calibrate(args)
+    finally:
+        shutil.rmtree(camera_response.CACHE_DIR, ignore_errors=True)
+        camera_response.CACHE_DIR = real_cache
+
+
+def _calibrate(args):
+    camera = make_camera(args)
+    if not camera.start():
+        print("Gagal membuka kamera.")
+        return {"ok": False, "camera": camera.camera_name, "error": "camera"}
+    if args.record:
+        if os.path.dirname(args.record):
+            os.makedirs(os.path.dirname(args.record), exist_ok=True)
+        camera.start_recording(args.record)
+    display = DISPLAYS[args.display or ("null" if args.simulate or args.replay else "tk")](camera)
+    t0 = time.perf_counter()
+    try:
+        run = CalibrationRunner(camera, DisplayUI(display), patches=args.patches, verify=not args.no_verify,
+                                gamma_seed=not args.no_gamma_seed, dark_frame=args.dark_frame, resume=args.resume)
+        ok = run.run()
+    finally:
+        display.close()
+        camera.stop()
+
+    logic = run.logic
+    icc = args.icc or os.path.join("calibration_output", f"profile_{time.strftime('%Y%m%d_%H%M%S')}.icc")
+    if ok:
+        if os.path.dirname(icc):
+            os.makedirs(os.path.dirname(icc), exist_ok=True)
+        metrics = logic.get_performance_metrics(wp_target=args.wp, gamma_target=args.gamma)
+        ok = logic.generate_basic_icc(icc, wp_target=args.wp, gamma_target=args.gamma)
+        if args.ti3:
+            logic.export_ti3(args.ti3)
+        if args.history:
+            from calibration_history import CalibrationHistory
+            with CalibrationHistory() as history:
+                display_id = args.display_id
+                if display_id is None:
+                    display_id = "simulator" if args.simulate else "replay" if args.replay else main_display_id()
+                history.record_session(logic, metrics, display_id, camera.camera_name, profile_path=icc if ok else None)
+    else:
+        metrics = None
+
+    return {
+        "ok": bool(ok),
+        "camera": camera.camera_name,
+        "patches": args.patches,
+        "samples": len(logic.results),
+        "targets": {"wp": args.wp, "gamma": args.gamma},
+        "outputs": {"icc": icc if ok else None, "ti3": args.ti3, "journal": run.info.get("journal"),
+                    "measurements": run.info.get("measurements"), "recording": args.record},
+        "timings": dict(run.timings, total=time.perf_counter() - t0),
+        "info": run.info,
+        "metrics": metrics,
+    }
+
+
+if __name__ == "__main__":
+    sys.exit(main())
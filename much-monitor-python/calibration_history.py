@@ -0,0 +1,317 @@
+"""
+Calibration history: every session and its patches in a local SQLite file.
+
+One row per session (display, camera, targets, measured white point, gamma
+and delta E, CCM model and parameters, the full metrics as JSON) and one row
+per patch (target and captured RGB). Sessions are indexed by display, camera
+and date.
+
+drift_report() fits a linear trend per display to white point (CIE u'v'),
+gamma and delta E of the sessions since its last calibration (later drift
+checks add points). All displays are fitted at once: the sessions are sorted
+by display and the regression sums of every group come from one
+np.add.reduceat. A display is due for recalibration when its calibration is
+too old or the trend's value now has moved past a threshold.
+"""
+import json
+import os
+import sqlite3
+import time
+import numpy as np
+from calibration_logic import GRADE_LIMITS
+
+DEFAULT_PATH = os.path.join(os.getcwd(), "calibration_output", "history.sqlite")
+DAY = 86400.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    display TEXT NOT NULL,
+    camera TEXT NOT NULL,
+    kind TEXT NOT NULL DEFAULT 'calibration',
+    wp_target TEXT,
+    gamma_target REAL,
+    white_x REAL,
+    white_y REAL,
+    gamma REAL,
+    delta_e REAL,
+    delta_e_source TEXT,
+    delta_e_raw REAL,
+    contrast REAL,
+    linear_capture INTEGER,
+    camera_response TEXT,
+    grade TEXT,
+    ccm_model TEXT,
+    ccm_method TEXT,
+    ccm TEXT,
+    profile_path TEXT,
+    metrics TEXT
+);
+CREATE TABLE IF NOT EXISTS patches (
+    session_id INTEGER NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    idx INTEGER NOT NULL,
+    target_r INTEGER, target_g INTEGER, target_b INTEGER,
+    captured_r REAL, captured_g REAL, captured_b REAL,
+    PRIMARY KEY (session_id, idx)
+);
+CREATE INDEX IF NOT EXISTS sessions_display ON sessions(display, created);
+CREATE INDEX IF NOT EXISTS sessions_camera ON sessions(camera, created);
+CREATE INDEX IF NOT EXISTS sessions_created ON sessions(created);
+"""
+
+# Columns added after the first release: (name, declaration), added to older files on open
+ADDED_COLUMNS = (("delta_e_source", "TEXT"), ("linear_capture", "INTEGER"), ("camera_response", "TEXT"))
+
+# Series fitted by drift_report, in column order
+TREND_FIELDS = ("white_u", "white_v", "gamma", "delta_e")
+
+
+def json_default(value):
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    return str(value)
+
+
+def main_display_id():
+    """History id of the main display (CGMainDisplayID), "main" where Quartz is not available."""
+    try:
+        from profile_manager import ProfileManager
+        return str(ProfileManager.get_main_display_id())
+    except Exception:
+        return "main"
+
+
+def xy_to_uv(x, y):
+    """CIE 1976 u'v' from xy (vectorized); distances in u'v' are roughly perceptual."""
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    d = -2 * x + 12 * y + 3
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return 4 * x / d, 9 * y / d
+
+
+def group_trends(groups, t, values):
+    """
+    Least-squares line per group. groups (N,) sorted, t (N,), values (N, K) with
+    NaN for missing. Returns (keys, counts (G,), slope (G, K), intercept (G, K)).
+    """
+    keys, starts, counts = np.unique(groups, return_index=True, return_counts=True)
+    m = ~np.isnan(values)
+    v = np.where(m, values, 0.0)
+    tc = t[:, None] * m
+    sums = np.add.reduceat(np.concatenate([m, tc, tc * t[:, None], v, tc * v], axis=1), starts, axis=0)
+    n, st, stt, sv, stv = np.split(sums, 5, axis=1)
+    denom = n * stt - st * st
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = np.where(denom > 1e-12, (n * stv - st * sv) / denom, 0.0)
+        intercept = np.where(n > 0, (sv - slope * st) / n, np.nan)
+    return keys, counts, slope, intercept
+
+
+class CalibrationHistory:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.db.executescript(SCHEMA)
+        columns = set(r["name"] for r in self.db.execute("PRAGMA table_info(sessions)"))
+        with self.db:
+            for name, declaration in ADDED_COLUMNS:
+                if name not in columns:
+                    self.db.execute(f"ALTER TABLE sessions ADD COLUMN {name} {declaration}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    def record_session(self, logic, metrics, display, camera, kind="calibration", profile_path=None, created=None):
+        """
+        Stores a finished session of `logic` with its metrics. Returns the session id.
+        delta_e is the error behind the grade (metrics["delta_e"]: verification
+        when it ran), tagged with its source; older metrics fall back to training.
+        The capture encoding (logic.linear_capture, logic.response_id) is kept so
+        the captures can be read back the way they were taken.
+        """
+        white = logic.measured_white_xy() or (None, None)
+        fit = logic.ccm_fit
+        with self.db:
+            cur = self.db.execute(
+                "INSERT INTO sessions (created, display, camera, kind, wp_target, gamma_target, white_x, white_y, "
+                "gamma, delta_e, delta_e_source, delta_e_raw, contrast, linear_capture, camera_response, grade, "
+                "ccm_model, ccm_method, ccm, profile_path, metrics) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time() if created is None else created, str(display), str(camera), kind,
+                 metrics.get("wp_target"), metrics.get("gamma_target"), white[0], white[1],
+                 logic.measured_gamma(), metrics.get("delta_e", metrics.get("avg_corrected")),
+                 metrics.get("delta_e_source", "check" if kind == "check" else "training"), metrics.get("avg_raw"),
+                 metrics.get("contrast_ratio"), int(bool(logic.linear_capture)), logic.response_id,
+                 metrics.get("grade"),
+                 fit.model if fit else None, fit.method if fit else None,
+                 json.dumps(fit.ccm.tolist()) if fit else None, profile_path,
+                 json.dumps(metrics, default=json_default)))
+            session_id = cur.lastrowid
+            self.db.executemany(
+                "INSERT INTO patches VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                ((session_id, i, *(int(v) for v in r['target']), *(float(v) for v in r['captured']))
+                 for i, r in enumerate(logic.results)))
+        return session_id
+
+    def set_profile(self, session_id, profile_path):
+        with self.db:
+            self.db.execute("UPDATE sessions SET profile_path = ? WHERE id = ?", (profile_path, session_id))
+
+    def sessions(self, display=None, camera=None, since=None, until=None, kind=None):
+        """Session rows (sqlite3.Row, newest first) matching all given filters."""
+        where, args = [], []
+        for column, value in (("display", display), ("camera", camera), ("kind", kind)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                args.append(value)
+        if since is not None:
+            where.append("created >= ?")
+            args.append(since)
+        if until is not None:
+            where.append("created < ?")
+            args.append(until)
+        sql = "SELECT * FROM sessions" + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY created DESC"
+        return self.db.execute(sql, args).fetchall()
+
+    def patches(self, session_id):
+        """(targets (N, 3) int, captured (N, 3) float) of one session."""
+        rows = self.db.execute(
+            "SELECT target_r, target_g, target_b, captured_r, captured_g, captured_b FROM patches "
+            "WHERE session_id = ? ORDER BY idx", (session_id,)).fetchall()
+        data = np.array(rows, dtype=float).reshape(-1, 6)
+        return data[:, :3].astype(int), data[:, 3:]
+
+    def series(self, display=None, since=None):
+        """
+        Column arrays (display, kind, delta_e_source, created, white_x, white_y,
+        gamma, delta_e) of all sessions, sorted by display then date. Missing
+        values are NaN.
+        """
+        sql = "SELECT display, kind, delta_e_source, created, white_x, white_y, gamma, delta_e FROM sessions"
+        where, args = [], []
+        if display is not None:
+            where.append("display = ?")
+            args.append(display)
+        if since is not None:
+            where.append("created >= ?")
+            args.append(since)
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        rows = self.db.execute(sql + " ORDER BY display, created", args).fetchall()
+        values = np.array([tuple(r)[3:] for r in rows], dtype=float).reshape(-1, 5)
+        names = ("created", "white_x", "white_y", "gamma", "delta_e")
+        return dict(display=np.array([r[0] for r in rows], dtype=str), kind=np.array([r[1] for r in rows], dtype=str),
+                    delta_e_source=np.array([r[2] or "training" for r in rows], dtype=str),
+                    **{n: values[:, i] for i, n in enumerate(names)})
+
+    def drift_report(self, now=None, since=None, max_age_days=30.0, max_white_shift=0.004,
+                     max_gamma_shift=0.1, max_delta_e=GRADE_LIMITS[0]):
+        """
+        Per display: sessions since the last calibration, trend slopes per day,
+        the white point (u'v') and gamma drift from that calibration to the
+        trend's value now, the trend's delta E now, and whether (and why)
+        recalibration is due. Checks (kind != 'calibration') only add trend points.
+        The delta E trend only uses drift checks (training or verification error of
+        a calibration is a different quantity); without checks delta_e_now is the
+        calibration's own delta E.
+        """
+        now = time.time() if now is None else now
+        data = self.series(since=since)
+        n_rows = len(data["created"])
+        if not n_rows:
+            return []
+        u, v = xy_to_uv(data["white_x"], data["white_y"])
+        values = np.stack([u, v, data["gamma"], data["delta_e"]], axis=1)
+        keys, starts = np.unique(data["display"], return_index=True)
+        group = np.repeat(np.arange(len(keys)), np.diff(np.append(starts, n_rows)))
+        # Reference: the last calibration of each display (its first session if none)
+        rows = np.arange(n_rows)
+        ref = np.maximum.reduceat(np.where(data["kind"] == "calibration", rows, -1), starts)
+        ref = np.where(ref < 0, starts, ref)
+        current = rows >= ref[group]
+        ref_values = values[ref]
+        values = np.where(current[:, None], values, np.nan)
+        values[:, 3] = np.where(data["delta_e_source"] == "check", values[:, 3], np.nan)
+        # Days relative to now: the intercept is the trend's value now
+        days = (data["created"] - now) / DAY
+        _, counts, slope, now_values = group_trends(data["display"], days, values)
+        counts = np.add.reduceat(current.astype(int), starts)
+        age = -days[ref]
+        white_shift = np.hypot(*(now_values[:, :2] - ref_values[:, :2]).T)
+        gamma_shift = np.abs(now_values[:, 2] - ref_values[:, 2])
+        delta_e_now = np.where(np.isnan(now_values[:, 3]), ref_values[:, 3], now_values[:, 3])
+
+        report = []
+        for g, display in enumerate(keys):
+            reasons = []
+            if age[g] > max_age_days:
+                reasons.append(f"last calibration {age[g]:.0f} days ago")
+            if white_shift[g] > max_white_shift:
+                reasons.append(f"white point drift du'v' {white_shift[g]:.4f}")
+            if gamma_shift[g] > max_gamma_shift:
+                reasons.append(f"gamma drift {gamma_shift[g]:.2f}")
+            if delta_e_now[g] > max_delta_e:
+                reasons.append(f"expected error {delta_e_now[g]:.2f}")
+            report.append({
+                "display": str(display),
+                "sessions": int(counts[g]),
+                "age_days": float(age[g]),
+                "slope_per_day": dict(zip(TREND_FIELDS, slope[g].tolist())),
+                "white_shift": float(np.nan_to_num(white_shift[g])),
+                "gamma_shift": float(np.nan_to_num(gamma_shift[g])),
+                "delta_e_now": float(delta_e_now[g]),
+                "due": bool(reasons),
+                "reasons": reasons,
+            })
+        return report
+
+    def recalibration_due(self, display, **limits):
+        """(due, reasons) for one display; due with no history at all."""
+        for entry in self.drift_report(**limits):
+            if entry["display"] == display:
+                return entry["due"], entry["reasons"]
+        return True, ["no calibration recorded"]
+
+
+if __name__ == "__main__":
+    import tempfile
+    from calibration_logic import CalibrationLogic
+    from color_math import srgb_to_linear, linear_to_srgb
+
+    rng = np.random.default_rng(0)
+    path = os.path.join(tempfile.mkdtemp(), "history.sqlite")
+    history = CalibrationHistory(path)
+    now = time.time()
+    patches = [(v, v, v) for v in range(0, 256, 17)] + [(255, 0, 0), (0, 255, 0), (0, 0, 255)]
+    t0 = time.perf_counter()
+    for display in range(20):
+        drift = 0.002 * display  # blue channel loss per session
+        for s in range(15):
+            logic = CalibrationLogic()
+            gain = np.array([1.0, 1.0, 1.0 - drift * s])
+            for rgb in patches:
+                linear = srgb_to_linear(np.array(rgb) / 255.0) * gain
+                logic.record_sample(rgb, tuple(linear_to_srgb(linear) * 255 + rng.normal(0, 0.3, 3)))
+            metrics = {"avg_corrected": 1.0 + 0.05 * display * s / 15, "avg_raw": 5.0, "grade": "A",
+                       "wp_target": "D65", "gamma_target": 2.2}
+            history.record_session(logic, metrics, f"display-{display:02d}", "Simulator",
+                                   kind="calibration" if s == 0 else "check", created=now - (15 - s) * 7 * DAY)
+    write_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    report = history.drift_report(now=now, max_age_days=120)
+    ms = (time.perf_counter() - t0) * 1000
+    due = [r["display"] for r in report if r["due"]]
+    print(f"{len(history.sessions())} sesi disimpan ({write_s:.1f} s), laporan drift {len(report)} layar: {ms:.1f} ms")
+    print(f"Perlu kalibrasi ulang: {due}")
+    print(report[-1]["reasons"])
@@ -1,11 +1,54 @@
 import math
 import numpy as np
 from simple_icc import SimpleICCGenerator
+from color_fitting import fit_ccm, apply_fit, select_model, expand_features
+from color_math import srgb_to_linear, linear_to_srgb, SRGB_TO_XYZ
+from cgats import Ti3Writer, read_cgats
+import bootstrap
+
+# Upper average-error bounds of grades A, B and C
+GRADE_LIMITS = (2, 4, 8)
+
+# (grade, description) below each limit, then above the last
+GRADES = [
+    ("Professional (Grade A)", "Akurasi warna luar biasa, siap untuk grading profesional."),
+    ("Excellent (Grade B)", "Sangat baik untuk desain grafis dan edit foto."),
+    ("Fair (Grade C)", "Cukup untuk penggunaan umum, namun ada sedikit pergeseran warna."),
+    ("Needs Recalibration", "Akurasi rendah. Cek pencahayaan ruangan atau posisi kamera."),
+]
+
+
+def grade_for(avg_error):
+    """(grade, description) of an average error (Average Delta-E < 2 is Pro)."""
+    return GRADES[sum(avg_error >= limit for limit in GRADE_LIMITS)]
 
 class CalibrationLogic:
     def __init__(self):
         self.results = []
         self.ccm = None
+        # True when captured values are already linear light (camera response applied)
+        self.linear_capture = False
+        # CameraResponse.fingerprint() of the response that linearized the captures
+        self.response_id = None
+        # Camera linear RGB -> XYZ. Nothing characterizes it yet: the camera is
+        # assumed to have sRGB primaries, so derived XYZ is nominal, not colorimetric
+        self.camera_to_xyz = SRGB_TO_XYZ
+        # Gamma from one capture of the Lagom pattern (gamma_estimation), if measured
+        self.gamma_seed = None
+        # Stacked black/white measurement (black_level.measure_black_level), if measured
+        self.black_level = None
+        # CCM solver: "lstsq", "huber" or "ransac" (color_fitting); robust fits flag bad samples
+        self.ccm_method = "huber"
+        # Correction model (color_fitting.MODELS) or "auto" for k-fold cross-validated selection
+        self.ccm_model = "auto"
+        self.ccm_scores = {}
+        self.ccm_fit = None
+        # measurement_journal.MeasurementJournal receiving every sample, if any
+        self.journal = None
+        # Held-out verification (verification.SequentialVerifier.result()), if run
+        self.verification = None
+        # (fit key, gamut metrics, confidence intervals) of the last metrics call
+        self._metrics_cache = None
 
     def record_sample(self, target_rgb, captured_rgb):
         """Menyimpan data sampel untuk analisis."""
@@ -13,6 +56,8 @@ class CalibrationLogic:
             'target': target_rgb,
             'captured': captured_rgb
         })
+        if self.journal is not None:
+            self.journal.record_sample(target_rgb, captured_rgb)
 
     def calculate_delta_e(self, color1, color2):
         """Kalkulasi jarak warna sederhana (Euclidean distance di ruang RGB)."""
@@ -21,23 +66,194 @@ class CalibrationLogic:
         b_diff = color1[2] - color2[2]
         return math.sqrt(r_diff**2 + g_diff**2 + b_diff**2)
 
-    def compute_ccm(self):
+    def captured_linear(self, captured):
+        """Captured camera RGB (0-255) -> linear light (0-1), vectorized."""
+        captured = np.asarray(captured, dtype=float) / 255.0
+        if self.linear_capture:
+            return captured
+        # Without a characterized camera, assume its nominal sRGB encoding
+        return srgb_to_linear(captured)
+
+    def captured_xyz(self, captured, white_cap=None):
+        """
+        Nominal XYZ of one or more captures (camera RGB taken as sRGB primaries),
+        scaled so that the white capture has Y = 100 (without a white, linear
+        1.0 -> Y = 100). Use the same `white_cap` for every row of one file.
+        """
+        xyz = self.captured_linear(captured) @ np.asarray(self.camera_to_xyz).T
+        y_white = 1.0
+        if white_cap is not None:
+            y_white = float(self.captured_linear(white_cap) @ np.asarray(self.camera_to_xyz)[1])
+        return 100.0 * xyz / (y_white if y_white > 0 else 1.0)
+
+    def white_capture(self):
+        return next((r['captured'] for r in self.results if r['target'] == (255, 255, 255)), None)
+
+    def captured_encoded(self, captured):
+        """Captured camera RGB in encoded 0-255 units, for comparison with targets."""
+        if not self.linear_capture:
+            return np.asarray(captured, dtype=float)
+        return linear_to_srgb(np.asarray(captured, dtype=float) / 255.0) * 255.0
+
+    def compute_ccm(self, method=None, model=None):
         """
-        Calculates a 3x3 Color Correction Matrix (CCM) using least squares.
-        TargetColors = CapturedColors * CCM
+        Calculates the Color Correction Matrix (CCM) in linear light:
+        linear(Target) = features(linear(Captured)) * CCM, 3x3 for the "linear"
+        model. `method`/`model` override self.ccm_method/self.ccm_model; the full
+        fit (weights, outliers, model) is kept in self.ccm_fit.
         """
         if len(self.results) < 3:
             return None
         
         # Prepare matrices
-        captured_mat = np.array([r['captured'] for r in self.results], dtype=float)
-        target_mat = np.array([r['target'] for r in self.results], dtype=float)
+        captured_mat = self.captured_linear([r['captured'] for r in self.results])
+        target_mat = srgb_to_linear(np.array([r['target'] for r in self.results], dtype=float) / 255.0)
         
-        # Add column of ones for offset if needed, but for color we usually stick to 3x3
-        # Use pseudo-inverse for least squares
-        self.ccm, residuals, rank, s = np.linalg.lstsq(captured_mat, target_mat, rcond=None)
+        method = method or self.ccm_method
+        model = model or self.ccm_model
+        if model == "auto":
+            self.ccm_fit, self.ccm_scores = select_model(captured_mat, target_mat, method)
+        else:
+            self.ccm_fit, self.ccm_scores = fit_ccm(captured_mat, target_mat, method, model), {}
+        if self.ccm_fit is None:
+            # Too few samples for the richer models: fall back to the plain 3x3
+            self.ccm_fit = fit_ccm(captured_mat, target_mat, method)
+        self.ccm = self.ccm_fit.ccm
         return self.ccm
 
+    def outlier_samples(self):
+        """Indices and targets of the samples the last CCM fit flagged as outliers (to re-measure)."""
+        if self.ccm_fit is None:
+            return []
+        return [(int(i), self.results[i]['target']) for i in self.ccm_fit.outliers]
+
+    def replace_sample(self, index, captured_rgb):
+        """Replaces the capture of a re-measured sample; the CCM must be recomputed."""
+        self.results[index]['captured'] = captured_rgb
+        self.ccm_fit = None
+        if self.journal is not None:
+            self.journal.replace_sample(index, captured_rgb)
+
+    def apply_ccm(self, captured):
+        """Corrected display RGB (encoded 0-255) for one or more captured colours."""
+        linear = apply_fit(self.ccm_fit, self.captured_linear(captured))
+        if np.ndim(captured) == 1:
+            linear = linear[0]
+        return linear_to_srgb(linear) * 255.0
+
+    def gamma_regression_data(self, white_cap=None):
+        """
+        (log x, log y) of the grayscale samples for the gamma regression: fit
+        y = x^gamma, x the target ratio and y the measured ratio to white.
+        """
+        if white_cap is None:
+            white_cap = next((r['captured'] for r in self.results if r['target'] == (255, 255, 255)), (255, 255, 255))
+        gray_samples = [r for r in self.results if r['target'][0] == r['target'][1] == r['target'][2]]
+        if not gray_samples:
+            return np.zeros(0), np.zeros(0)
+        white_lin = np.mean(self.captured_linear(white_cap))
+        norm_val = white_lin if white_lin > 0 else 1.0
+        x = np.array([s['target'][0] for s in gray_samples]) / 255.0
+        y = self.captured_linear([s['captured'] for s in gray_samples]).mean(axis=1) / norm_val
+        # Filter for stable range (avoid near-black noise and clipping)
+        stable = (x > 0.1) & (x < 0.95) & (y > 0.05)
+        return np.log(x[stable]), np.log(y[stable])
+
+    def measured_gamma(self, white_cap=None):
+        """Gamma regressed from the grayscale samples (slope in log-log), None with fewer than 3 usable greys."""
+        log_x, log_y = self.gamma_regression_data(white_cap)
+        if len(log_x) < 3:
+            return None
+        slope, intercept = np.polyfit(log_x, log_y, 1)
+        return float(slope)
+
+    def measured_white_xy(self):
+        """Nominal CIE xy chromaticity of the measured white (see camera_to_xyz), None if white was not measured."""
+        white = self.white_capture()
+        if white is None:
+            return None
+        xyz = self.captured_xyz(white)
+        total = xyz.sum()
+        return (float(xyz[0] / total), float(xyz[1] / total)) if total > 0 else None
+
+    def get_confidence_intervals(self, resamples=1000, level=0.95, seed=None, max_block=250_000):
+        """
+        Bootstrap intervals for the CCM coefficients, the average raw and corrected
+        errors and the gamma slope, plus how often each grade comes out. The CCM
+        is refitted per resample by weighted least squares with the current fit's
+        model and robust weights held fixed. Resamples run in blocks of at most
+        `max_block` resample x sample cells, so large patch sets stay bounded.
+        """
+        if self.ccm_fit is None and self.compute_ccm() is None:
+            return None
+        rng = np.random.default_rng(seed)
+        fit = self.ccm_fit
+        targets = np.array([r['target'] for r in self.results], dtype=float)
+        captured = self.captured_linear([r['captured'] for r in self.results])
+        F = expand_features(captured, fit.model)
+        target_lin = srgb_to_linear(targets / 255.0)
+        raw = np.linalg.norm(self.captured_encoded([r['captured'] for r in self.results]) - targets, axis=1)
+
+        block = max(1, max_block // len(F))
+        coefs, corrected_err, raw_err = [], [], []
+        for start in range(0, resamples, block):
+            counts = bootstrap.bootstrap_counts(len(F), min(block, resamples - start), rng)
+            c = bootstrap.bootstrap_lstsq(F, target_lin, counts, fit.weights)
+            corrected = linear_to_srgb(F @ c) * 255.0  # (b, N, 3)
+            corrected_err.append(bootstrap.weighted_means(np.linalg.norm(corrected - targets, axis=2), counts))
+            raw_err.append(bootstrap.weighted_means(raw, counts))
+            coefs.append(c)
+        coefs = np.concatenate(coefs)
+        corrected_err = np.concatenate(corrected_err)
+        raw_err = np.concatenate(raw_err)
+
+        bands = np.bincount(np.digitize(corrected_err, GRADE_LIMITS), minlength=len(GRADE_LIMITS) + 1)
+        result = {
+            "resamples": resamples,
+            "level": level,
+            "ccm": bootstrap.interval(coefs, level),
+            "avg_raw": bootstrap.interval(raw_err, level),
+            "avg_corrected": bootstrap.interval(corrected_err, level),
+            # Share of resamples landing in grade A, B, C and below
+            "grade_probabilities": tuple(bands / resamples),
+            "gamma": None,
+        }
+        log_x, log_y = self.gamma_regression_data()
+        if len(log_x) >= 3:
+            gamma_counts = bootstrap.bootstrap_counts(len(log_x), resamples, rng)
+            result["gamma"] = bootstrap.interval(bootstrap.bootstrap_slope(log_x, log_y, gamma_counts), level)
+        return result
+
+    def get_gamut_metrics(self, step=2.0):
+        """Gamut volume and sRGB / P3 / Rec.2020 coverage of the fitted display model (None if underdetermined)."""
+        from gamut import fit_display_model, gamut_coverage
+        white_cap = next((r['captured'] for r in self.results if r['target'] == (255, 255, 255)), None)
+        if white_cap is None or len(self.results) < 4:
+            return None
+        norm = self.captured_linear(white_cap)
+        if np.any(norm == 0):
+            return None
+        targets = np.array([r['target'] for r in self.results], dtype=float)
+        relative = self.captured_linear([r['captured'] for r in self.results]) / norm
+        gamma = self.measured_gamma(white_cap) or self.gamma_seed or 2.2
+        M, black = fit_display_model(targets, relative, gamma=gamma)
+        if M is None or abs(np.linalg.det(M)) < 1e-9:
+            return None
+        return gamut_coverage(M, black, step=step)
+
+    def _fit_key(self):
+        """Everything the gamut model and the bootstrap depend on: the samples and the fit settings."""
+        samples = tuple((tuple(r['target']), tuple(r['captured'])) for r in self.results)
+        return samples, self.ccm_model, self.ccm_method, self.linear_capture, self.gamma_seed
+
+    def _fit_statistics(self):
+        """Gamut metrics and bootstrap intervals, computed once per set of samples and fit settings."""
+        key = self._fit_key()
+        if self._metrics_cache is None or self._metrics_cache[0] != key:
+            confidence = self.get_confidence_intervals() if self.ccm is not None else None
+            self._metrics_cache = (key, self.get_gamut_metrics(), confidence)
+        return self._metrics_cache[1], self._metrics_cache[2]
+
     def get_performance_metrics(self, wp_target="D65", gamma_target=2.2):
         """Returns analysis data as a dictionary with Pro metrics."""
         if not self.results:
@@ -60,15 +276,14 @@ class CalibrationLogic:
         
         for res in self.results:
             target = np.array(res['target'])
-            captured = np.array(res['captured'])
+            captured = self.captured_encoded(res['captured'])
             
             # Raw Delta-E (Euclidean in RGB as proxy if no full profile yet)
             total_delta += self.calculate_delta_e(target, captured)
             
             if self.ccm is not None:
-                # 1. Apply CCM
-                corrected = np.dot(captured, self.ccm)
-                corrected = np.clip(corrected, 0, 255)
+                # 1. Apply CCM (in linear light, back to encoded RGB)
+                corrected = self.apply_ccm(res['captured'])
                 
                 # 2. Simplifikasi Chromatic Adaptation (Gain adjustment)
                 # In a real pro app, we'd convert to Lab and use CIEDE2000.
@@ -80,28 +295,31 @@ class CalibrationLogic:
         
         improvement = ((avg_delta - avg_corrected) / avg_delta) * 100 if avg_delta > 0 else 0
         
-        # Grading based on Pro standards (Average Delta-E < 2 is Pro)
-        if avg_corrected < 2:
-            grade = "Professional (Grade A)"
-            desc = "Akurasi warna luar biasa, siap untuk grading profesional."
-        elif avg_corrected < 4:
-            grade = "Excellent (Grade B)"
-            desc = "Sangat baik untuk desain grafis dan edit foto."
-        elif avg_corrected < 8:
-            grade = "Fair (Grade C)"
-            desc = "Cukup untuk penggunaan umum, namun ada sedikit pergeseran warna."
-        else:
-            grade = "Needs Recalibration"
-            desc = "Akurasi rendah. Cek pencahayaan ruangan atau posisi kamera."
+        # Grading based on Pro standards (Average Delta-E < 2 is Pro); a
+        # held-out verification pass, when run, decides instead of training error
+        grade, desc = grade_for(avg_corrected)
+        delta_e, delta_e_source = avg_corrected, "training"
+        if self.verification:
+            grade, desc = self.verification["grade"], self.verification["description"]
+            delta_e, delta_e_source = self.verification["avg"], "verification"
+        gamut, confidence = self._fit_statistics()
             
         return {
             "avg_raw": avg_delta,
             "avg_corrected": avg_corrected,
+            # The error the grade is based on, and where it comes from
+            "delta_e": delta_e,
+            "delta_e_source": delta_e_source,
             "improvement": improvement,
             "grade": grade,
             "description": desc,
             "wp_target": target_key,
-            "gamma_target": gamma_target
+            "gamma_target": gamma_target,
+            "ccm_model": self.ccm_fit.model if self.ccm_fit else None,
+            "contrast_ratio": self.black_level["contrast_ratio"] if self.black_level else None,
+            "gamut": gamut,
+            "confidence": confidence,
+            "verification": self.verification
         }
 
     def analyze(self):
@@ -118,34 +336,30 @@ class CalibrationLogic:
         return report
 
     def export_ti3(self, filename="calibration_data.ti3"):
-        """Eksport data ke format .ti3 (Argyll CMS)."""
+        """Eksport data ke format .ti3 (Argyll CMS): device RGB 0-100 dan XYZ nominal dari RGB kamera (putih Y = 100)."""
         if not self.results:
             return False
-            
-        with open(filename, "w") as f:
-            f.write("CTI3\n\n")
-            f.write("DESCRIPTOR \"Argyll Device RGB measurements\"\n")
-            f.write("ORIGIN \"Python Monitor Calibrator\"\n")
-            f.write("DEVICE_CLASS \"DISPLAY\"\n")
-            f.write("COLOR_REP \"RGB\"\n\n")
-            
-            f.write("NUMBER_OF_FIELDS 6\n")
-            f.write("BEGIN_DATA_FORMAT\n")
-            f.write("RGB_R RGB_G RGB_B SAMPLE_ID XYZ_X XYZ_Y XYZ_Z\n")
-            f.write("END_DATA_FORMAT\n\n")
-            
-            f.write(f"NUMBER_OF_SETS {len(self.results)}\n")
-            f.write("BEGIN_DATA\n")
-            for i, res in enumerate(self.results):
-                target = res['target']
-                # Mocking XYZ from captured RGB for now (simplifikasi)
-                # In real world, we'd use a better conversion or measure XYZ directly
-                cap = res['captured']
-                # Simplifikasi: menggunakan captured RGB sebagai pendekatan XYZ 0-100
-                f.write(f"{target[0]/255:.4f} {target[1]/255:.4f} {target[2]/255:.4f} {i+1} {cap[0]} {cap[1]} {cap[2]}\n")
-            f.write("END_DATA\n")
+        targets = np.array([r['target'] for r in self.results], dtype=float)
+        xyz = self.captured_xyz([r['captured'] for r in self.results], self.white_capture())
+        with Ti3Writer(filename) as writer:
+            writer.write_many(targets, xyz)
         return True
 
+    def import_ti3(self, filename):
+        """
+        Loads a .ti3 (e.g. from export_ti3 or Argyll tools) as samples, inverting
+        camera_to_xyz so the captured values are what this camera would report.
+        XYZ is taken relative to Y = 100. Returns the number of samples added.
+        """
+        _, columns = read_cgats(filename)
+        rgb = np.rint(np.stack([columns[f] for f in ("RGB_R", "RGB_G", "RGB_B")], axis=1) * 2.55).astype(int)
+        xyz = np.stack([columns[f] for f in ("XYZ_X", "XYZ_Y", "XYZ_Z")], axis=1) / 100.0
+        linear = np.clip(xyz @ np.linalg.inv(self.camera_to_xyz).T, 0.0, 1.0)
+        captured = linear * 255.0 if self.linear_capture else linear_to_srgb(linear) * 255.0
+        for target, cap in zip(rgb, captured):
+            self.record_sample(tuple(int(v) for v in target), tuple(float(v) for v in cap))
+        return len(rgb)
+
     def generate_basic_icc(self, filename="monitor_profile.icc", wp_target="D65", gamma_target=2.2):
         """
         Generates a valid binary ICC v2 monitor profile based on measured data
@@ -173,39 +387,22 @@ class CalibrationLogic:
             gray_samples = [r for r in self.results if r['target'][0] == r['target'][1] == r['target'][2]]
             gray_samples = sorted(gray_samples, key=lambda x: x['target'][0])
             
-            estimated_gamma = 2.2 # Start with robust default
+            estimated_gamma = self.gamma_seed or 2.2 # Start with the Lagom estimate or a robust default
             
             if len(gray_samples) >= 5:
                 try:
-                    # We want to fit y = x^gamma where y is measured ratio and x is target ratio
-                    # log(y) = gamma * log(x)
-                    x_data = [] 
-                    y_data = []
-                    
-                    norm_val = np.mean(white_cap) if np.mean(white_cap) > 0 else 255.0
-                    
-                    for s in gray_samples:
-                        x = s['target'][0] / 255.0
-                        y = np.mean(s['captured']) / norm_val
-                        # Filter for stable range (avoid near-black noise and clipping)
-                        if 0.1 < x < 0.95 and y > 0.05:
-                            x_data.append(x)
-                            y_data.append(y)
-                    
-                    if len(x_data) >= 3:
-                        log_x = np.log(x_data)
-                        log_y = np.log(y_data)
-                        # Linear regression: slope is gamma
-                        slope, intercept = np.polyfit(log_x, log_y, 1)
-                        estimated_gamma = slope
+                    regressed = self.measured_gamma(white_cap)
+                    if regressed is not None:
+                        estimated_gamma = regressed
                         print(f"DEBUG: Regressed Gamma = {estimated_gamma:.2f}")
                 except Exception as e:
                     print(f"Warning: Gamma regression failed: {e}")
             
             # SANITY CHECK: 
             if estimated_gamma < 1.2 or estimated_gamma > 2.8:
-                print(f"Warning: Measured Gamma {estimated_gamma:.2f} seems unrealistic. Using 2.2")
-                estimated_gamma = 2.2
+                fallback = self.gamma_seed or 2.2
+                print(f"Warning: Measured Gamma {estimated_gamma:.2f} seems unrealistic. Using {fallback:.2f}")
+                estimated_gamma = fallback
             
             print(f"Pro ICC: Target Gamma = {gamma_target:.2f} | WP = {target_key}")
 
@@ -213,16 +410,20 @@ class CalibrationLogic:
             
             # Normalize measurements to approximated XYZ for PCS (White = PCS D50)
             # and use it as the Media White Point
-            norm = np.array(white_cap, dtype=float)
-            if np.any(norm == 0): norm = np.array([255, 255, 255], dtype=float)
+            norm = self.captured_linear(white_cap)
+            if np.any(norm == 0): norm = np.ones(3)
             
             def to_xyz(cap):
-                # Scale relative to measured white, then scale to target white point
-                rel = np.array(cap, dtype=float) / norm
+                # Scale relative to measured white (in linear light), then to target white point
+                rel = self.captured_linear(cap) / norm
                 return (rel[0] * dest_wp[0], rel[1] * dest_wp[1], rel[2] * dest_wp[2])
 
             generator.set_white_point(dest_wp) # Set Target White Point
             generator.set_primaries(to_xyz(red_cap), to_xyz(green_cap), to_xyz(blue_cap))
+            if self.black_level:
+                # Already linear and relative to white, so scale straight to the target white point
+                rel_black = self.black_level["black_rgb"]
+                generator.set_black_point(tuple(rel_black[i] * dest_wp[i] for i in range(3)))
             
             generator.create_profile(filename)
             return True
@@ -233,5 +434,13 @@ class CalibrationLogic:
             return False
 
     def reset(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
         self.results = []
         self.ccm = None
+        self.ccm_fit = None
+        self.gamma_seed = None
+        self.black_level = None
+        self.verification = None
+        self._metrics_cache = None
@@ -0,0 +1,350 @@
+"""
+The calibration sequence, shared by the app (main_gui) and the headless CLI.
+
+    camera response -> flicker -> (dark frame) -> black level -> gamma seed
+    -> journal -> patches -> outlier re-measure -> held-out verification
+
+CalibrationRunner drives the camera and CalibrationLogic; everything the user
+sees goes through a UI object: DisplayUI shows patches on a patch_display
+display and logs progress (CLI), main_gui.CalibrationWindowUI draws them in
+the calibration window. Every sample is journaled so an interrupted run can
+be resumed, and patch sets stream their measurements to a .ti3.
+"""
+import os
+import time
+from collections import Counter
+from datetime import datetime
+from calibration_logic import CalibrationLogic
+from frame_quality import FrameQualityGate
+from patch_ordering import SettleModel, order_patches, wait_until_settled
+
+OUTPUT_DIR = "calibration_output"
+
+
+class DisplayUI:
+    """
+    UI of a run without the app: patches go to a patch_display display,
+    progress to `log`, questions to the terminal.
+    """
+    def __init__(self, display, log=print):
+        self.display = display
+        self.log = log
+
+    @property
+    def screen_size(self):
+        return self.display.size
+
+    def show_patch(self, rgb):
+        self.display.show_patch(rgb)
+
+    def show_pattern(self, pattern):
+        self.display.show_pattern(pattern)
+
+    def clear_pattern(self):
+        pass
+
+    def status(self, text, detail=None):
+        self.log(text)  # the detail line is for the calibration window
+
+    def warn(self, text):
+        self.log(f"Warning: {text}")
+
+    def patch_done(self, i, total, ok):
+        pass
+
+    def ask(self, title, text):
+        """Asks the user to do something; False cancels."""
+        input(f"{text}, lalu tekan Enter...")
+        return True
+
+    def inform(self, title, text):
+        input(f"{text}, lalu tekan Enter...")
+
+
+class CalibrationRunner:
+    """
+    One calibration run. `patches` is "adaptive", "fixed" or a patch_sets spec.
+    The steps can be called one by one; run() does all of them in order.
+    With `resume`, an unfinished journal of the same camera, camera response
+    and patch set in `out_dir` is replayed and its patches are not measured again.
+    """
+    def __init__(self, camera, ui, logic=None, patches="fixed", verify=True, gamma_seed=True,
+                 dark_frame=False, resume=False, out_dir=OUTPUT_DIR, log=print):
+        self.camera = camera
+        self.ui = ui
+        self.logic = logic or CalibrationLogic()
+        self.patches = patches
+        self.verify = verify
+        self.gamma_seed = gamma_seed
+        self.dark_frame = dark_frame
+        self.resume = resume
+        self.out_dir = out_dir
+        self.log = log
+        self.quality_gate = FrameQualityGate()
+        self.settle_model = SettleModel()
+        self._last_patch = None
+        self._resumed = Counter()  # patch -> count still to skip (resumed journal)
+        self.timings = {}
+        self.info = {}
+
+    def _stage(self, name, func):
+        t0 = time.perf_counter()
+        self.log(f"[{name}]")
+        result = func()
+        self.timings[name] = time.perf_counter() - t0
+        return result
+
+    def _output_path(self, prefix, ext):
+        os.makedirs(self.out_dir, exist_ok=True)
+        return os.path.join(self.out_dir, f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{ext}")
+
+    def characterize_camera(self):
+        """Measures the camera response once per camera + resolution (cached on disk)."""
+        from camera_response import characterize_camera
+        if self.camera.response is None:
+            self.camera.load_cached_response()
+        if self.camera.response is None:
+            self.ui.status("Karakterisasi Kamera...", "Mengukur respons kamera dengan gray ramp (sekali per kamera).")
+            response = characterize_camera(self.camera, self.ui.show_patch)
+            if response is not None:
+                self.log(f"Camera response disimpan: {response.save()}")
+                self.camera.response = response
+        self.logic.linear_capture = self.camera.response is not None
+        self.logic.response_id = self.camera.response.fingerprint() if self.camera.response else None
+
+    def measure_flicker(self):
+        """Burst on white to detect PWM; sets how many frames each sample averages."""
+        from flicker_analysis import measure_flicker
+        self.ui.status("Analisis Flicker...", "Merekam burst frame untuk mendeteksi PWM backlight.")
+        result = measure_flicker(self.camera, self.ui.show_patch)
+        self.info["flicker"] = result
+        if result and result["flicker"]:
+            self.ui.warn(f"PWM terdeteksi ({result['modulation_depth']:.0f}%), "
+                         f"rata-rata {self.camera.frames_per_sample} frame per warna.")
+
+    def capture_dark_frame(self):
+        """Asks for the lens to be covered and records a new dark frame (sensor offset) for this camera."""
+        from black_level import capture_dark_frame
+        if not self.ui.ask("Dark Frame", "Tutup lensa kamera (atau tutupi kamera sepenuhnya)"):
+            return
+        self.ui.status("Merekam Dark Frame...", "Lensa tertutup: menumpuk frame gelap.")
+        capture_dark_frame(self.camera)
+        self.ui.inform("Dark Frame", "Selesai. Buka kembali lensa kamera")
+
+    def measure_black_level(self):
+        """Stacks many frames of black (and a few of white) for the black point and contrast ratio."""
+        from black_level import measure_black_level, load_dark_frame
+        self.ui.status("Mengukur Level Hitam...", "Menumpuk frame hitam untuk rasio kontras.")
+        result = measure_black_level(self.camera, self.ui.show_patch, dark=load_dark_frame(self.camera))
+        self.logic.black_level = result
+        if result and result["contrast_ratio"]:
+            bound = ">" if result["contrast_is_lower_bound"] else ""
+            self.log(f"DEBUG: Black {result['black_relative'] * 100:.3f}% of white, "
+                     f"contrast {bound}{result['contrast_ratio']:.0f}:1")
+
+    def estimate_gamma_seed(self):
+        """One capture of the Lagom gamma pattern; only works when the camera sees the whole screen."""
+        from gamma_estimation import measure_gamma, gamma_seed
+        self.ui.status("Estimasi Gamma...")
+        try:
+            estimates = measure_gamma(self.camera, self.ui.show_pattern, self.ui.screen_size)
+        finally:
+            self.ui.clear_pattern()
+        self.logic.gamma_seed = gamma_seed(estimates)
+        if self.logic.gamma_seed is None:
+            self.log("Gamma Lagom tidak terbaca, memakai wedge grayscale penuh.")
+
+    def open_journal(self):
+        """
+        Journals every sample of this run. With resume, an unfinished journal
+        of the same camera, camera response and patch set is replayed first and
+        its patches are skipped by measure_patch. The response is part of the
+        label: samples captured through another response (or without one) are
+        on another scale and must not be mixed in.
+        """
+        from measurement_journal import MeasurementJournal, find_unfinished, replay
+        os.makedirs(self.out_dir, exist_ok=True)
+        # The mode goes last: a long patch set path is what the 112-byte label cuts off
+        label = f"{self.camera.camera_name}|{self.logic.response_id or 'raw'}|{self.patches}"
+        self._resumed = Counter()
+        path = find_unfinished(self.out_dir, label) if self.resume else None
+        if path and replay(path, self.logic):
+            self._resumed = Counter(tuple(r['target']) for r in self.logic.results)
+            self.ui.warn(f"Melanjutkan sesi: {len(self.logic.results)} warna sudah terukur.")
+            self.log(f"DEBUG: Resumed {len(self.logic.results)} samples from {path}")
+        else:
+            path = self._output_path("journal", "mmj")
+        self.logic.journal = MeasurementJournal(path, label)
+        self.info["journal"] = path
+
+    def close_journal(self, finished=True):
+        """Closes the journal; a finished one is never offered for resume again."""
+        if self.logic.journal is not None:
+            if finished:
+                self.logic.journal.finish()
+            self.logic.journal.close()
+            self.logic.journal = None
+
+    def settle_after_change(self, rgb):
+        """Waits for panel and auto exposure: polls the camera until stable, learning the settle model."""
+        if self._last_patch is None:
+            time.sleep(1.0)
+        else:
+            settle = wait_until_settled(self.camera, min_wait=self.settle_model.wait_floor())
+            if settle is not None:  # a timeout is censored, not a settle time
+                self.settle_model.observe(self._last_patch, rgb, settle)
+        self._last_patch = rgb
+
+    def capture(self, rgb):
+        """Shows, settles and reads one patch through the quality gate. None if no frame passed."""
+        self.ui.show_patch(rgb)
+        self.settle_after_change(rgb)
+        self.quality_gate.reset()
+        return self.camera.get_checked_average_color(self.quality_gate)
+
+    def measure_patch(self, rgb, i, total):
+        """Measures and records one patch (skipped if already in a resumed journal). Returns success."""
+        if self._resumed.get(tuple(rgb), 0) > 0:
+            self._resumed[tuple(rgb)] -= 1
+            return True
+        self.ui.status(f"Pro Calibration: Langkah {i+1}/{total}", f"Membaca Warna {i+1} dari {total}...")
+        captured = self.capture(rgb)
+        if captured:
+            self.logic.record_sample(rgb, captured)
+        else:
+            self.ui.warn(f"Langkah {i+1}: frame tidak layak (clipping/blur/gerakan), dilewati.")
+        self.ui.patch_done(i, total, bool(captured))
+        return bool(captured)
+
+    def measure_patches(self):
+        """
+        The fixed list (Macbeth, saturation sweeps, grey wedge; a coarse wedge
+        when the Lagom capture already gave the gamma), the adaptive scheduler
+        or a patch set.
+        """
+        from patch_sets import standard_patches
+        colors, grayscale = standard_patches(6 if self.logic.gamma_seed else 21)
+        total = len(colors)
+        if self.patches == "adaptive":
+            from patch_scheduler import PatchScheduler, SEED_PATCHES, default_pool
+            # The grey wedge is always measured: the ICC gamma regression needs it
+            seeds = order_patches(SEED_PATCHES + grayscale, self.settle_model)
+            scheduler = PatchScheduler(self.logic, pool=colors + default_pool(), seeds=seeds, max_patches=total)
+            i = 0
+            while True:
+                rgb = scheduler.next_patch()
+                if rgb is None:
+                    break
+                if not self.measure_patch(rgb, i, total):
+                    scheduler.skip(rgb)
+                i += 1
+            self.info["scheduler_stop"] = scheduler.stop_reason
+            self.log(f"DEBUG: Scheduler stopped after {len(self.logic.results)} patches ({scheduler.stop_reason})")
+        elif self.patches == "fixed":
+            for i, rgb in enumerate(order_patches(colors, self.settle_model)):
+                self.measure_patch(rgb, i, total)
+        else:
+            self.measure_patch_set(self.patches)
+        self.log(f"{len(self.logic.results)} patches measured")
+
+    def measure_patch_set(self, spec, chunk_size=256, sync_every=25):
+        """
+        Streams a (possibly large) patch set through measure_patch: read and
+        ordered one chunk at a time, each measurement appended to a .ti3 as it
+        comes in. White is measured first so every row is on the same Y = 100 scale;
+        samples already in the logic (a resumed journal) open the file.
+        """
+        from patch_sets import open_patch_set, chunked
+        from cgats import Ti3Writer
+        patches, total = open_patch_set(spec)
+        path = self._output_path("measurements", "ti3")
+        i = 0
+        with Ti3Writer(path, sync_every=sync_every) as writer:
+            if self.logic.white_capture() is None:
+                self.measure_patch((255, 255, 255), i, total or "?")
+            # Without a white the rows keep the absolute scale (linear 1.0 -> Y = 100)
+            white_cap = self.logic.white_capture()
+            if self.logic.results:
+                writer.write_many([r['target'] for r in self.logic.results],
+                                  self.logic.captured_xyz([r['captured'] for r in self.logic.results], white_cap))
+            for chunk in chunked(patches, chunk_size):
+                for rgb in order_patches(chunk, self.settle_model, start=self._last_patch):
+                    n = len(self.logic.results)
+                    if self.measure_patch(rgb, i, total or "?") and len(self.logic.results) > n:
+                        captured = self.logic.results[-1]['captured']
+                        writer.write(rgb, self.logic.captured_xyz(captured, white_cap))
+                    i += 1
+        self.info["measurements"] = path
+        self.log(f"DEBUG: {i} patches from {spec}, measurements in {path}")
+
+    def remeasure_outliers(self, rounds=1):
+        """Re-measures only the patches the robust CCM fit rejected (reflection, bump...)."""
+        self.info["outliers"] = 0
+        for _ in range(rounds):
+            if self.logic.compute_ccm() is None:
+                return
+            outliers = self.logic.outlier_samples()
+            if not outliers:
+                return
+            self.info["outliers"] += len(outliers)
+            self.log(f"DEBUG: {len(outliers)} outlier samples, re-measuring: {[t for _, t in outliers]}")
+            # Several outliers can share a target: each rgb keeps its own list of indices
+            indices = {}
+            for index, rgb in outliers:
+                indices.setdefault(tuple(rgb), []).append(index)
+            ordered = order_patches([rgb for _, rgb in outliers], self.settle_model, start=self._last_patch)
+            for n, rgb in enumerate(ordered):
+                index = indices[rgb].pop(0)
+                self.ui.status(f"Ukur Ulang: {n+1}/{len(outliers)}", f"Sampel {rgb} menyimpang, membaca ulang...")
+                captured = self.capture(rgb)
+                if captured:
+                    self.logic.replace_sample(index, captured)
+
+    def verify_calibration(self):
+        """Measures held-out patches until the sequential test settles the grade (verification.py)."""
+        from verification import SequentialVerifier
+        from patch_scheduler import default_pool
+        if self.logic.compute_ccm() is None:
+            return
+        verifier = SequentialVerifier(self.logic, pool=default_pool(5))
+        n = 0
+        while True:
+            rgb = verifier.next_patch()
+            if rgb is None:
+                break
+            n += 1
+            self.ui.status(f"Verifikasi: Warna {n}", "Mengukur warna uji yang tidak dipakai untuk model...")
+            captured = self.capture(rgb)
+            if captured:
+                verifier.add(rgb, captured)
+            else:
+                verifier.skip(rgb)
+        self.logic.verification = verifier.result()
+        if self.logic.verification:
+            v = self.logic.verification
+            self.log(f"DEBUG: Verification {v['avg']:.2f} over {v['patches']} held-out patches "
+                     f"({v['stop_reason']}) -> {v['grade']}")
+
+    def run(self):
+        """All stages; returns False when not a single patch could be measured."""
+        self._stage("camera_response", self.characterize_camera)
+        self._stage("flicker", self.measure_flicker)
+        if self.dark_frame:
+            self._stage("dark_frame", self.capture_dark_frame)
+        self._stage("black_level", self.measure_black_level)
+        if self.gamma_seed:
+            self._stage("gamma_seed", self.estimate_gamma_seed)
+        self.open_journal()
+        finished = False
+        try:
+            self._stage("patches", self.measure_patches)
+            if not self.logic.results:
+                return False
+            self._stage("outliers", self.remeasure_outliers)
+            if self.verify:
+                self._stage("verification", self.verify_calibration)
+            finished = True
+        finally:
+            # An interrupted run leaves its journal unfinished, so it can be resumed
+            self.close_journal(finished)
+        return True
@@ -3,6 +3,7 @@ import numpy as np
 import random
 import platform
 import time
+from color_math import srgb_to_linear, linear_to_srgb
 
 try:
     import AVFoundation
@@ -12,10 +13,22 @@ except ImportError:
     HAS_AVFOUNDATION = False
 
 class CameraHandler:
-    def __init__(self, camera_index=0, mock_mode=False):
+    def __init__(self, camera_index=0, mock_mode=False, backend=None, camera_name=None):
         self.camera_index = camera_index
+        self.camera_name = camera_name or f"Camera {camera_index}"
         self.cap = None
         self.mock_mode = mock_mode
+        # Optional VideoCapture-like source (e.g. camera_simulator.SimulatedCapture)
+        self.backend = backend
+        self.displayed_patch = None
+        self.patch_changed_at = None  # time.monotonic() of the last set_displayed_patch/image
+        self.recorder = None
+        # camera_response.CameraResponse; when set, ROI colours are linear light
+        self.response = None
+        # Frames averaged per colour sample (raised by flicker_analysis on PWM panels)
+        self.frames_per_sample = 1
+        # Frames used and standard error of the last get_sequential_average_color
+        self.last_sample = None
 
     @staticmethod
     def list_available_cameras(max_to_check=5):
@@ -112,11 +125,15 @@ class CameraHandler:
 
     def start(self):
         """Memulai capture kamera."""
+        if self.backend is not None:
+            self.cap = self.backend
+            return self.backend.start()
+
         if self.mock_mode:
             return True
             
         if self.cap is not None:
-            self.stop()
+            self._release()
             
         print(f"--- Memulai Kamera (Index: {self.camera_index}) ---")
         
@@ -167,8 +184,112 @@ class CameraHandler:
         print("Kamera siap.")
         return warmup_success
 
+    def get_resolution(self):
+        if self.cap is None:
+            return (0, 0)
+        return (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+    def get_exposure(self):
+        """Current exposure setting, or None if the source does not report one."""
+        if self.cap is None:
+            return None
+        value = self.cap.get(cv2.CAP_PROP_EXPOSURE)
+        return value if value else None
+
+    def set_exposure(self, value):
+        if self.cap is None:
+            return False
+        return bool(self.cap.set(cv2.CAP_PROP_EXPOSURE, value))
+
+    def exposure_for_stops(self, base, stops):
+        """Exposure setting `stops` EV from `base` (OpenCV uses log2 seconds, the simulator a linear gain)."""
+        if getattr(self.backend, "linear_exposure", False):
+            return base * (2.0 ** stops)
+        return base + stops
+
+    def load_cached_response(self):
+        """Loads a previously characterized response for this camera + resolution, if any."""
+        from camera_response import CameraResponse
+        self.response = CameraResponse.load_cached(self.camera_name, self.get_resolution())
+        if self.response is not None:
+            print(f"Camera response dimuat dari cache: {self.camera_name} {self.response.resolution}")
+        return self.response
+
+    def set_displayed_patch(self, rgb):
+        """Tells the capture source which patch the overlay is currently showing."""
+        self.displayed_patch = rgb
+        self.patch_changed_at = time.monotonic()
+        if self.backend is not None and hasattr(self.backend, "set_patch"):
+            self.backend.set_patch(rgb)
+
+    def set_displayed_image(self, img):
+        """Same as set_displayed_patch, for a full-screen test pattern (uint8 RGB)."""
+        self.displayed_patch = None
+        self.patch_changed_at = time.monotonic()
+        if self.backend is not None and hasattr(self.backend, "set_image"):
+            self.backend.set_image(img)
+
+    def start_recording(self, path):
+        """Records every frame from get_frame (with timestamp and patch) to `path`."""
+        from session_recorder import SessionRecorder
+        self.stop_recording()
+        self.recorder = SessionRecorder(path)
+        print(f"Merekam sesi ke: {path}")
+
+    def stop_recording(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            print(f"Rekaman selesai: {self.recorder.count} frame")
+            self.recorder = None
+
     def get_frame(self):
-        if self.mock_mode:
+        frame = self._read_frame()
+        if frame is not None and self.recorder is not None:
+            self.recorder.append(frame, self.displayed_patch)
+        return frame
+
+    def read_into(self, buffer):
+        """
+        Reads the next frame into the preallocated `buffer` (same shape/dtype as
+        get_frame returns), so long frame stacks do not allocate per frame.
+        """
+        if self.cap is None or (self.mock_mode and self.backend is None):
+            frame = self.get_frame()
+            if frame is None:
+                return False
+            np.copyto(buffer, frame)
+            return True
+        ret, _ = self.cap.read(buffer)
+        if not ret:
+            return False
+        if self.recorder is not None:
+            self.recorder.append(buffer, self.displayed_patch)
+        return True
+
+    def read_timed(self):
+        """
+        (timestamp, frame). Uses the device timestamp (CAP_PROP_POS_MSEC) when the
+        backend provides one, else the time right after grab() so decoding does not
+        blur the sampling instants. Falls back to get_frame for other sources.
+        """
+        if self.cap is None or not hasattr(self.cap, "grab") or (self.mock_mode and self.backend is None):
+            frame = self.get_frame()
+            return time.monotonic(), frame
+        if not self.cap.grab():
+            return None, None
+        t = time.monotonic()
+        ret, frame = self.cap.retrieve()
+        if not ret:
+            return None, None
+        device_ms = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+        if device_ms and device_ms > 0:
+            t = device_ms / 1000.0
+        if self.recorder is not None:
+            self.recorder.append(frame, self.displayed_patch)
+        return t, frame
+
+    def _read_frame(self):
+        if self.mock_mode and self.backend is None:
             # Generate a random noise frame with a gray circle in the middle
             frame = np.random.randint(0, 50, (480, 640, 3), dtype=np.uint8)
             cv2.circle(frame, (320, 240), 100, (128, 128, 128), -1)
@@ -181,12 +302,16 @@ class CameraHandler:
 
         ret, frame = self.cap.read()
         
+        # A simulated/replayed backend that stops delivering has simply run out
+        if not ret and self.backend is not None:
+            return None
+
         # Auto-reconnect logic
         if not ret:
             print("Frame lost. Attempting to reconnect...")
             # Try to release and restart a few times
             for attempt in range(3):
-                self.stop()
+                self._release()
                 time.sleep(0.5) # Wait a bit before reconnecting
                 if self.start():
                     print(f"Reconnected on attempt {attempt+1}")
@@ -198,13 +323,10 @@ class CameraHandler:
             
         return frame
 
-    def get_average_color(self, region_size=100):
-        """Membaca rata-rata warna di tengah frame."""
-        frame = self.get_frame()
-        if frame is None:
-            return None
-        
-        height, width, _ = frame.shape
+    @staticmethod
+    def center_roi(frame, region_size=100):
+        """Returns the square region in the middle of the frame (a view, no copy)."""
+        height, width = frame.shape[:2]
         center_x, center_y = width // 2, height // 2
         
         half_size = region_size // 2
@@ -213,21 +335,139 @@ class CameraHandler:
         x1 = max(0, center_x - half_size)
         x2 = min(width, center_x + half_size)
         
-        roi = frame[y1:y2, x1:x2]
+        return frame[y1:y2, x1:x2]
+
+    def _roi_mean(self, roi):
+        """Mean RGB of a BGR ROI: linear light with a camera response, else raw floats."""
+        if self.response is not None:
+            return self.response.mean_rgb(roi)
+        b, g, r = cv2.mean(roi)[:3]
+        return (r, g, b)
+
+    def _combine_means(self, means):
+        """Averages per-frame ROI means in linear light, so flicker does not bias the result."""
+        means = np.asarray(means, dtype=float)
+        if self.response is not None:
+            r, g, b = means.mean(axis=0)
+            return (float(r), float(g), float(b))
+        # Raw camera values: undo the nominal sRGB encoding for the average
+        linear = srgb_to_linear(means / 255.0).mean(axis=0)
+        r, g, b = linear_to_srgb(linear) * 255.0
+        return (int(round(r)), int(round(g)), int(round(b)))
+
+    def get_average_color(self, region_size=100, frames=None):
+        """
+        Membaca rata-rata warna di tengah frame (linear light jika camera response tersedia).
+        Averages `frames` frames (default frames_per_sample) so PWM flicker cancels out.
+        """
+        frames = frames or self.frames_per_sample
+        if frames > 1:
+            means = []
+            for _ in range(frames):
+                frame = self.get_frame()
+                if frame is None:
+                    return None
+                roi = self.center_roi(frame, region_size)
+                if roi.size == 0:
+                    return None
+                means.append(self._roi_mean(roi))
+            return self._combine_means(means)
+
+        frame = self.get_frame()
+        if frame is None:
+            return None
+        
+        roi = self.center_roi(frame, region_size)
         
         if roi.size == 0:
             return None
+
+        if self.response is not None:
+            return self.response.mean_rgb(roi)
             
         avg_color_bgr = cv2.mean(roi)[:3]
         
         # In mock mode, add some jitter to simulate real camera noise
-        if self.mock_mode:
+        if self.mock_mode and self.backend is None:
             jitter = lambda: random.randint(-5, 5)
             avg_color_bgr = [max(0, min(255, c + jitter())) for c in avg_color_bgr]
             
         return (int(avg_color_bgr[2]), int(avg_color_bgr[1]), int(avg_color_bgr[0]))
 
+    def get_checked_average_color(self, gate, region_size=100, max_attempts=6):
+        """
+        Like get_average_color, but every frame goes through `gate`
+        (frame_quality.FrameQualityGate) first. Clipped, blurred or moving frames
+        are dropped and re-captured; returns None if no frame passes. With
+        frames_per_sample > 1 the passing frames are averaged.
+        """
+        wanted = self.frames_per_sample
+        means = []
+        if gate.previous is None:
+            # Prime the motion check with one frame of this patch
+            frame = self.get_frame()
+            if frame is not None:
+                gate.assess(self.center_roi(frame, region_size))
+
+        attempts = max_attempts + wanted - 1
+        for attempt in range(attempts):
+            frame = self.get_frame()
+            if frame is None:
+                return None
+            roi = self.center_roi(frame, region_size)
+            if roi.size == 0:
+                return None
+
+            quality = gate.assess(roi)
+            if quality.ok:
+                means.append(self._roi_mean(roi))
+                if len(means) == wanted:
+                    break
+                continue
+            print(f"DEBUG: Frame ditolak ({quality.reason}), ambil ulang {attempt+1}/{attempts}")
+
+        if not means:
+            return None
+        if len(means) == 1 and self.response is None:
+            r, g, b = means[0]
+            return (int(r), int(g), int(b))
+        return self._combine_means(means)
+
+    def get_sequential_average_color(self, gate=None, region_size=100, min_frames=3, max_frames=30, stderr_target=0.5):
+        """
+        Early-stopping average: reads frames until the standard error of the mean
+        (worst channel, in the units of _roi_mean) drops below `stderr_target`,
+        at least `min_frames` and at most `max_frames`. Frames failing `gate` are
+        skipped. self.last_sample holds the frames used and the final stderr.
+        """
+        if gate is not None and gate.previous is None:
+            frame = self.get_frame()
+            if frame is not None:
+                gate.assess(self.center_roi(frame, region_size))
+        means = []
+        stderr = float("inf")
+        for _ in range(max_frames):
+            frame = self.get_frame()
+            if frame is None:
+                break
+            roi = self.center_roi(frame, region_size)
+            if roi.size == 0 or (gate is not None and not gate.assess(roi).ok):
+                continue
+            means.append(self._roi_mean(roi))
+            if len(means) >= max(min_frames, 2):
+                stderr = float(np.max(np.std(means, axis=0, ddof=1)) / np.sqrt(len(means)))
+                if stderr < stderr_target:
+                    break
+        self.last_sample = {"frames": len(means), "stderr": stderr}
+        if not means:
+            return None
+        return self._combine_means(means)
+
     def stop(self):
+        self.stop_recording()
+        self._release()
+
+    def _release(self):
         if self.cap:
             self.cap.release()
             self.cap = None
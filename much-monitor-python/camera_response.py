@@ -0,0 +1,226 @@
+import hashlib
+import os
+import re
+import time
+import numpy as np
+from color_math import srgb_to_linear
+
+CACHE_DIR = os.path.expanduser("~/.much_monitor/camera_response")
+
+
+class CameraResponse:
+    """
+    Per-channel camera response: a 256-entry table mapping the camera's 8-bit
+    output to relative linear light, plus per-channel gains. Applied to every
+    ROI as a single vectorized lookup before averaging.
+    """
+    def __init__(self, lut, gains=(1.0, 1.0, 1.0), camera_name="", resolution=(0, 0)):
+        self.lut = np.asarray(lut, dtype=np.float32)          # (256, 3), RGB order
+        self.gains = np.asarray(gains, dtype=np.float32)
+        self.camera_name = camera_name
+        self.resolution = tuple(int(v) for v in resolution)
+        # Gains folded in and flipped to BGR for direct use on OpenCV frames
+        self._lut_bgr = (self.lut * self.gains)[:, ::-1].copy()
+        self._channels = np.arange(3)
+
+    def linearize(self, pixels_bgr):
+        """uint8 BGR pixels -> float32 linear RGB (0..1 at nominal white), same leading shape."""
+        return self._lut_bgr[pixels_bgr, self._channels][..., ::-1]
+
+    def mean_rgb(self, roi_bgr):
+        """Mean linear-light RGB of a BGR ROI, scaled to 0-255."""
+        linear = self._lut_bgr[roi_bgr.reshape(-1, 3), self._channels]
+        b, g, r = linear.mean(axis=0) * 255.0
+        return (float(r), float(g), float(b))
+
+    def fingerprint(self):
+        """Short hash of the curve and gains: tells whether two runs used the same response."""
+        return hashlib.sha1(self.lut.tobytes() + self.gains.tobytes()).hexdigest()[:12]
+
+    @staticmethod
+    def cache_path(camera_name, resolution):
+        slug = re.sub(r"[^a-z0-9]+", "_", camera_name.lower()).strip("_") or "camera"
+        return os.path.join(CACHE_DIR, f"{slug}_{int(resolution[0])}x{int(resolution[1])}.npz")
+
+    def save(self, path=None):
+        path = path or self.cache_path(self.camera_name, self.resolution)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez(path, lut=self.lut, gains=self.gains, camera_name=self.camera_name,
+                 resolution=np.array(self.resolution))
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["lut"], data["gains"], str(data["camera_name"]), tuple(data["resolution"]))
+
+    @classmethod
+    def load_cached(cls, camera_name, resolution):
+        """Returns the cached response for this camera + resolution, or None."""
+        path = cls.cache_path(camera_name, resolution)
+        if not os.path.exists(path):
+            return None
+        try:
+            return cls.load(path)
+        except Exception as e:
+            print(f"Warning: Camera response cache rusak ({path}): {e}")
+            return None
+
+
+def solve_response(z, log_exposure, smoothness=50.0):
+    """
+    Debevec-Malik response recovery for one channel.
+    z: (P, J) integer pixel values of P scene points at J exposures.
+    log_exposure: (J,) natural log of the relative exposure times.
+    Returns g (256,), the log inverse response, with g(128) = 0 (a well-exposed
+    mid level, so the curve is not pinned to the noisy or clipped ends).
+    """
+    P, J = z.shape
+    n = 256
+    weight = np.minimum(np.arange(n), 255 - np.arange(n)).astype(float) + 1.0
+    # Block means within a few noise sigmas of 0 or 255 are biased by clipping:
+    # only the smoothness term shapes the curve there
+    data_weight = weight.copy()
+    data_weight[:1] = 0.0
+    data_weight[251:] = 0.0
+
+    rows = P * J + (n - 2) + 1
+    A = np.zeros((rows, n + P))
+    b = np.zeros(rows)
+
+    # Data terms: w(z) * (g(z) - ln E_i) = w(z) * ln t_j
+    r = np.arange(P * J)
+    zi = z.reshape(-1)
+    w = data_weight[zi]
+    A[r, zi] = w
+    A[r, n + np.repeat(np.arange(P), J)] = -w
+    b[r] = w * np.tile(log_exposure, P)
+
+    # Fix the arbitrary offset
+    A[P * J, 128] = 1.0
+
+    # Second-derivative smoothness on g
+    k = np.arange(1, n - 1)
+    r = P * J + 1 + np.arange(n - 2)
+    A[r, k - 1] = smoothness * weight[k]
+    A[r, k] = -2 * smoothness * weight[k]
+    A[r, k + 1] = smoothness * weight[k]
+
+    x = np.linalg.lstsq(A, b, rcond=None)[0]
+    return x[:n]
+
+
+def estimate_response(samples, exposures, camera_name="", resolution=(0, 0)):
+    """
+    Builds a CameraResponse from a bracketed gray ramp.
+    samples: (L, J, B, 3) mean RGB (0-255) of B sub-blocks of the ROI for L gray
+             levels at J exposures.
+    exposures: (J,) relative exposure times.
+    """
+    samples = np.asarray(samples, dtype=float)
+    L, J, B, _ = samples.shape
+    log_t = np.log(np.asarray(exposures, dtype=float))
+
+    lut = np.zeros((256, 3))
+    for c in range(3):
+        z = np.clip(np.rint(samples[..., c]), 0, 255).astype(int)
+        z = z.transpose(0, 2, 1).reshape(L * B, J)  # each (level, block) is one scene point
+        g = solve_response(z, log_t)
+        curve = np.exp(g)
+        curve[0] = 0.0
+        lut[:, c] = np.maximum.accumulate(curve)
+
+    # Anchor each channel's scale to the camera's nominal encoding at mid-tones so
+    # the white balance the camera already applies is kept.
+    ref = np.arange(64, 200)
+    nominal = srgb_to_linear(ref / 255.0)
+    gains = np.array([np.sum(nominal * lut[ref, c]) / np.sum(lut[ref, c] ** 2) for c in range(3)])
+    return CameraResponse(lut, gains, camera_name, resolution)
+
+
+def check_response(response, samples, exposures, valid=(4, 250)):
+    """
+    How well `response` explains its own bracket: each scene point linearized and
+    divided by its exposure should give the same value at every stop. Returns the
+    RMS relative deviation over unclipped samples (0.01 = 1%).
+    """
+    samples = np.asarray(samples, dtype=float)
+    codes = np.arange(256)
+    linear = np.stack([np.interp(samples[..., c], codes, response.lut[:, c] * response.gains[c])
+                       for c in range(3)], axis=-1)
+    radiance = linear / np.asarray(exposures, dtype=float)[None, :, None, None]
+    ok = (samples >= valid[0]) & (samples <= valid[1])
+    # Per scene point reference: the well-exposed samples' mean
+    mid = ok & (samples >= 64) & (samples <= 200)
+    ref = np.sum(np.where(mid, radiance, 0.0), axis=1) / np.maximum(mid.sum(axis=1), 1)
+    has_ref = np.broadcast_to((mid.sum(axis=1) > 0)[:, None], ok.shape)
+    use = ok & has_ref
+    if not np.any(use):
+        return np.inf
+    ref = np.broadcast_to(ref[:, None], radiance.shape)
+    deviation = (radiance[use] - ref[use]) / ref[use]
+    return float(np.sqrt(np.mean(deviation ** 2)))
+
+
+def characterize_camera(camera, show_patch, levels=(4, 8, 16, 32, 64, 96, 128, 160, 192, 208, 224, 232, 240, 248, 255),
+                        stops=(-5, -4, -3, -2, -1, 0, 0.5), settle=0.4, exposure_settle=0.05, flush=1,
+                        region_size=100, blocks=4):
+    """
+    Shows a gray ramp, captures each level at bracketed exposures and fits the
+    camera response. The dark levels and short stops put samples in the bottom
+    codes, the half stops fill the codes just below clipping. `show_patch(rgb)`
+    must put the patch on screen (and tell the camera via set_displayed_patch).
+    Returns a CameraResponse, or None when the camera does not allow exposure
+    control or the fit does not explain its own samples (check_response).
+    """
+    base = camera.get_exposure()
+    if base is None:
+        print("Karakterisasi kamera dilewati: exposure tidak bisa dikontrol.")
+        return None
+
+    exposures = [2.0 ** s for s in stops]
+    samples = np.zeros((len(levels), len(stops), blocks * blocks, 3))
+    try:
+        for i, v in enumerate(levels):
+            show_patch((v, v, v))
+            time.sleep(settle)
+            for j, stop in enumerate(stops):
+                if not camera.set_exposure(camera.exposure_for_stops(base, stop)):
+                    print("Karakterisasi kamera dilewati: kamera menolak setting exposure.")
+                    return None
+                time.sleep(exposure_settle)
+                for _ in range(flush):
+                    camera.get_frame()  # frames still exposed with the previous setting
+                frame = camera.get_frame()
+                if frame is None:
+                    return None
+                roi = camera.center_roi(frame, region_size).astype(np.float32)
+                h, w = roi.shape[0] // blocks * blocks, roi.shape[1] // blocks * blocks
+                grid = roi[:h, :w].reshape(blocks, h // blocks, blocks, w // blocks, 3)
+                samples[i, j] = grid.mean(axis=(1, 3)).reshape(-1, 3)[:, ::-1]
+    finally:
+        camera.set_exposure(base)
+
+    response = estimate_response(samples, exposures, camera.camera_name, camera.get_resolution())
+    error = check_response(response, samples, exposures)
+    if error > 0.05:
+        print(f"Karakterisasi kamera ditolak: kurva tidak konsisten dengan bracket ({error:.1%}).")
+        return None
+    return response
+
+
+if __name__ == "__main__":
+    # The simulated camera encodes with the sRGB curve: the fit should recover it
+    from camera_handler import CameraHandler
+    from camera_simulator import SimulatedCapture
+
+    camera = CameraHandler(backend=SimulatedCapture(seed=0), camera_name="Simulator")
+    camera.start()
+    t0 = time.perf_counter()
+    response = characterize_camera(camera, camera.set_displayed_patch)
+    camera.stop()
+    print(f"Karakterisasi: {time.perf_counter() - t0:.1f}s")
+    fitted = (response.lut * response.gains).mean(axis=1)
+    true = srgb_to_linear(np.arange(256) / 255.0)
+    for code in (2, 4, 8, 16, 64, 128, 200, 250, 254, 255):
+        print(f"  code {code:3d}: fitted/sRGB {fitted[code] / true[code]:.3f}")
@@ -0,0 +1,311 @@
+import time
+import cv2
+import numpy as np
+from color_math import linear_to_srgb
+
+# sRGB / Rec.709 primaries and D65 white (CIE xy)
+SRGB_PRIMARIES_XY = ((0.640, 0.330), (0.300, 0.600), (0.150, 0.060))
+D65_XY = (0.3127, 0.3290)
+
+
+def rgb_to_xyz_matrix(primaries_xy, white_xy):
+    """Builds the linear RGB -> XYZ matrix for a set of primaries and white point (Y_white = 1)."""
+    def xy_to_xyz(x, y):
+        return np.array([x / y, 1.0, (1.0 - x - y) / y])
+
+    P = np.stack([xy_to_xyz(x, y) for x, y in primaries_xy], axis=1)
+    W = xy_to_xyz(*white_xy)
+    scale = np.linalg.solve(P, W)
+    return P * scale
+
+
+class SimulatedDisplay:
+    """
+    Physically based model of a display panel.
+    Primaries + white point define the RGB->XYZ matrix, each channel has its own
+    power-law TRC, and patch changes settle exponentially with `response_time`.
+    """
+    def __init__(self, primaries_xy=SRGB_PRIMARIES_XY, white_xy=D65_XY, gamma=(2.2, 2.2, 2.2),
+                 white_luminance=1.0, black_level=0.002, response_time=0.02,
+                 resolution=(1920, 1080), defects=None, edge_falloff=0.0, pwm_frequency=None, pwm_duty=1.0):
+        self.resolution = resolution
+        # PWM backlight: square wave at `pwm_frequency` Hz, on for `pwm_duty` of each cycle.
+        # The average light stays the same, so steady_xyz is the time average.
+        self.pwm_frequency = pwm_frequency
+        self.pwm_duty = pwm_duty
+        # Backlight non-uniformity: fraction of light lost at the panel corners
+        # (scalar, or per channel for a tint that drifts towards the edges)
+        self.edge_falloff = np.broadcast_to(np.asarray(edge_falloff, dtype=np.float32), (3,))
+        # {(x, y): (r, g, b)} pixels stuck at a fixed value, e.g. (0, 0, 0) for a dead pixel
+        self.defects = dict(defects or {})
+        self.primaries_xy = primaries_xy
+        self.white_xy = white_xy
+        self.gamma = np.array(gamma, dtype=float)
+        self.white_luminance = white_luminance
+        self.black_level = black_level
+        self.response_time = response_time
+        self.rgb_to_xyz = rgb_to_xyz_matrix(primaries_xy, white_xy)
+        self.white_xyz = self.rgb_to_xyz.sum(axis=1) * white_luminance
+
+        # Transition history: (switch_time, start_xyz, end_xyz), newest last
+        self._history = [(-np.inf, self.steady_xyz((0, 0, 0)), self.steady_xyz((0, 0, 0)))]
+
+    def steady_xyz(self, rgb):
+        """Emitted XYZ once the panel has fully settled on `rgb` (0-255)."""
+        linear = np.power(np.asarray(rgb, dtype=float) / 255.0, self.gamma)
+        xyz = self.rgb_to_xyz @ linear * self.white_luminance
+        # Light leakage lifts black uniformly (scaled to display white)
+        return xyz + self.white_xyz * self.black_level * (1.0 - linear.max())
+
+    def image_linear(self, img):
+        """Full-screen uint8 RGB image -> per-pixel linear RGB (float32), defects applied."""
+        if self.defects:
+            img = img.copy()
+            for (x, y), rgb in self.defects.items():
+                img[y, x] = rgb
+        lut = np.power(np.arange(256, dtype=np.float32)[:, None] / 255.0, self.gamma.astype(np.float32))
+        linear = lut[img, np.arange(3)]
+        if self.edge_falloff.any():
+            h, w = img.shape[:2]
+            yy, xx = np.ogrid[0:h, 0:w]
+            r2 = (((xx - w / 2) / (w / 2)) ** 2 + ((yy - h / 2) / (h / 2)) ** 2).astype(np.float32) / 2
+            linear *= 1.0 - r2[..., None] * self.edge_falloff
+        return linear
+
+    def pwm_gain(self, t0, t1):
+        """Mean backlight level over the window [t0, t1] relative to its time average."""
+        if not self.pwm_frequency or self.pwm_duty >= 1.0 or t1 <= t0:
+            return 1.0
+        period = 1.0 / self.pwm_frequency
+        on = self.pwm_duty * period
+
+        def on_time(t):
+            # Total on-time from 0 to t (each period starts with the on phase)
+            n, rem = divmod(t, period)
+            return n * on + min(rem, on)
+
+        return (on_time(t1) - on_time(t0)) / (t1 - t0) / self.pwm_duty
+
+    def xyz_at(self, t):
+        """Emitted XYZ at time `t`, including the panel's response-time transition."""
+        for t0, start, end in reversed(self._history):
+            if t >= t0:
+                if self.response_time <= 0:
+                    return end
+                k = np.exp(-(t - t0) / self.response_time)
+                return end + (start - end) * k
+        return self._history[0][2]
+
+    def set_patch(self, rgb, t):
+        start = self.xyz_at(t)
+        self._history.append((t, start, self.steady_xyz(rgb)))
+        # Only the latest few transitions can still be visible through camera latency
+        del self._history[:-8]
+
+
+class SimulatedCamera:
+    """
+    Camera model: exposure gain, per-channel gains, per-pixel Gaussian noise, radial
+    vignetting and a fixed capture latency. Output is 8-bit BGR encoded with the sRGB
+    curve, or a plain power law when `tone_gamma` is set (a non-ideal camera).
+    """
+    def __init__(self, width=640, height=480, exposure=0.85, noise_sigma=1.5, vignetting=0.25,
+                 latency=0.08, fps=None, tone_gamma=None, channel_gains=(1.0, 1.0, 1.0), shutter=1 / 120):
+        self.width = width
+        self.shutter = shutter  # integration time per frame (s)
+        self.height = height
+        self.exposure = exposure
+        self.tone_gamma = tone_gamma
+        self.channel_gains = np.array(channel_gains, dtype=float)
+        self.noise_sigma = noise_sigma
+        self.latency = latency
+        self.fps = fps
+        self.xyz_to_rgb = np.linalg.inv(rgb_to_xyz_matrix(SRGB_PRIMARIES_XY, D65_XY))
+
+        yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+        r2 = ((xx - width / 2) ** 2 + (yy - height / 2) ** 2) / ((width / 2) ** 2 + (height / 2) ** 2)
+        self.vignette = (1.0 - vignetting * r2)[..., None]
+
+    def linear_response(self, xyz):
+        """Camera linear RGB for a field of colour `xyz`, before vignetting."""
+        return np.clip(self.xyz_to_rgb @ xyz, 0, None) * self.channel_gains * self.exposure
+
+    def encode(self, linear):
+        if self.tone_gamma:
+            return np.power(np.clip(linear, 0.0, 1.0), 1.0 / self.tone_gamma)
+        return linear_to_srgb(linear)
+
+    def expose(self, xyz, rng):
+        """Renders one frame of a uniformly lit field of colour `xyz`."""
+        field = self.vignette * self.linear_response(xyz)[::-1].astype(np.float32)  # RGB -> BGR
+        return self.develop(field, rng)
+
+    def develop(self, field, rng):
+        """Linear BGR field at the sensor -> noisy, encoded 8-bit frame."""
+        encoded = self.encode(field) * 255.0
+        if self.noise_sigma > 0:
+            encoded += rng.normal(0.0, self.noise_sigma, encoded.shape).astype(np.float32)
+        return np.clip(np.rint(encoded), 0, 255).astype(np.uint8)
+
+
+class SimulatedCapture:
+    """
+    Drop-in replacement for cv2.VideoCapture driven by a SimulatedDisplay.
+    Pass it as `CameraHandler(backend=...)`; the handler forwards the patch on
+    screen through `set_patch`, so captured frames follow what the overlay shows.
+    """
+    linear_exposure = True
+
+    def __init__(self, display=None, camera=None, seed=0, clock=time.monotonic, screen_quad=None):
+        self.display = display or SimulatedDisplay()
+        self.camera = camera or SimulatedCamera()
+        self.clock = clock
+        self.rng = np.random.default_rng(seed)
+        self._opened = False
+        self._last_read = None
+
+        # Where the screen corners (TL, TR, BR, BL) land in the camera frame when a
+        # full image is shown; a slight keystone like a hand-placed camera.
+        w, h = self.camera.width, self.camera.height
+        if screen_quad is None:
+            screen_quad = [(0.06 * w, 0.08 * h), (0.94 * w, 0.06 * h), (0.95 * w, 0.93 * h), (0.05 * w, 0.92 * h)]
+        self.screen_quad = np.array(screen_quad, dtype=np.float32)
+        self._image_field = None
+        self._grabbed = None
+        self._timestamp = 0.0
+        self.buffer_frames = 4
+
+    def isOpened(self):
+        return self._opened
+
+    def start(self):
+        self._opened = True
+        return True
+
+    def release(self):
+        self._opened = False
+
+    def set_patch(self, rgb):
+        self._image_field = None
+        self.display.set_patch(rgb, self.clock())
+
+    def set_image(self, img):
+        """Shows a full-screen uint8 RGB image (e.g. a test pattern) instead of a flat patch."""
+        d, cam = self.display, self.camera
+        linear = d.image_linear(img)
+        to_cam = cam.xyz_to_rgb @ d.rgb_to_xyz * d.white_luminance
+        field = linear @ (to_cam.T * cam.channel_gains * cam.exposure).astype(np.float32).T
+        field += (cam.xyz_to_rgb @ d.white_xyz * d.black_level * cam.channel_gains * cam.exposure).astype(np.float32)
+
+        # Optics: integrate screen pixels down to roughly the camera's sampling first
+        sh, sw = field.shape[:2]
+        span = np.linalg.norm(self.screen_quad[1] - self.screen_quad[0]) / sw
+        if span < 1:
+            field = cv2.resize(field, (max(1, int(sw * span)), max(1, int(sh * span))), interpolation=cv2.INTER_AREA)
+            sh, sw = field.shape[:2]
+        # Pixel centres sit on integer coordinates, so the screen's outer edge is at -0.5
+        src = np.array([(0, 0), (sw, 0), (sw, sh), (0, sh)], dtype=np.float32) - 0.5
+        H = cv2.getPerspectiveTransform(src, self.screen_quad)
+        warped = cv2.warpPerspective(field[..., ::-1].copy(), H, (cam.width, cam.height), flags=cv2.INTER_LINEAR)
+        self._image_field = np.clip(warped * self.camera.vignette, 0, 1)
+
+    def grab(self):
+        """Latches the exposure time of the next frame; retrieve() develops it."""
+        if not self._opened:
+            return False
+        now = self.clock()
+        if self.camera.fps:
+            # Frames come from the sensor clock through a small buffer: a late reader
+            # gets the next queued frame (exposed on time) until the buffer overruns
+            period = 1.0 / self.camera.fps
+            slot = now if self._last_read is None else self._last_read + period
+            if now - slot > self.buffer_frames * period:
+                slot += period * np.floor((now - slot) / period)
+            if slot - now > 0:
+                time.sleep(slot - now)
+            self._last_read = now = slot
+        self._grabbed = now - self.camera.latency
+        return True
+
+    def retrieve(self, image=None):
+        if self._grabbed is None:
+            return False, None
+        t, self._grabbed = self._grabbed, None
+        self._timestamp = t
+        gain = self.display.pwm_gain(t - self.camera.shutter, t)
+        if self._image_field is not None:
+            frame = self.camera.develop(self._image_field * np.float32(gain), self.rng)
+        else:
+            frame = self.camera.expose(self.display.xyz_at(t) * gain, self.rng)
+        if image is not None:
+            # cv2.VideoCapture semantics: fill the caller's buffer
+            np.copyto(image, frame)
+            frame = image
+        return True, frame
+
+    def read(self, image=None):
+        if not self.grab():
+            return False, None
+        return self.retrieve(image)
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.camera.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.camera.height)
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.camera.fps or 0)
+        if prop == cv2.CAP_PROP_EXPOSURE:
+            return float(self.camera.exposure)
+        if prop == cv2.CAP_PROP_POS_MSEC:
+            return self._timestamp * 1000.0
+        return 0.0
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_EXPOSURE:
+            # Simulated exposure is a linear gain rather than log2 seconds
+            self.camera.exposure = float(value)
+            return True
+        return False
+
+    def ground_truth(self):
+        """Known display parameters, for checking what a calibration run recovered."""
+        d = self.display
+        return {
+            "rgb_to_xyz": d.rgb_to_xyz * d.white_luminance,
+            "white_xyz": d.white_xyz,
+            "gamma": tuple(d.gamma),
+            "primaries_xy": d.primaries_xy,
+            "white_xy": d.white_xy,
+            "response_time": d.response_time,
+        }
+
+    def expected_capture(self, rgb):
+        """Noise-free settled camera RGB (0-255) at the frame centre for `rgb` on screen."""
+        cam_linear = self.camera.linear_response(self.display.steady_xyz(rgb))
+        return tuple(float(v) for v in self.camera.encode(cam_linear) * 255.0)
+
+
+if __name__ == "__main__":
+    # Headless end-to-end run against a panel with known, non-ideal parameters
+    from camera_handler import CameraHandler
+    from calibration_logic import CalibrationLogic
+
+    sim = SimulatedCapture(SimulatedDisplay(gamma=(2.3, 2.2, 2.1), white_xy=(0.3135, 0.3305)))
+    handler = CameraHandler(backend=sim)
+    logic = CalibrationLogic()
+    handler.start()
+
+    patches = [(v, v, v) for v in range(0, 256, 32)] + [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 255)]
+    t0 = time.perf_counter()
+    for rgb in patches:
+        handler.set_displayed_patch(rgb)
+        time.sleep(0.15)
+        logic.record_sample(rgb, handler.get_average_color())
+    elapsed = time.perf_counter() - t0
+    handler.stop()
+
+    metrics = logic.get_performance_metrics()
+    print(f"{len(patches)} patches in {elapsed:.2f}s")
+    print(f"Ground truth gamma: {sim.ground_truth()['gamma']}")
+    print(f"Avg corrected error: {metrics['avg_corrected']:.2f} ({metrics['grade']})")
@@ -0,0 +1,226 @@
+"""
+CGATS.17 text files (Argyll .ti1 / .ti3).
+
+Layout: an identifier line (CTI1, CTI3 ...), keyword lines, the field names
+between BEGIN_DATA_FORMAT / END_DATA_FORMAT, NUMBER_OF_SETS and the rows
+between BEGIN_DATA / END_DATA. Only the first table of a file is read.
+
+Ti3Writer streams measurement rows as they come in; read_cgats loads a whole
+table into NumPy columns in one parse.
+"""
+import os
+import re
+import time
+import warnings
+import numpy as np
+
+_TOKEN = re.compile(r'"[^"]*"|\S+')
+
+
+def _tokens(line):
+    return [t[1:-1] if t.startswith('"') else t for t in _TOKEN.findall(line)]
+
+
+class CGATSReader:
+    """
+    Streaming reader: the header is parsed on open, rows are read on demand by
+    rows(), so files with thousands of sets never sit in memory.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.identifier = None
+        self.keywords = {}
+        self.fields = []
+        self.number_of_sets = None
+        self._file = open(path, "r", encoding="ascii", errors="replace")
+        self._read_header()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    def _read_header(self):
+        in_format = False
+        for line in self._file:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if self.identifier is None:
+                self.identifier = line.split()[0]
+                continue
+            if in_format:
+                if line.startswith("END_DATA_FORMAT"):
+                    in_format = False
+                else:
+                    self.fields.extend(_tokens(line))
+                continue
+            if line.startswith("BEGIN_DATA_FORMAT"):
+                in_format = True
+            elif line.startswith("BEGIN_DATA"):
+                return
+            else:
+                parts = _tokens(line)
+                key = parts[0]
+                value = " ".join(parts[1:])
+                if key == "NUMBER_OF_SETS":
+                    self.number_of_sets = int(value)
+                elif key not in ("NUMBER_OF_FIELDS", "KEYWORD"):
+                    self.keywords[key] = value
+        raise ValueError(f"No BEGIN_DATA in {self.path}")
+
+    def field_index(self, *names):
+        """Column indices of `names` (ValueError if a field is missing)."""
+        try:
+            return [self.fields.index(n) for n in names]
+        except ValueError:
+            raise ValueError(f"{self.path}: needs fields {names}, has {self.fields}")
+
+    def rows(self):
+        """Yields each data row as a list of strings, up to END_DATA."""
+        for line in self._file:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("END_DATA"):
+                return
+            yield _tokens(line)
+
+    def read_arrays(self):
+        """
+        The remaining rows as {field: column}. Numeric columns are float arrays,
+        others string arrays. Parsed in one go: np.fromstring for all-numeric data,
+        a single split otherwise.
+        """
+        text = self._file.read()
+        end = text.find("END_DATA")
+        block = text if end < 0 else text[:end]
+        if "#" in block:
+            block = "\n".join(line.split("#", 1)[0] for line in block.splitlines())
+        width = len(self.fields)
+        values = None
+        if '"' not in block:
+            with warnings.catch_warnings():
+                # NumPy warns (instead of failing) when it stops at a non-numeric token
+                warnings.simplefilter("error", DeprecationWarning)
+                try:
+                    values = np.fromstring(block, dtype=float, sep=" ")
+                except (DeprecationWarning, ValueError):
+                    values = None
+        tokens = None
+        if values is None or values.size % width:
+            tokens = np.array([t for line in block.splitlines() for t in _tokens(line)])
+            values = tokens
+        table = values[:len(values) - len(values) % width].reshape(-1, width)
+        columns = {}
+        for i, name in enumerate(self.fields):
+            column = table[:, i]
+            if tokens is not None:
+                try:
+                    column = column.astype(float)
+                except ValueError:
+                    pass
+            columns[name] = column
+        return columns
+
+
+def read_cgats(path):
+    """(header keywords, {field: column array}) of the first table of a CGATS file."""
+    with CGATSReader(path) as reader:
+        columns = reader.read_arrays()
+        keywords = dict(reader.keywords, IDENTIFIER=reader.identifier)
+    return keywords, columns
+
+
+TI3_FIELDS = ("SAMPLE_ID", "RGB_R", "RGB_G", "RGB_B", "XYZ_X", "XYZ_Y", "XYZ_Z")
+_COUNT_WIDTH = 10
+
+
+class Ti3Writer:
+    """
+    Argyll-style display .ti3 (device RGB 0-100, XYZ with white Y ~ 100) written
+    row by row. Rows go through the file buffer and are flushed + fsynced every
+    `sync_every` rows, when NUMBER_OF_SETS (a fixed-width field) is also patched
+    in place, so a crash leaves a file readable up to the last sync.
+    """
+    def __init__(self, path, descriptor="Much Monitor display measurements", keywords=None, sync_every=25):
+        self.path = path
+        self.sync_every = sync_every
+        self.count = 0
+        self._f = open(path, "w+", encoding="ascii", newline="\n")
+        header = [
+            "CTI3", "",
+            f'DESCRIPTOR "{descriptor}"',
+            'ORIGINATOR "Much Monitor Python Calibrator"',
+            f'CREATED "{time.strftime("%a %b %d %H:%M:%S %Y")}"',
+            'KEYWORD "DEVICE_CLASS"', 'DEVICE_CLASS "DISPLAY"',
+            'KEYWORD "COLOR_REP"', 'COLOR_REP "RGB_XYZ"',
+        ]
+        for key, value in (keywords or {}).items():
+            header += [f'KEYWORD "{key}"', f'{key} "{value}"']
+        header += ["", f"NUMBER_OF_FIELDS {len(TI3_FIELDS)}", "BEGIN_DATA_FORMAT", " ".join(TI3_FIELDS),
+                   "END_DATA_FORMAT", ""]
+        self._f.write("\n".join(header) + "\nNUMBER_OF_SETS ")
+        self._count_pos = self._f.tell()
+        self._f.write(f"{0:<{_COUNT_WIDTH}d}\nBEGIN_DATA\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, rgb, xyz):
+        """One measurement: device RGB 0-255 and XYZ (white Y ~ 100)."""
+        self.count += 1
+        r, g, b = (v / 2.55 for v in rgb)
+        x, y, z = xyz
+        self._f.write(f"{self.count} {r:.4f} {g:.4f} {b:.4f} {x:.6f} {y:.6f} {z:.6f}\n")
+        if self.count % self.sync_every == 0:
+            self.sync()
+
+    def write_many(self, rgb, xyz):
+        """(N, 3) arrays at once, formatted with np.savetxt."""
+        rgb = np.asarray(rgb, dtype=float) / 2.55
+        ids = np.arange(self.count + 1, self.count + len(rgb) + 1)[:, None]
+        np.savetxt(self._f, np.hstack([ids, rgb, np.asarray(xyz, dtype=float)]),
+                   fmt=["%d"] + ["%.4f"] * 3 + ["%.6f"] * 3)
+        self.count += len(rgb)
+        self.sync()
+
+    def _patch_count(self):
+        end = self._f.tell()
+        self._f.seek(self._count_pos)
+        self._f.write(f"{self.count:<{_COUNT_WIDTH}d}")
+        self._f.seek(end)
+
+    def sync(self):
+        self._patch_count()
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def close(self):
+        if self._f.closed:
+            return
+        self._f.write("END_DATA\n")
+        self.sync()
+        self._f.close()
+
+
+if __name__ == "__main__":
+    import sys
+    path = sys.argv[1] if len(sys.argv) > 1 else "demo_measurements.ti3"
+    if len(sys.argv) < 2:
+        rng = np.random.default_rng(0)
+        rgb = rng.integers(0, 256, (100_000, 3))
+        with Ti3Writer(path, sync_every=10_000) as writer:
+            writer.write_many(rgb, rng.random((len(rgb), 3)) * 100)
+    t0 = time.perf_counter()
+    keywords, columns = read_cgats(path)
+    ms = (time.perf_counter() - t0) * 1000
+    n = len(next(iter(columns.values()))) if columns else 0
+    print(f"{path}: {keywords.get('IDENTIFIER')}, {n} set, {len(columns)} kolom, dibaca dalam {ms:.0f} ms")
@@ -0,0 +1,262 @@
+"""
+Colour correction matrix fits that survive bad samples.
+
+All solvers take X (N, P) features of the captured linear RGB and Y (N, 3)
+target linear RGB and solve Y ~ X @ CCM. Residuals are judged per sample
+(Euclidean norm over the three channels), so a patch caught during a reflection
+or a camera bump is down-weighted or dropped as a whole and reported back for
+re-measurement.
+
+The feature expansion is the model: a plain 3x3 matrix, 3x4 affine,
+polynomial or root-polynomial (Finlayson et al. 2015, exposure invariant).
+`select_model` picks one by k-fold cross-validation in CIEDE2000, with every
+fold solved in one batched call.
+"""
+from collections import namedtuple
+import numpy as np
+from color_math import SRGB_TO_XYZ, xyz_to_lab, delta_e_2000
+
+CCMFit = namedtuple("CCMFit", ["ccm", "weights", "outliers", "residuals", "scale", "method", "model"],
+                    defaults=("linear",))
+
+MIN_SAMPLES = 3
+
+
+def _monomials(degree):
+    """Exponent triples (i, j, k) with i + j + k == degree."""
+    return [(i, j, degree - i - j) for i in range(degree, -1, -1) for j in range(degree - i, -1, -1)]
+
+
+def _model_terms(kind, degree):
+    """(exponents (T, 3), root (T,)) of a model: monomial ** (1 / root)."""
+    terms = []
+    for d in range(1, degree + 1):
+        for e in _monomials(d):
+            if kind == "root" and d > 1 and max(e) == d:
+                continue  # (r^d)^(1/d) = r, already a term
+            terms.append((e, d if kind == "root" else 1))
+    exps = np.array([t[0] for t in terms], dtype=float)
+    roots = np.array([t[1] for t in terms], dtype=float)
+    return exps, roots
+
+
+# name -> (kind, degree, constant term)
+MODELS = {
+    "linear": ("poly", 1, False),
+    "affine": ("poly", 1, True),
+    "poly2": ("poly", 2, True),
+    "poly3": ("poly", 3, True),
+    "rootpoly2": ("root", 2, False),
+    "rootpoly3": ("root", 3, False),
+}
+_TERMS = {name: _model_terms(kind, degree) for name, (kind, degree, _) in MODELS.items()}
+
+
+def expand_features(rgb, model="linear"):
+    """(N, 3) linear RGB -> (N, P) model features, vectorized."""
+    rgb = np.atleast_2d(np.asarray(rgb, dtype=float))
+    if model == "linear":
+        return rgb
+    kind, _, constant = MODELS[model]
+    exps, roots = _TERMS[model]
+    base = np.clip(rgb, 0.0, None) if kind == "root" else rgb
+    features = np.prod(base[:, None, :] ** exps[None], axis=2)
+    if kind == "root":
+        features = features ** (1.0 / roots)
+    if constant:
+        features = np.hstack([features, np.ones((len(features), 1))])
+    return features
+
+
+def residual_norms(X, Y, ccm):
+    return np.linalg.norm(X @ ccm - Y, axis=1)
+
+
+def robust_scale(residuals):
+    """MAD-based scale of per-sample residual norms (norms are >= 0, so median * 1.4826)."""
+    scale = 1.4826 * float(np.median(residuals))
+    return scale if scale > 1e-12 else float(np.mean(residuals)) + 1e-12
+
+
+def _weighted_solve(X, Y, w):
+    # Normal equations: a P x P solve (P = feature terms, 3 to 20) instead of lstsq on N x P
+    Xw = X * w[:, None]
+    return np.linalg.solve(Xw.T @ X + 1e-12 * np.eye(X.shape[1]), Xw.T @ Y)
+
+
+def fit_lstsq(X, Y, cutoff=3.0):
+    """Plain least squares. Samples beyond `cutoff` robust sigmas are reported, not removed."""
+    ccm = np.linalg.lstsq(X, Y, rcond=None)[0]
+    r = residual_norms(X, Y, ccm)
+    scale = robust_scale(r)
+    return CCMFit(ccm, np.ones(len(X)), np.flatnonzero(r > cutoff * scale), r, scale, "lstsq")
+
+
+def fit_huber(X, Y, k=1.345, cutoff=3.0, iterations=30, tol=1e-8):
+    """
+    Huber M-estimate by iteratively reweighted least squares: weight 1 inside
+    k robust sigmas, k*sigma/|r| beyond. Samples still beyond `cutoff` sigmas
+    at convergence are reported as outliers.
+    """
+    w = np.ones(len(X))
+    ccm = _weighted_solve(X, Y, w)
+    for _ in range(iterations):
+        r = residual_norms(X, Y, ccm)
+        scale = robust_scale(r)
+        w = np.minimum(1.0, k * scale / np.maximum(r, 1e-12))
+        new = _weighted_solve(X, Y, w)
+        done = np.abs(new - ccm).max() < tol
+        ccm = new
+        if done:
+            break
+    r = residual_norms(X, Y, ccm)
+    scale = robust_scale(r)
+    return CCMFit(ccm, w, np.flatnonzero(r > cutoff * scale), r, scale, "huber")
+
+
+def fit_ransac(X, Y, iterations=256, cutoff=3.0, seed=0):
+    """
+    RANSAC over minimal subsets (as many samples as features). All candidate matrices are solved in one
+    batched np.linalg.solve and scored at once by their median residual (LMedS), so
+    no fixed inlier threshold is needed; the inliers of the best candidate (within
+    `cutoff` robust sigmas) are refitted by least squares.
+    """
+    n, p = X.shape
+    if n <= p:
+        return fit_lstsq(X, Y, cutoff)
+    rng = np.random.default_rng(seed)
+    subsets = rng.integers(0, n, (iterations, p))
+    A = X[subsets]  # (iterations, p, p)
+    B = Y[subsets]
+    # Subsets that drew a sample twice are singular and drop out here
+    ok = np.abs(np.linalg.det(A)) > 1e-9
+    if not ok.any():
+        return fit_lstsq(X, Y, cutoff)
+    candidates = np.linalg.solve(A[ok], B[ok])  # (k, p, 3)
+    diff = X @ candidates - Y  # (k, n, 3)
+    r2 = np.einsum("knj,knj->kn", diff, diff)
+    mid = n // 2
+    best = int(np.argmin(np.partition(r2, mid, axis=1)[:, mid]))
+    r = np.sqrt(r2[best])
+
+    inliers = r <= cutoff * robust_scale(r)
+    if inliers.sum() < p:
+        inliers[:] = True
+    ccm = np.linalg.lstsq(X[inliers], Y[inliers], rcond=None)[0]
+    r = residual_norms(X, Y, ccm)
+    scale = robust_scale(r[inliers])
+    outliers = np.flatnonzero(r > cutoff * scale)
+    weights = np.ones(n)
+    weights[outliers] = 0.0
+    return CCMFit(ccm, weights, outliers, r, scale, "ransac")
+
+
+FITTERS = {
+    "lstsq": fit_lstsq,
+    "huber": fit_huber,
+    "ransac": fit_ransac,
+}
+
+
+def fit_ccm(X, Y, method="huber", model="linear", **kwargs):
+    """
+    Expands the (N, 3) captured linear RGB with `model` and dispatches to one of
+    FITTERS. Returns a CCMFit (None with fewer samples than model terms).
+    """
+    X = expand_features(X, model)
+    Y = np.asarray(Y, dtype=float)
+    if len(X) < max(MIN_SAMPLES, X.shape[1]):
+        return None
+    if method not in FITTERS:
+        raise ValueError(f"Unknown CCM method: {method}")
+    return FITTERS[method](X, Y, **kwargs)._replace(model=model)
+
+
+def apply_fit(fit, rgb):
+    """Corrected linear RGB of (N, 3) captured linear RGB."""
+    return expand_features(rgb, fit.model) @ fit.ccm
+
+
+def linear_to_lab(rgb):
+    return xyz_to_lab(np.clip(rgb, 0.0, None) @ SRGB_TO_XYZ.T)
+
+
+def cross_validate(X, Y, model, weights=None, folds=5, ridge=1e-6, seed=0):
+    """
+    k-fold CIEDE2000 of a model, (N,) per sample. The weighted normal equations of
+    every fold come from the full Gram matrix minus that fold's share, so all
+    folds are solved in one batched np.linalg.solve.
+    """
+    F = expand_features(X, model)
+    Y = np.asarray(Y, dtype=float)
+    n, p = F.shape
+    w = np.ones(n) if weights is None else np.asarray(weights, dtype=float)
+    fold = np.random.default_rng(seed).permutation(n) % folds
+    member = (fold[None, :] == np.arange(folds)[:, None]) * w[None, :]  # (folds, n)
+
+    Fw = F * w[:, None]
+    gram = Fw.T @ F
+    cross = Fw.T @ Y
+    gram_k = gram[None] - np.einsum("kn,np,nq->kpq", member, F, F)
+    cross_k = cross[None] - np.einsum("kn,np,nq->kpq", member, F, Y)
+    # A touch of ridge keeps high-order models solvable on small folds
+    lam = ridge * np.trace(gram) / p
+    coefs = np.linalg.solve(gram_k + lam * np.eye(p), cross_k)  # (folds, p, 3)
+    predicted = np.einsum("np,npq->nq", F, coefs[fold])
+    return delta_e_2000(linear_to_lab(predicted), linear_to_lab(Y))
+
+
+def select_model(X, Y, method="huber", models=None, folds=5, tolerance=0.05):
+    """
+    Robust-fits every model, cross-validates it with the fit's weights (outliers do
+    not vote) and returns (best CCMFit, {model: mean CV delta E}). Within
+    `tolerance` of the best score the model with fewer terms wins.
+    """
+    X = np.asarray(X, dtype=float)
+    Y = np.asarray(Y, dtype=float)
+    models = list(MODELS) if models is None else models
+    scores, fits = {}, {}
+    for model in models:
+        terms = expand_features(X[:1], model).shape[1]
+        # Each training split needs comfortably more samples than terms
+        if len(X) * (folds - 1) / folds < 2 * terms:
+            continue
+        fit = fit_ccm(X, Y, method, model)
+        if fit is None:
+            continue
+        errors = cross_validate(X, Y, model, fit.weights, folds)
+        scores[model] = float(np.average(errors, weights=fit.weights))
+        fits[model] = (terms, fit)
+    if not scores:
+        return None, scores
+    best = min(scores.values())
+    eligible = [m for m in scores if scores[m] <= best * (1 + tolerance)]
+    chosen = min(eligible, key=lambda m: (fits[m][0], scores[m]))
+    return fits[chosen][1], scores
+
+
+if __name__ == "__main__":
+    import time
+    rng = np.random.default_rng(1)
+    true_ccm = np.array([[1.10, -0.05, 0.00], [-0.08, 1.05, -0.04], [0.02, -0.06, 1.12]])
+    Y = rng.random((300, 3))
+    X = Y @ np.linalg.inv(true_ccm) + rng.normal(0, 0.003, Y.shape)
+    bad = rng.choice(len(X), 15, replace=False)
+    X[bad] += rng.uniform(0.1, 0.4, (15, 1))  # reflections: brighter in every channel
+
+    for method in FITTERS:
+        t0 = time.perf_counter()
+        fit = fit_ccm(X, Y, method)
+        ms = (time.perf_counter() - t0) * 1000
+        found = len(set(fit.outliers) & set(bad))
+        print(f"{method:7s} error {np.abs(fit.ccm - true_ccm).max():.4f}  outliers {len(fit.outliers):2d} "
+              f"({found}/{len(bad)} injected)  {ms:.1f} ms")
+
+    # A camera with channel crosstalk that grows with level: the 3x3 cannot follow it
+    X = Y @ np.linalg.inv(true_ccm)
+    X = X + 0.08 * X * X[:, [1, 2, 0]] + rng.normal(0, 0.003, Y.shape)
+    t0 = time.perf_counter()
+    fit, scores = select_model(X, Y)
+    ms = (time.perf_counter() - t0) * 1000
+    print("CV delta E:", ", ".join(f"{m} {s:.2f}" for m, s in scores.items()))
+    print(f"Model terpilih: {fit.model} ({ms:.1f} ms)")
@@ -0,0 +1,76 @@
+import numpy as np
+
+# Linear sRGB (D65) -> CIE XYZ
+SRGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+])
+XYZ_TO_SRGB = np.linalg.inv(SRGB_TO_XYZ)
+
+
+def srgb_to_linear(encoded):
+    """sRGB EOTF, vectorized. Input and output in [0, 1]."""
+    encoded = np.clip(np.asarray(encoded, dtype=float), 0.0, 1.0)
+    return np.where(encoded <= 0.04045, encoded / 12.92, np.power((encoded + 0.055) / 1.055, 2.4))
+
+
+def linear_to_srgb(linear):
+    """sRGB OETF (inverse of srgb_to_linear), vectorized. Input and output in [0, 1]."""
+    linear = np.clip(np.asarray(linear, dtype=float), 0.0, 1.0)
+    return np.where(linear <= 0.0031308, linear * 12.92, 1.055 * np.power(linear, 1 / 2.4) - 0.055)
+
+
+# D65 reference white (Y = 1)
+D65_WHITE_XYZ = SRGB_TO_XYZ.sum(axis=1)
+
+
+def xyz_to_lab(xyz, white=D65_WHITE_XYZ):
+    """CIE XYZ -> CIELAB, vectorized over the last axis."""
+    t = np.asarray(xyz, dtype=float) / np.asarray(white, dtype=float)
+    delta = 6.0 / 29.0
+    f = np.where(t > delta ** 3, np.cbrt(t), t / (3 * delta ** 2) + 4.0 / 29.0)
+    L = 116.0 * f[..., 1] - 16.0
+    a = 500.0 * (f[..., 0] - f[..., 1])
+    b = 200.0 * (f[..., 1] - f[..., 2])
+    return np.stack([L, a, b], axis=-1)
+
+
+def delta_e_2000(lab1, lab2):
+    """CIEDE2000 colour difference, vectorized over the last axis (broadcasts)."""
+    lab1 = np.asarray(lab1, dtype=float)
+    lab2 = np.asarray(lab2, dtype=float)
+    L1, a1, b1 = lab1[..., 0], lab1[..., 1], lab1[..., 2]
+    L2, a2, b2 = lab2[..., 0], lab2[..., 1], lab2[..., 2]
+
+    C_mean = (np.hypot(a1, b1) + np.hypot(a2, b2)) / 2
+    G = 0.5 * (1 - np.sqrt(C_mean ** 7 / (C_mean ** 7 + 25.0 ** 7)))
+    a1p, a2p = a1 * (1 + G), a2 * (1 + G)
+    C1p, C2p = np.hypot(a1p, b1), np.hypot(a2p, b2)
+    h1p = np.degrees(np.arctan2(b1, a1p)) % 360
+    h2p = np.degrees(np.arctan2(b2, a2p)) % 360
+
+    dLp = L2 - L1
+    dCp = C2p - C1p
+    dhp = h2p - h1p
+    dhp = np.where(dhp > 180, dhp - 360, np.where(dhp < -180, dhp + 360, dhp))
+    dhp = np.where(C1p * C2p == 0, 0.0, dhp)
+    dHp = 2 * np.sqrt(C1p * C2p) * np.sin(np.radians(dhp) / 2)
+
+    Lp_mean = (L1 + L2) / 2
+    Cp_mean = (C1p + C2p) / 2
+    h_sum = h1p + h2p
+    hp_mean = np.where(np.abs(h1p - h2p) > 180, np.where(h_sum < 360, h_sum + 360, h_sum - 360), h_sum) / 2
+    hp_mean = np.where(C1p * C2p == 0, h_sum, hp_mean)
+
+    T = (1 - 0.17 * np.cos(np.radians(hp_mean - 30)) + 0.24 * np.cos(np.radians(2 * hp_mean))
+         + 0.32 * np.cos(np.radians(3 * hp_mean + 6)) - 0.20 * np.cos(np.radians(4 * hp_mean - 63)))
+    d_theta = 30 * np.exp(-(((hp_mean - 275) / 25) ** 2))
+    R_C = 2 * np.sqrt(Cp_mean ** 7 / (Cp_mean ** 7 + 25.0 ** 7))
+    S_L = 1 + 0.015 * (Lp_mean - 50) ** 2 / np.sqrt(20 + (Lp_mean - 50) ** 2)
+    S_C = 1 + 0.045 * Cp_mean
+    S_H = 1 + 0.015 * Cp_mean * T
+    R_T = -np.sin(np.radians(2 * d_theta)) * R_C
+
+    return np.sqrt((dLp / S_L) ** 2 + (dCp / S_C) ** 2 + (dHp / S_H) ** 2
+                   + R_T * (dCp / S_C) * (dHp / S_H))
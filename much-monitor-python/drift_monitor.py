@@ -0,0 +1,275 @@
+"""
+Drift monitor: a quick verification between full calibrations.
+
+A check shows a handful of patches (white, 50% grey, the primaries), reads
+each with the camera's early-stopping average and runs the captures through
+the CCM of the display's last calibration in the history. The CIEDE2000
+between the corrected colour and the target is the drift: near zero while
+the display still matches its profile. Each check is stored in the history
+as a 'check' session, so drift_report() picks up its trend too.
+
+The monitor thread sleeps on an Event between checks (no polling), and the
+camera is only opened for the few seconds a check takes.
+"""
+import threading
+import time
+import numpy as np
+from calibration_logic import CalibrationLogic, GRADE_LIMITS
+from calibration_history import CalibrationHistory, main_display_id
+from color_fitting import apply_fit, linear_to_lab
+from color_math import srgb_to_linear, linear_to_srgb, delta_e_2000
+from patch_ordering import wait_until_settled
+from patch_display import NullDisplay, TkPatchWindow
+
+VERIFY_PATCHES = [(255, 255, 255), (128, 128, 128), (255, 0, 0), (0, 255, 0), (0, 0, 255)]
+
+
+def reference_logic(history, display):
+    """
+    CalibrationLogic rebuilt from the display's last calibration session, with
+    its CCM refitted using the stored model and the capture encoding of that
+    session (linear_capture, response_id). None if there is no usable one.
+    """
+    sessions = history.sessions(display=display, kind="calibration")
+    if not sessions:
+        return None
+    session = sessions[0]
+    logic = CalibrationLogic()
+    logic.linear_capture = bool(session["linear_capture"])
+    logic.response_id = session["camera_response"]
+    if session["ccm_model"]:
+        logic.ccm_model = session["ccm_model"]
+    if session["ccm_method"]:
+        logic.ccm_method = session["ccm_method"]
+    targets, captured = history.patches(session["id"])
+    for target, cap in zip(targets, captured):
+        logic.record_sample(tuple(int(v) for v in target), tuple(float(v) for v in cap))
+    if logic.compute_ccm() is None:
+        return None
+    return logic
+
+
+def reference_camera(history, display):
+    """Camera name of the display's last calibration session (None without one)."""
+    sessions = history.sessions(display=display, kind="calibration")
+    return sessions[0]["camera"] if sessions else None
+
+
+def verification_error(reference, patches, captured):
+    """
+    (per patch CIEDE2000, corrected linear RGB) of the reference CCM applied to
+    `captured`. Captures are first scaled so white matches the reference white
+    in luminance (exposure differs between sessions), which keeps white's
+    chromaticity drift.
+    """
+    captured_lin = reference.captured_linear(captured)
+    white_now = next((c for p, c in zip(patches, captured_lin) if tuple(p) == (255, 255, 255)), None)
+    white_ref = reference.white_capture()
+    if white_now is not None and white_ref is not None:
+        y_now = float(white_now @ reference.camera_to_xyz[1])
+        y_ref = float(reference.captured_linear(white_ref) @ reference.camera_to_xyz[1])
+        if y_now > 0:
+            captured_lin = captured_lin * (y_ref / y_now)
+    corrected = apply_fit(reference.ccm_fit, captured_lin)
+    target = srgb_to_linear(np.asarray(patches, dtype=float) / 255.0)
+    return delta_e_2000(linear_to_lab(corrected), linear_to_lab(target)), corrected
+
+
+class DriftMonitor:
+    """
+    Runs a check every `interval` seconds (None: only on demand via check_now())
+    in a daemon thread. `camera_factory()` returns a fresh CameraHandler and
+    `display_factory(camera)` a patch_display display; None uses NullDisplay
+    (simulated camera, no real screen). `on_drift(result)` is called when
+    the drift is above `threshold` (CIEDE2000) or the history says the display
+    is due.
+    """
+    def __init__(self, camera_factory, display_factory=None, display_id="main", history_path=None,
+                 interval=6 * 3600, threshold=GRADE_LIMITS[0], patches=VERIFY_PATCHES,
+                 settle=0.6, on_drift=None, on_result=None):
+        self.camera_factory = camera_factory
+        self.display_factory = display_factory
+        self.display_id = display_id
+        self.history_path = history_path
+        self.interval = interval
+        self.threshold = threshold
+        self.patches = list(patches)
+        self.settle = settle
+        self.on_drift = on_drift
+        self.on_result = on_result
+        self.last_result = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _history(self):
+        return CalibrationHistory(self.history_path) if self.history_path else CalibrationHistory()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def check_now(self):
+        """Asks the monitor thread for a check as soon as possible."""
+        self._wake.set()
+
+    def run(self):
+        """Monitor loop (blocking): sleeps until the interval elapses or check_now()."""
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Cek drift gagal: {e}")
+
+    def match_capture(self, camera, reference):
+        """
+        Sets the camera up to capture the way the reference calibration did:
+        through its camera response (linear) or without one. False if that
+        response is not available any more.
+        """
+        camera.load_cached_response()
+        if not reference.linear_capture:
+            camera.response = None
+            return True
+        if camera.response is None:
+            print("Cek drift: respons kamera dari kalibrasi terakhir tidak ada lagi; kalibrasi ulang diperlukan.")
+            return False
+        if reference.response_id and camera.response.fingerprint() != reference.response_id:
+            print("Warning: respons kamera sudah dikarakterisasi ulang sejak kalibrasi terakhir.")
+        return True
+
+    def measure(self, camera, display):
+        """Shows each verification patch and reads it with early stopping. Returns (patches, captured)."""
+        patches, captured = [], []
+        for rgb in self.patches:
+            display.show_patch(rgb)
+            wait_until_settled(camera, min_wait=self.settle)
+            color = camera.get_sequential_average_color()
+            if color is not None:
+                patches.append(rgb)
+                captured.append(color)
+        return patches, captured
+
+    def check(self):
+        """One verification pass. Returns the result dict (None if no calibration or camera)."""
+        camera = self.camera_factory()
+        if not camera.start():
+            print("Cek drift: kamera tidak bisa dibuka.")
+            return None
+        display = None
+        try:
+            with self._history() as history:
+                reference = reference_logic(history, self.display_id)
+                if reference is None:
+                    print(f"Cek drift: belum ada kalibrasi untuk layar {self.display_id}.")
+                    return None
+                if not self.match_capture(camera, reference):
+                    return None
+                display = (self.display_factory or NullDisplay)(camera)
+                patches, captured = self.measure(camera, display)
+                if not patches:
+                    return None
+                errors, corrected = verification_error(reference, patches, captured)
+                result = self._store(history, reference, camera, patches, captured, errors, corrected)
+        finally:
+            if display is not None:
+                display.close()
+            camera.stop()
+        self.last_result = result
+        if self.on_result:
+            self.on_result(result)
+        if result["drift"] and self.on_drift:
+            self.on_drift(result)
+        return result
+
+    def _store(self, history, reference, camera, patches, captured, errors, corrected):
+        check = CalibrationLogic()
+        check.linear_capture = reference.linear_capture
+        check.response_id = reference.response_id
+        for rgb, cap in zip(patches, captured):
+            check.record_sample(rgb, cap)
+        # Same encoded-RGB error as the calibration sessions, for a comparable trend
+        corrected = linear_to_srgb(np.clip(corrected, 0.0, 1.0)) * 255.0
+        avg_corrected = float(np.linalg.norm(corrected - np.asarray(patches, dtype=float), axis=1).mean())
+        metrics = {"avg_corrected": avg_corrected, "delta_e": avg_corrected, "delta_e_source": "check",
+                   "delta_e_2000": errors.tolist(),
+                   "wp_target": None, "grade": None}
+        session_id = history.record_session(check, metrics, self.display_id, camera.camera_name, kind="check")
+        due, reasons = history.recalibration_due(self.display_id)
+        mean_error = float(errors.mean())
+        if mean_error > self.threshold:
+            reasons = [f"drift dE2000 {mean_error:.2f}"] + reasons
+        return {
+            "session_id": session_id,
+            "time": time.time(),
+            "patches": patches,
+            "delta_e_2000": errors,
+            "mean_delta_e_2000": mean_error,
+            "max_delta_e_2000": float(errors.max()),
+            "white_xy": check.measured_white_xy(),
+            "drift": mean_error > self.threshold or due,
+            "reasons": reasons,
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import signal
+    import subprocess
+    import sys
+    from camera_handler import CameraHandler
+
+    parser = argparse.ArgumentParser(description="Much Monitor drift monitor")
+    parser.add_argument("--once", action="store_true", help="one check, then exit")
+    parser.add_argument("--interval", type=float, default=6.0, help="hours between checks")
+    parser.add_argument("--camera", type=int, default=None,
+                        help="camera index (default: the camera with the calibration's camera name, else 0)")
+    parser.add_argument("--camera-name", default=None,
+                        help="default: the camera of the display's last calibration in the history")
+    parser.add_argument("--display", default=None, help="display id in the history (default: main display)")
+    parser.add_argument("--threshold", type=float, default=GRADE_LIMITS[0])
+    args = parser.parse_args()
+
+    display_id = args.display or main_display_id()
+
+    def make_camera():
+        # The camera response is cached under the camera name, so check with
+        # the camera (and name) the calibration used; its index can change
+        # between runs, the name does not
+        name = args.camera_name
+        if name is None:
+            with CalibrationHistory() as history:
+                name = reference_camera(history, display_id)
+        index = args.camera
+        if index is None:
+            index = next((i for i, n in CameraHandler.get_available_cameras_with_names() if n == name), 0)
+        return CameraHandler(index, camera_name=name)
+
+    def on_drift(result):
+        print(f"Layar perlu kalibrasi ulang: {', '.join(result['reasons'])}")
+        subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "main_gui.py")])
+
+    def on_result(result):
+        print(f"Cek drift: dE2000 rata-rata {result['mean_delta_e_2000']:.2f}, "
+              f"maks {result['max_delta_e_2000']:.2f}")
+
+    monitor = DriftMonitor(make_camera, TkPatchWindow, display_id=display_id, interval=args.interval * 3600,
+                           threshold=args.threshold, on_drift=on_drift, on_result=on_result)
+    if args.once:
+        monitor.check()
+    else:
+        # The menubar helper asks for an immediate check with SIGUSR1
+        signal.signal(signal.SIGUSR1, lambda *_: monitor.check_now())
+        print(f"Monitor drift aktif (tiap {args.interval:g} jam, PID {os.getpid()}).")
+        monitor.run()
@@ -0,0 +1,109 @@
+"""
+Headless export of the monitor test-pattern suite (no Tk needed).
+
+    python export_patterns.py --resolutions 1080p 1440p 4k 5k --out patterns/
+    python export_patterns.py --tests "Lagom: Gamma Calibration" 3 --resolutions 2560x1440 --format raw
+"""
+import argparse
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+import pattern_renderer
+
+RESOLUTION_PRESETS = {
+    "1080p": (1920, 1080),
+    "1440p": (2560, 1440),
+    "4k": (3840, 2160),
+    "5k": (5120, 2880),
+}
+
+
+def parse_resolution(text):
+    key = text.lower()
+    if key in RESOLUTION_PRESETS:
+        return RESOLUTION_PRESETS[key]
+    match = re.fullmatch(r"(\d+)x(\d+)", key)
+    if not match:
+        raise ValueError(f"Resolusi tidak dikenal: {text} (pakai WxH atau {', '.join(RESOLUTION_PRESETS)})")
+    return int(match.group(1)), int(match.group(2))
+
+
+def select_tests(selectors=None):
+    """
+    Picks entries from pattern_renderer.CATALOGUE by 1-based index, title or
+    pattern key. Returns a list of (index, title, pattern).
+    """
+    catalogue = [(i + 1, name, key) for i, (name, key) in enumerate(pattern_renderer.CATALOGUE)]
+    if not selectors or "all" in selectors:
+        return catalogue
+    chosen = []
+    for sel in selectors:
+        hits = [t for t in catalogue if sel == str(t[0]) or sel.lower() in (t[1].lower(), t[2].lower())]
+        if not hits:
+            raise ValueError(f"Test tidak ditemukan: {sel}")
+        chosen.extend(h for h in hits if h not in chosen)
+    return chosen
+
+
+def render_buffer(pattern, width, height):
+    """Raw RGB24 bytes (row-major, no header) of a pattern."""
+    return pattern_renderer.render_uncached(pattern, width, height).tobytes()
+
+
+def output_name(index, title, width, height, fmt):
+    slug = re.sub(r"[^a-z0-9]+", "_", title.lower()).strip("_")
+    ext = "png" if fmt == "png" else "rgb"
+    return f"{index:02d}_{slug}_{width}x{height}.{ext}"
+
+
+def _export_one(job):
+    # Uncached: every job is a different image, a cache would only hold memory
+    pattern, width, height, path, fmt, compress_level = job
+    if fmt == "png":
+        img = pattern_renderer.render_uncached(pattern, width, height)
+        Image.fromarray(img).save(path, compress_level=compress_level)
+    else:
+        with open(path, "wb") as f:
+            f.write(render_buffer(pattern, width, height))
+    return path
+
+
+def export_patterns(out_dir, resolutions, selectors=None, fmt="png", workers=None, compress_level=1):
+    """Renders every selected test at every resolution into `out_dir`. Returns the written paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = []
+    for width, height in resolutions:
+        for index, title, pattern in select_tests(selectors):
+            path = os.path.join(out_dir, output_name(index, title, width, height, fmt))
+            jobs.append((pattern, width, height, path, fmt, compress_level))
+
+    # Largest images first so the pool does not finish on one straggler
+    jobs.sort(key=lambda j: j[1] * j[2], reverse=True)
+    if workers == 1:
+        return [_export_one(j) for j in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_export_one, jobs))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export MonitorTestSuite patterns to PNG/raw RGB.")
+    parser.add_argument("--tests", nargs="*", default=["all"], help="Index (1-based), title or pattern key; default all")
+    parser.add_argument("--resolutions", nargs="+", default=["1080p"], help="WxH or 1080p/1440p/4k/5k")
+    parser.add_argument("--out", default="pattern_export", help="Output directory")
+    parser.add_argument("--format", choices=["png", "raw"], default="png", help="raw = headerless RGB24")
+    parser.add_argument("--workers", type=int, default=None, help="Process count (default: CPU count)")
+    parser.add_argument("--compress", type=int, default=1, help="PNG zlib level 0-9 (speed vs size)")
+    parser.add_argument("--list", action="store_true", help="List the catalogue and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        for index, title, pattern in select_tests():
+            print(f"{index:2d}  {title:28s} {pattern}")
+        raise SystemExit(0)
+
+    resolutions = [parse_resolution(r) for r in args.resolutions]
+    t0 = time.perf_counter()
+    paths = export_patterns(args.out, resolutions, args.tests, args.format, args.workers, args.compress)
+    print(f"{len(paths)} file ditulis ke {args.out} dalam {time.perf_counter() - t0:.2f}s")
@@ -0,0 +1,164 @@
+"""
+Backlight flicker (PWM) detection from a burst of timestamped ROI means.
+
+Frames are grabbed as fast as the camera delivers them, so timestamps are
+uneven; a Lomb-Scargle periodogram handles that directly. A webcam samples far
+below typical PWM rates (200 Hz - 2 kHz), so the peak is the *aliased*
+frequency. That is exactly the beat that corrupts single-frame samples, and it
+decides how many frames must be averaged per patch.
+"""
+import math
+import numpy as np
+from color_math import SRGB_TO_XYZ, srgb_to_linear
+
+
+def capture_roi_series(camera, frames=180, region_size=100):
+    """
+    Grabs `frames` frames back to back. Returns (timestamps (N,), luminance (N,)),
+    luminance being the linear-light ROI mean; the ROIs go into one preallocated
+    stack and are linearized together at the end.
+    """
+    times = np.empty(frames)
+    stack = None
+    n = 0
+    for _ in range(frames):
+        t, frame = camera.read_timed()
+        if frame is None:
+            break
+        roi = camera.center_roi(frame, region_size)
+        if stack is None:
+            stack = np.empty((frames,) + roi.shape, np.uint8)
+        times[n] = t
+        stack[n] = roi
+        n += 1
+    if n == 0:
+        return None, None
+
+    stack = stack[:n]
+    if camera.response is not None:
+        lut = camera.response._lut_bgr
+    else:
+        lut = np.repeat(srgb_to_linear(np.arange(256) / 255.0)[:, None], 3, axis=1).astype(np.float32)
+    # Mean per frame and channel via per-channel histograms: no float copy of the stack
+    weights = SRGB_TO_XYZ[1][::-1]  # BGR
+    offsets = (np.arange(n) * 256)[:, None]
+    lum = np.zeros(n)
+    for c in range(3):
+        codes = stack[..., c].reshape(n, -1) + offsets
+        hist = np.bincount(codes.ravel(), minlength=256 * n).reshape(n, 256)
+        lum += weights[c] * (hist @ lut[:, c]) / hist.sum(axis=1)
+    return times[:n], lum
+
+
+def lomb_scargle(t, y, freqs):
+    """Normalized Lomb-Scargle power (Scargle 1982) of y(t) at `freqs` (Hz), vectorized."""
+    y = y - y.mean()
+    var = y.var()
+    if var == 0:
+        return np.zeros(len(freqs))
+    w = 2 * np.pi * np.asarray(freqs)[:, None]
+    wt = w * t[None, :]
+    tau = np.arctan2(np.sin(2 * wt).sum(axis=1), np.cos(2 * wt).sum(axis=1)) / (2 * w[:, 0])
+    arg = wt - (w[:, 0] * tau)[:, None]
+    c, s = np.cos(arg), np.sin(arg)
+    power = ((c @ y) ** 2 / (c * c).sum(axis=1) + (s @ y) ** 2 / (s * s).sum(axis=1)) / (2 * var)
+    return power
+
+
+def recommend_frames(y, tolerance=0.005, max_frames=60):
+    """Smallest window n for which every n-sample moving average is within `tolerance` of the mean."""
+    y = np.asarray(y, dtype=float)
+    mean = y.mean()
+    if mean <= 0:
+        return 1
+    csum = np.concatenate([[0.0], np.cumsum(y)])
+    for n in range(1, min(max_frames, len(y) // 2) + 1):
+        averages = (csum[n:] - csum[:-n]) / n
+        if np.abs(averages / mean - 1.0).max() <= tolerance:
+            return n
+    return max_frames
+
+
+def analyze_flicker(t, y, tolerance=0.005, max_frames=60, fap_limit=0.01, min_depth=0.5):
+    """
+    t, y: timestamps (s) and ROI luminance. `tolerance` is the acceptable relative
+    error of a sample mean. Returns a dict with the apparent frequency, modulation
+    depth (percent flicker), false-alarm probability and the recommended frames per
+    sample (1 unless flicker was detected: random noise is left to the samplers).
+    The true PWM rate is one of |k * frame_rate +- frequency|; one frame rate
+    alone cannot tell which.
+    """
+    t = np.asarray(t, dtype=float)
+    y = np.asarray(y, dtype=float)
+    t = t - t[0]
+    duration = t[-1]
+    frame_rate = float((len(t) - 1) / duration) if duration > 0 else 0.0
+    result = {"frame_rate": frame_rate, "samples": len(t), "flicker": False, "frequency": None,
+              "modulation_depth": 0.0, "false_alarm": 1.0, "frames_per_sample": 1}
+    if len(t) < 16 or duration <= 0:
+        return result
+
+    freqs = np.linspace(1.0 / duration, frame_rate / 2, 2000)
+    power = lomb_scargle(t, y, freqs)
+    peak = int(np.argmax(power))
+    f = float(freqs[peak])
+    # Probability that noise alone gives a peak this high somewhere in the band
+    independent = max(1.0, duration * frame_rate / 2)
+    fap = 1.0 - (1.0 - math.exp(-power[peak])) ** independent
+
+    # Percent flicker (max - min) / (max + min), with percentiles to keep noise out;
+    # model-free, so square-wave PWM is not underestimated
+    low, high = np.percentile(y, [2, 98])
+    depth = float((high - low) / (high + low) * 100) if high + low > 0 else 0.0
+
+    # Smallest n whose n-frame averages of this very series stay within `tolerance`;
+    # covers random noise and beats alike (a full beat period averages out)
+    flicker = fap < fap_limit and depth >= min_depth
+    frames = recommend_frames(y, tolerance, max_frames) if flicker else 1
+    result.update({
+        "flicker": bool(flicker),
+        "frequency": f,
+        "modulation_depth": depth,
+        "false_alarm": float(fap),
+        "frames_per_sample": int(frames),
+    })
+    return result
+
+
+def measure_flicker(camera, show_patch, rgb=(255, 255, 255), frames=180, settle=0.5, region_size=100):
+    """
+    Shows `rgb`, records a burst and analyzes it. Raises camera.frames_per_sample to
+    the recommendation only when flicker was detected (else 1) and returns the
+    analysis dict (None without frames).
+    """
+    import time
+    show_patch(rgb)
+    time.sleep(settle)
+    t, y = capture_roi_series(camera, frames, region_size)
+    if t is None:
+        return None
+    result = analyze_flicker(t, y)
+    camera.frames_per_sample = result["frames_per_sample"]
+    if result["flicker"]:
+        print(f"Flicker terdeteksi: {result['frequency']:.1f} Hz (alias), modulasi {result['modulation_depth']:.1f}% "
+              f"@ {result['frame_rate']:.0f} fps -> rata-rata {camera.frames_per_sample} frame per sampel")
+    else:
+        print(f"Tidak ada flicker terdeteksi ({result['frame_rate']:.0f} fps), "
+              f"{camera.frames_per_sample} frame per sampel")
+    return result
+
+
+if __name__ == "__main__":
+    import time
+    from camera_handler import CameraHandler
+    from camera_simulator import SimulatedCamera, SimulatedCapture, SimulatedDisplay
+
+    for pwm in (None, 245.0):
+        sim = SimulatedCapture(SimulatedDisplay(pwm_frequency=pwm, pwm_duty=0.4, response_time=0.0),
+                               SimulatedCamera(fps=10, shutter=1 / 500, latency=0.0))
+        handler = CameraHandler(backend=sim)
+        handler.start()
+        t0 = time.perf_counter()
+        result = measure_flicker(handler, handler.set_displayed_patch, frames=60, settle=0.0)
+        print(f"  PWM {pwm} Hz: {time.perf_counter() - t0:.1f}s")
+        handler.stop()
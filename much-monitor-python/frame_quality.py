@@ -0,0 +1,60 @@
+from collections import namedtuple
+import cv2
+import numpy as np
+
+FrameQuality = namedtuple("FrameQuality", ["ok", "reason", "clip_fraction", "focus", "motion"])
+
+
+class FrameQualityGate:
+    """
+    Cheap per-frame checks on the measurement ROI before a sample is accepted:
+    - clipping: fraction of ROI pixels at >= 254 in any channel
+    - focus: variance of the Laplacian on a downsampled gray ROI. Only judged
+      when `min_focus` is set, for a textured target: on a flat patch it
+      measures sensor noise, so clean or denoised cameras would read as blur
+    - motion: variance of the difference against the previous frame of the same
+      patch (a uniform brightness change such as PWM flicker is not motion)
+    Call `reset()` whenever the displayed patch changes.
+    """
+    def __init__(self, max_clip_fraction=0.02, min_focus=None, max_motion=20.0,
+                 downsample=48, focus_min_level=24):
+        self.max_clip_fraction = max_clip_fraction
+        self.min_focus = min_focus
+        self.max_motion = max_motion
+        self.downsample = downsample
+        # Dark targets carry too little texture, so focus is only judged above this level
+        self.focus_min_level = focus_min_level
+        self.previous = None
+
+    def reset(self):
+        self.previous = None
+
+    def _small_gray(self, roi):
+        gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY) if roi.ndim == 3 else roi
+        h, w = gray.shape
+        scale = self.downsample / max(h, w)
+        if scale < 1:
+            gray = cv2.resize(gray, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+        return gray.astype(np.float32)
+
+    def assess(self, roi):
+        # Clipping is judged on full-resolution pixels: averaging would hide it
+        high = (roi >= 254).any(axis=-1) if roi.ndim == 3 else roi >= 254
+        clip_fraction = float(np.count_nonzero(high)) / high.size
+
+        small = self._small_gray(roi)
+        focus = float(cv2.Laplacian(small, cv2.CV_32F).var())
+        motion = 0.0
+        if self.previous is not None and self.previous.shape == small.shape:
+            diff = small - self.previous
+            motion = float(diff.var())
+        self.previous = small
+
+        reason = None
+        if clip_fraction > self.max_clip_fraction:
+            reason = f"clipped ({clip_fraction:.1%})"
+        elif motion > self.max_motion:
+            reason = f"motion ({motion:.1f})"
+        elif self.min_focus and small.mean() > self.focus_min_level and focus < self.min_focus:
+            reason = f"blur ({focus:.2f})"
+        return FrameQuality(reason is None, reason, clip_fraction, focus, motion)
@@ -0,0 +1,141 @@
+"""
+Single-capture gamma estimate from the Lagom gamma pattern.
+
+Each strip has a 50% scanline dither next to a solid 0-255 bar. Where the bar
+is as bright as the dither, (v / 255) ^ gamma = 0.5, black level included.
+The camera only has to compare two luminances side by side, so its own
+response only needs to be monotonic.
+"""
+import time
+import cv2
+import numpy as np
+import pattern_renderer
+from color_math import SRGB_TO_XYZ
+from pixel_defects import capture_average, capture_geometry
+from uniformity import linearize_frame
+
+# Camera signal compared for each strip of LAGOM_GAMMA_STRIPS
+_STRIP_WEIGHTS = {
+    "Gray": SRGB_TO_XYZ[1],
+    "Red": np.array([1.0, 0.0, 0.0]),
+    "Green": np.array([0.0, 1.0, 0.0]),
+    "Blue": np.array([0.0, 0.0, 1.0]),
+}
+
+
+def rectify(frame, geometry, response=None, max_height=1080):
+    """
+    Linear-light image of the screen in screen coordinates (downscaled to
+    `max_height` rows at most). The capture is box-filtered over about one
+    scanline pair first so the dither is averaged in linear light, not aliased.
+    Returns (image, factor) with factor = rectified px per screen px.
+    """
+    w, h = geometry.screen_size
+    f = min(1.0, max_height / h)
+    linear = linearize_frame(frame, response)
+    k = max(3, int(round(2 * geometry.scale)) | 1)
+    linear = cv2.blur(linear, (k, k))
+    S = np.diag([f, f, 1.0])
+    size = (int(round(w * f)), int(round(h * f)))
+    return cv2.warpPerspective(linear, S @ geometry.to_screen, size, flags=cv2.INTER_LINEAR), f
+
+
+def _crossing(diff, window):
+    """Sub-row position where `diff` (bar - dither) goes from negative to positive, or None."""
+    sign = np.signbit(diff)
+    idx = np.flatnonzero(sign[:-1] & ~sign[1:])
+    if idx.size == 0:
+        return None
+    # With noise there can be a few crossings; take the one with the steadiest climb around it
+    best = max(idx, key=lambda i: diff[min(i + window, diff.size - 1)] - diff[max(i - window, 0)])
+    lo, hi = max(best - window, 0), min(best + window + 1, diff.size)
+    slope, offset = np.polyfit(np.arange(lo, hi), diff[lo:hi], 1)
+    if slope <= 0:
+        return None
+    return -offset / slope
+
+
+def analyze_gamma(frame, geometry, response=None):
+    """
+    Per-strip gamma from one capture of the lagom_gamma pattern.
+    Returns {"Gray": g, "Red": g, "Green": g, "Blue": g}; None for a strip without a match.
+    """
+    w, h = geometry.screen_size
+    img, f = rectify(frame, geometry, response)
+    rows = img.shape[0]
+    top, bottom = int(rows * 0.1), int(rows * 0.98)   # skip the title text
+    smooth = max(3, rows // 100)
+    kernel = np.ones(smooth) / smooth
+
+    estimates = {}
+    for (_, _, _, name), (x0, x1, gx1, gx2) in zip(pattern_renderer.LAGOM_GAMMA_STRIPS,
+                                                   pattern_renderer.lagom_gamma_layout(w, h)):
+        x0, x1, gx1, gx2 = (int(round(v * f)) for v in (x0, x1, gx1, gx2))
+        signal = img[top:bottom] @ _STRIP_WEIGHTS[name].astype(np.float32)
+        bar_w, left_w, right_w = gx2 - gx1, gx1 - x0, x1 - gx2
+        bar = signal[:, gx1 + bar_w // 4:gx2 - bar_w // 4].mean(axis=1)
+        # Dither on both sides cancels a linear falloff across the strip; the right
+        # side starts past the 1.8/2.2/2.4 marker labels
+        left = signal[:, x0 + left_w // 6:gx1 - left_w // 6].mean(axis=1)
+        right = signal[:, gx2 + int(right_w * 0.4):x1 - right_w // 10].mean(axis=1)
+        dither = (left + right) / 2
+
+        diff = np.convolve(bar - dither, kernel, mode="same")
+        y = _crossing(diff, window=max(5, rows // 40))
+        if y is None:
+            estimates[name] = None
+            continue
+        screen_y = (y + top + 0.5) / f - 0.5
+        value = 255.0 * screen_y / h - 0.5          # ramp is floor(255 * y / h)
+        estimates[name] = float(np.log(0.5) / np.log(value / 255.0)) if 0 < value < 255 else None
+    return estimates
+
+
+def measure_gamma(camera, show_pattern, screen_size, settle=0.5, frames=8, geometry=None):
+    """
+    Shows the Lagom gamma pattern once and estimates per-strip gamma. `show_pattern(key)`
+    is the same callback as for the pixel defect sweep. Returns the dict from
+    analyze_gamma, or None when the screen could not be located.
+    """
+    geometry = geometry or capture_geometry(camera, show_pattern, screen_size, settle, frames)
+    if geometry is None:
+        return None
+    show_pattern("lagom_gamma")
+    time.sleep(settle)
+    frame = capture_average(camera, frames)
+    if frame is None:
+        return None
+    estimates = analyze_gamma(frame, geometry, camera.response)
+    print("Gamma (Lagom): " + ", ".join(f"{k} {v:.2f}" if v else f"{k} -" for k, v in estimates.items()))
+    return estimates
+
+
+def gamma_seed(estimates, low=1.2, high=3.0):
+    """Single gamma for CalibrationLogic: the gray strip, else the mean of the plausible channels."""
+    if not estimates:
+        return None
+    gray = estimates.get("Gray")
+    if gray and low <= gray <= high:
+        return gray
+    channels = [v for k, v in estimates.items() if k != "Gray" and v and low <= v <= high]
+    return float(np.mean(channels)) if channels else None
+
+
+if __name__ == "__main__":
+    from camera_handler import CameraHandler
+    from camera_simulator import SimulatedCamera, SimulatedCapture, SimulatedDisplay
+
+    screen = (1280, 720)
+    sim = SimulatedCapture(SimulatedDisplay(resolution=screen, gamma=(2.4, 2.2, 1.9)),
+                           SimulatedCamera(width=1920, height=1080))
+    handler = CameraHandler(backend=sim)
+    handler.start()
+
+    def show(pattern):
+        handler.set_displayed_image(pattern_renderer.render(pattern, *screen))
+
+    t0 = time.perf_counter()
+    estimates = measure_gamma(handler, show, screen, settle=0.0)
+    handler.stop()
+    print(f"Selesai dalam {time.perf_counter() - t0:.2f}s, ground truth R/G/B = {sim.ground_truth()['gamma']}")
+    print(f"Seed: {gamma_seed(estimates):.2f}")
@@ -0,0 +1,144 @@
+"""
+Gamut volume and coverage in CIELAB.
+
+The display is modelled as XYZ = black + M @ linear(drive), fitted by least
+squares to every measured sample (primaries, secondaries, greys, Macbeth).
+Volumes are counted on a regular Lab voxel grid: each voxel centre is
+converted to XYZ once, and membership in a gamut is a single matrix product
+plus a [0, 1] range check per RGB space. Coverage against a reference space is
+then the count of voxels inside both.
+
+Captured colours are relative to the measured white (the same scaling
+generate_basic_icc uses for the ICC primaries), so white maps to D65 and
+the comparison is relative colorimetric. With a plain webcam the measured
+primaries cannot lie outside the camera's own RGB space; pass a characterized
+`camera_to_xyz` matrix for wide-gamut displays.
+"""
+import numpy as np
+from color_math import SRGB_TO_XYZ, D65_WHITE_XYZ, xyz_to_lab
+
+# CIE xy of the R, G, B primaries; all three use a D65 white
+RGB_SPACES = {
+    "sRGB": ((0.640, 0.330), (0.300, 0.600), (0.150, 0.060)),
+    "Display P3": ((0.680, 0.320), (0.265, 0.690), (0.150, 0.060)),
+    "Rec.2020": ((0.708, 0.292), (0.170, 0.797), (0.131, 0.046)),
+}
+
+
+def rgb_to_xyz_matrix(primaries_xy, white_xyz=D65_WHITE_XYZ):
+    """Linear RGB -> XYZ matrix of an RGB space from its primaries' xy and white XYZ."""
+    xy = np.asarray(primaries_xy, dtype=float)
+    xyz = np.stack([xy[:, 0] / xy[:, 1], np.ones(3), (1 - xy[:, 0] - xy[:, 1]) / xy[:, 1]])
+    return xyz * np.linalg.solve(xyz, np.asarray(white_xyz, dtype=float))
+
+
+def lab_to_xyz(lab, white=D65_WHITE_XYZ):
+    """CIELAB -> CIE XYZ (inverse of color_math.xyz_to_lab), vectorized over the last axis."""
+    lab = np.asarray(lab)
+    fy = (lab[..., 0] + 16.0) / 116.0
+    f = np.stack([fy + lab[..., 1] / 500.0, fy, fy - lab[..., 2] / 200.0], axis=-1)
+    delta = 6.0 / 29.0
+    t = np.where(f > delta, f ** 3, 3 * delta ** 2 * (f - 4.0 / 29.0))
+    return t * np.asarray(white, dtype=lab.dtype)
+
+
+def fit_display_model(targets, captured_linear, gamma=2.2, camera_to_xyz=SRGB_TO_XYZ):
+    """
+    targets: (N, 3) drive values 0-255, captured_linear: (N, 3) linear camera RGB
+    relative to the measured white. Returns (M, black): display linear RGB -> XYZ
+    matrix and the XYZ of black, from a least-squares fit with an offset column.
+    """
+    drive = np.power(np.asarray(targets, dtype=float) / 255.0, gamma)
+    xyz = np.asarray(captured_linear, dtype=float) @ np.asarray(camera_to_xyz).T
+    design = np.hstack([drive, np.ones((len(drive), 1))])
+    coef, _, rank, _ = np.linalg.lstsq(design, xyz, rcond=None)
+    if rank < 4:
+        return None, None
+    return coef[:3].T, np.clip(coef[3], 0, None)
+
+
+def _cube_surface(n=17):
+    """Points on the surface of the RGB unit cube (n x n per face)."""
+    u = np.linspace(0, 1, n)
+    a, b = [g.ravel() for g in np.meshgrid(u, u)]
+    faces = []
+    for axis in range(3):
+        for value in (0.0, 1.0):
+            p = np.empty((len(a), 3))
+            p[:, axis] = value
+            p[:, [i for i in range(3) if i != axis]] = np.stack([a, b], axis=1)
+            faces.append(p)
+    return np.concatenate(faces)
+
+
+class LabVoxelGrid:
+    """
+    Voxel centres of a Lab box (step in Lab units) covering every gamut passed in,
+    with their XYZ precomputed in float32. `inside(M, black)` is the boolean
+    membership of the gamut XYZ = black + M @ rgb, rgb in [0, 1]^3.
+    """
+    def __init__(self, gamuts, step=2.0):
+        surface = _cube_surface()
+        labs = np.concatenate([xyz_to_lab(black + surface @ M.T) for M, black in gamuts])
+        lo = np.floor(labs.min(axis=0) / step) * step
+        hi = np.ceil(labs.max(axis=0) / step) * step
+        lo[0], hi[0] = max(lo[0], 0.0), min(hi[0], 100.0)
+        axes = [np.arange(l + step / 2, h, step, dtype=np.float32) for l, h in zip(lo, hi)]
+        self.step = step
+        self.shape = tuple(len(a) for a in axes)
+        grid = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, 3)
+        self.xyz = lab_to_xyz(grid)
+        self.voxel_volume = step ** 3
+
+    def inside(self, M, black=None):
+        to_rgb = np.linalg.inv(M).astype(np.float32)
+        xyz = self.xyz if black is None or not np.any(black) else self.xyz - np.asarray(black, np.float32)
+        rgb = xyz @ to_rgb.T
+        return ((rgb >= 0) & (rgb <= 1)).all(axis=1)
+
+
+def gamut_coverage(M, black=None, spaces=None, step=2.0):
+    """
+    Display gamut (M, black) against reference RGB spaces. Returns a dict with the
+    display volume (Lab units^3) and per space: its volume, `coverage` (% of the
+    space the display reaches), `overlap` (% of the display inside the space) and
+    `relative_volume` (display volume as % of the space's).
+    """
+    spaces = RGB_SPACES if spaces is None else spaces
+    black = np.zeros(3) if black is None else np.asarray(black, dtype=float)
+    references = {name: rgb_to_xyz_matrix(xy) for name, xy in spaces.items()}
+    grid = LabVoxelGrid([(M, black)] + [(R, np.zeros(3)) for R in references.values()], step)
+
+    display = grid.inside(M, black)
+    display_count = int(display.sum())
+    result = {"volume": display_count * grid.voxel_volume, "spaces": {}}
+    for name, R in references.items():
+        ref = grid.inside(R)
+        ref_count = int(ref.sum())
+        both = int(np.count_nonzero(display & ref))
+        result["spaces"][name] = {
+            "volume": ref_count * grid.voxel_volume,
+            "coverage": 100.0 * both / ref_count if ref_count else 0.0,
+            "overlap": 100.0 * both / display_count if display_count else 0.0,
+            "relative_volume": 100.0 * display_count / ref_count if ref_count else 0.0,
+        }
+    return result
+
+
+if __name__ == "__main__":
+    import time
+    rng = np.random.default_rng(0)
+
+    # A display with P3 primaries, measured by a camera that sees colorimetric XYZ
+    p3 = rgb_to_xyz_matrix(RGB_SPACES["Display P3"])
+    targets = rng.integers(0, 256, (60, 3))
+    measured = np.power(targets / 255.0, 2.2) @ p3.T + 0.001 * D65_WHITE_XYZ
+    captured = measured @ np.linalg.inv(SRGB_TO_XYZ).T + rng.normal(0, 0.002, measured.shape)
+    M, black = fit_display_model(targets, captured, gamma=2.2)
+
+    t0 = time.perf_counter()
+    result = gamut_coverage(M, black)
+    print(f"Volume display: {result['volume']:.0f} ({time.perf_counter() - t0:.2f}s)")
+    for name, stats in result["spaces"].items():
+        print(f"  {name:10s} coverage {stats['coverage']:5.1f}%  overlap {stats['overlap']:5.1f}%  "
+              f"volume {stats['relative_volume']:5.1f}%")
@@ -2,7 +2,9 @@ import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from PIL import Image, ImageTk
 from camera_handler import CameraHandler
-from calibration_logic import CalibrationLogic
+from calibration_logic import CalibrationLogic, GRADES
+from camera_simulator import SimulatedCapture
+import pattern_renderer
 import time
 import cv2
 import os
@@ -42,6 +44,54 @@ class ModernButton(tk.Label):
         new_rgb = tuple(min(255, int(c * factor)) for c in rgb)
         return '#%02x%02x%02x' % new_rgb
 
+class CalibrationWindowUI:
+    """calibration_runner UI drawing into the app's full-screen calibration window."""
+    def __init__(self, app):
+        self.app = app
+
+    @property
+    def screen_size(self):
+        return self.app.calib_win.winfo_screenwidth(), self.app.calib_win.winfo_screenheight()
+
+    def show_patch(self, rgb):
+        self.app.show_patch(rgb)
+
+    def show_pattern(self, pattern):
+        self.app.sidebar.place_forget()  # it would hide the pattern's corner
+        self.app.show_test_pattern(pattern)
+
+    def clear_pattern(self):
+        self.app.overlay_canvas.delete("test_pattern")
+        self.app._pattern_photo = None
+        self.app.sidebar.place(relx=0.98, rely=0.98, anchor="se")
+        self.app.calib_win.update()
+
+    def status(self, text, detail=None):
+        self.app.status_label.configure(text=text)
+        if detail is not None:
+            self.app.sub_status.configure(text=detail)
+        self.app.calib_win.update()
+
+    def warn(self, text):
+        self.app.warning_label.configure(text=text)
+
+    def patch_done(self, i, total, ok):
+        if not ok:
+            return
+        # Visual Indicator: Flash green checkmark
+        self.app.sub_status.configure(text=f"✓ Data Terbaca ({i+1}/{total})", fg="#34C759")
+        self.app.info_panel.configure(highlightbackground="#34C759") # Flash border green too
+        self.app.calib_win.update()
+        time.sleep(0.2) # Show feedback for 200ms
+        self.app.sub_status.configure(fg="#888888")
+        self.app.info_panel.configure(highlightbackground="#333333") # Reset border
+
+    def ask(self, title, text):
+        return messagebox.askokcancel(title, f"{text}, lalu tekan OK.", parent=self.app.calib_win)
+
+    def inform(self, title, text):
+        messagebox.showinfo(title, f"{text}, lalu tekan OK.", parent=self.app.calib_win)
+
 class CalibrationApp:
     def __init__(self, root):
         self.root = root
@@ -52,6 +102,12 @@ class CalibrationApp:
         
         self.logic = CalibrationLogic()
         self.camera = None
+        # Let the patch scheduler pick patches until the fit is good enough,
+        # instead of walking the whole fixed list ("Adaptif" patch set). Not the
+        # default: on held-out colours it does not beat the fixed list yet.
+        self.adaptive_patches = False
+        self.runner = None  # calibration_runner.CalibrationRunner of the current run
+        self.history_session = None  # calibration_history row of the last run
         self.preview_active = False
         self.camera_map = {}
         
@@ -69,6 +125,9 @@ class CalibrationApp:
         }
         
         self.mock_var = tk.BooleanVar(value=False)
+        self.record_var = tk.BooleanVar(value=False)
+        self.resume_var = tk.BooleanVar(value=True)
+        self.dark_var = tk.BooleanVar(value=False)
         
         self.setup_ui()
         self.refresh_cameras()
@@ -133,6 +192,33 @@ class CalibrationApp:
         )
         self.mock_check.pack(anchor="w", pady=(10, 0))
 
+        # Session recording (for replaying a run without the monitor)
+        self.record_check = tk.Checkbutton(
+            cam_card, text="Rekam Sesi Kamera (untuk Replay)",
+            variable=self.record_var,
+            fg="#666", bg="#121212", activeforeground="#00D1FF", activebackground="#121212",
+            selectcolor="#080808", font=("Inter", 9), borderwidth=0, highlightthickness=0
+        )
+        self.record_check.pack(anchor="w", pady=(4, 0))
+
+        # Resume an interrupted run from its measurement journal
+        self.resume_check = tk.Checkbutton(
+            cam_card, text="Lanjutkan Sesi yang Terputus",
+            variable=self.resume_var,
+            fg="#666", bg="#121212", activeforeground="#00D1FF", activebackground="#121212",
+            selectcolor="#080808", font=("Inter", 9), borderwidth=0, highlightthickness=0
+        )
+        self.resume_check.pack(anchor="w", pady=(4, 0))
+
+        # Dark frame (lens covered) for the black level, cached per camera
+        self.dark_check = tk.Checkbutton(
+            cam_card, text="Rekam Dark Frame (Lensa Ditutup)",
+            variable=self.dark_var,
+            fg="#666", bg="#121212", activeforeground="#00D1FF", activebackground="#121212",
+            selectcolor="#080808", font=("Inter", 9), borderwidth=0, highlightthickness=0
+        )
+        self.dark_check.pack(anchor="w", pady=(4, 0))
+
         # 4. TARGET PARAMETERS CARD
         param_card = tk.Frame(self.main_container, bg="#121212", padx=25, pady=25)
         param_card.pack(fill="x", pady=10)
@@ -155,6 +241,22 @@ class CalibrationApp:
         self.target_gamma.current(0)
         self.target_gamma.grid(row=1, column=1, sticky="ew", padx=(30, 0))
 
+        # Patch Set (built-in fixed or adaptive run, generated sets or a .ti1/.csv file)
+        tk.Label(grid, text="Patch Set", font=("Inter", 12), fg="#DDD", bg="#121212").grid(row=2, column=0, sticky="w", pady=8)
+        self.patch_set_specs = {
+            "Standar": None,
+            "Adaptif": "adaptive",
+            "Grid 9³ (729)": "grid:9",
+            "Grid 13³ (2197)": "grid:13",
+            "Ramp R/G/B/Gray 33": "ramps:33",
+            "Muat .ti1 / .csv...": "file",
+        }
+        self.patch_set_spec = None
+        self.target_patch_set = ttk.Combobox(grid, values=list(self.patch_set_specs), state="readonly", font=("Inter", 12))
+        self.target_patch_set.current(0)
+        self.target_patch_set.grid(row=2, column=1, sticky="ew", padx=(30, 0))
+        self.target_patch_set.bind("<<ComboboxSelected>>", self.on_patch_set_selected)
+
         # 5. ENVIRONMENT TIPS (Low Profile)
         tips_card = tk.Frame(self.main_container, bg="#0E0E0E", padx=20, pady=15)
         tips_card.pack(fill="x", pady=(20, 0))
@@ -274,6 +376,19 @@ class CalibrationApp:
         else:
             self.start_button.config(state=tk.DISABLED, bg="#444444")
 
+    def on_patch_set_selected(self, event=None):
+        spec = self.patch_set_specs.get(self.target_patch_set.get())
+        if spec == "file":
+            path = filedialog.askopenfilename(filetypes=[("Patch set", "*.ti1 *.csv"), ("All files", "*.*")])
+            if not path:
+                self.target_patch_set.current(0)
+                spec = None
+            else:
+                spec = path
+                self.target_patch_set.set(os.path.basename(path))
+        self.adaptive_patches = spec == "adaptive"
+        self.patch_set_spec = None if self.adaptive_patches else spec
+
     def start_calibration(self):
         is_mock = self.mock_var.get()
         selection = self.cam_var.get()
@@ -284,13 +399,16 @@ class CalibrationApp:
 
         if is_mock:
             cam_index = 0
+            cam_name = "Simulator"
         else:
             # Retrieve index from map using full selection string
             cam_index = self.camera_map.get(selection, 0)
+            cam_name = selection.rsplit(" (Index:", 1)[0]
         print(f"DEBUG: Selected camera '{selection}' -> Index {cam_index}")
             
-        # Create handler instance
-        self.camera = CameraHandler(camera_index=cam_index, mock_mode=is_mock)
+        # Create handler instance (Mock Mode uses the display/camera simulator)
+        backend = SimulatedCapture() if is_mock else None
+        self.camera = CameraHandler(camera_index=cam_index, mock_mode=is_mock, backend=backend, camera_name=cam_name)
         
         # Disable button and show loading status
         self.start_button.config(state=tk.DISABLED, text="Menghubungkan...")
@@ -315,6 +433,15 @@ class CalibrationApp:
                 "Gagal membuka kamera.\n\nPastikan kamera terhubung, tidak sedang digunakan aplikasi lain, dan izin diberikan."
             )
             return
+
+        # Reuse a previous camera characterization (same camera + resolution)
+        self.camera.load_cached_response()
+
+        if self.record_var.get():
+            out_dir = os.path.join(os.getcwd(), "calibration_output")
+            os.makedirs(out_dir, exist_ok=True)
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            self.camera.start_recording(os.path.join(out_dir, f"session_{timestamp}.mmsess"))
         
         self.show_calibration_screen()
 
@@ -442,60 +569,38 @@ class CalibrationApp:
         self.warning_label.configure(text="Mohon tidak menggerakkan kamera atau menutup aplikasi.")
         self.root.after(1000, self.run_sequence)
 
+    def show_patch(self, rgb):
+        """Fills the calibration overlay with `rgb` and tells the camera what is on screen."""
+        self.overlay_canvas.configure(bg='#%02x%02x%02x' % rgb)
+        self.camera.set_displayed_patch(rgb)
+        self.calib_win.update()
+
+    def show_test_pattern(self, pattern):
+        """Covers the overlay with a full-screen test pattern and tells the camera what is on screen."""
+        w, h = self.calib_win.winfo_screenwidth(), self.calib_win.winfo_screenheight()
+        img = pattern_renderer.render(pattern, w, h)
+        self._pattern_photo = ImageTk.PhotoImage(Image.fromarray(img))
+        self.overlay_canvas.delete("test_pattern")
+        self.overlay_canvas.create_image(0, 0, image=self._pattern_photo, anchor="nw", tags="test_pattern")
+        self.camera.set_displayed_image(img)
+        self.calib_win.update()
+
     def run_sequence(self):
+        from calibration_runner import CalibrationRunner
         # 0. Collect Targets
         wp_target = self.target_wp.get()
         gamma_target = float(self.target_gamma.get().split()[0])
         print(f"DEBUG: Starting Pro Calibration targeting {wp_target} and Gamma {gamma_target}")
-        
-        # 1. Professional Large Patch Set (~55 steps)
-        # Macbeth-style Standard Colors
-        macbeth = [
-            (115, 82, 68), (194, 150, 130), (98, 122, 157), (129, 149, 65), (146, 128, 181), (121, 192, 185),
-            (214, 126, 44), (80, 91, 166), (193, 130, 140), (94, 60, 108), (157, 188, 64), (224, 163, 46),
-            (56, 61, 150), (70, 148, 73), (175, 54, 60), (231, 199, 31), (187, 86, 149), (8, 133, 161)
-        ]
-        
-        # Primary & Secondary Saturation Sweeps (R, G, B, C, M, Y)
-        sweeps = []
-        bases = [(255,0,0), (0,255,0), (0,0,255), (0,255,255), (255,0,255), (255,255,0)]
-        for b in bases:
-            for s in [0.25, 0.5, 0.75, 1.0]:
-                sweeps.append(tuple(int(c * s) for c in b))
-        
-        # High-Precision Grayscale Wedge (21 steps for buttery smooth gamma)
-        grayscale = []
-        for i in range(21):
-            val = int(i * 12.75)
-            grayscale.append((val, val, val))
-            
-        colors = macbeth + sweeps + grayscale
-        
-        total_steps = len(colors)
-        for i, rgb in enumerate(colors):
-            hex_color = '#%02x%02x%02x' % rgb
-            self.overlay_canvas.configure(bg=hex_color)
-            self.status_label.configure(text=f"Pro Calibration: Langkah {i+1}/{total_steps}")
-            self.sub_status.configure(text=f"Membaca Warna {i+1} dari {total_steps}...")
-            self.calib_win.update()
-            
-            # Allow camera to settle
-            wait_time = 1.0 if i == 0 else 0.6
-            time.sleep(wait_time)
-            
-            captured = self.camera.get_average_color()
-            if captured:
-                self.logic.record_sample(rgb, captured)
-                # Visual Indicator: Flash green checkmark
-                original_text = self.sub_status.cget("text")
-                self.sub_status.configure(text=f"✓ Data Terbaca ({i+1}/{total_steps})", fg="#34C759")
-                self.info_panel.configure(highlightbackground="#34C759") # Flash border green too
-                self.calib_win.update()
-                time.sleep(0.2) # Show feedback for 200ms
-                self.sub_status.configure(fg="#888888")
-                self.info_panel.configure(highlightbackground="#333333") # Reset border
-            
-            time.sleep(0.05)
+
+        # 1. Camera response, flicker, black level, gamma seed, the patches
+        # (fixed ~63 steps, adaptive or a patch set), outlier re-measure and
+        # held-out verification: calibration_runner, shared with the CLI
+        patches = self.patch_set_spec or ("adaptive" if self.adaptive_patches else "fixed")
+        self.runner = CalibrationRunner(self.camera, CalibrationWindowUI(self), logic=self.logic,
+                                        patches=patches, dark_frame=self.dark_var.get(),
+                                        resume=self.resume_var.get(),
+                                        out_dir=os.path.join(os.getcwd(), "calibration_output"))
+        self.runner.run()
 
         # 4. Perform Calculation and Verification
         self.finish_calibration(wp_target, gamma_target)
@@ -505,11 +610,30 @@ class CalibrationApp:
             self.camera.stop()
             
         metrics = self.logic.get_performance_metrics(wp_target=wp_target, gamma_target=gamma_target)
+        self.record_history(metrics)
         self.calib_win.destroy()
         
         # Show custom result UI
         self.show_results_ui(metrics, wp_target, gamma_target)
 
+    def display_id(self):
+        """Identifier of the calibrated (main) display for the history."""
+        from calibration_history import main_display_id
+        return main_display_id()
+
+    def record_history(self, metrics):
+        """Stores the session and its patches in the calibration history."""
+        from calibration_history import CalibrationHistory
+        self.history_session = None
+        if not metrics:
+            return
+        try:
+            with CalibrationHistory() as history:
+                self.history_session = history.record_session(
+                    self.logic, metrics, self.display_id(), self.camera.camera_name if self.camera else "unknown")
+        except Exception as e:
+            print(f"Warning: Gagal menyimpan riwayat kalibrasi: {e}")
+
     def show_results_ui(self, metrics, wp_target, gamma_target):
         """Displays a modern, dark-themed result summary with Save Options."""
         res_win = tk.Toplevel(self.root)
@@ -540,11 +664,36 @@ class CalibrationApp:
         self._create_score_card(score_row, "RAW DELTA-E", f"{metrics['avg_raw']:.1f}", "#444")
         tk.Label(score_row, text="→", font=("Inter", 20), bg="#080808", fg="#222").pack(side=tk.LEFT, padx=15)
         
-        corrected_color = "#34C759" if metrics['avg_corrected'] < 2.0 else "#007AFF"
-        self._create_score_card(score_row, "PRO-CAL DELTA-E", f"{metrics['avg_corrected']:.1f}", corrected_color)
-        
+        # The card shows the error behind the grade: held-out verification when it ran
+        verified = metrics['delta_e_source'] == "verification"
+        corrected_color = "#34C759" if metrics['delta_e'] < 2.0 else "#007AFF"
+        self._create_score_card(score_row, "VERIFIED DELTA-E" if verified else "PRO-CAL DELTA-E",
+                                f"{metrics['delta_e']:.1f}", corrected_color)
+        
+        if metrics.get('verification'):
+            v = metrics['verification']
+            settled = "terbukti" if v['settled'] else "belum pasti"
+            tk.Label(content, text=f"Verifikasi {v['patches']} warna uji: {v['avg']:.1f}, maks {v['max']:.1f} (grade {settled})", font=("Inter", 9), bg="#080808", fg="#555").pack()
+        if metrics.get('confidence'):
+            low, high = metrics['confidence']['avg_corrected']
+            if verified:
+                # The bootstrap is over the fitting samples: not about the verified grade
+                text = f"Data latih: {metrics['avg_corrected']:.1f} (interval 95%: {low:.1f} – {high:.1f})"
+            else:
+                # Share of bootstrap resamples that land in the grade shown above
+                shown = [name for name, _ in GRADES].index(metrics['grade'])
+                certainty = metrics['confidence']['grade_probabilities'][shown]
+                text = f"Interval 95%: {low:.1f} – {high:.1f}  •  keyakinan grade {certainty:.0%}"
+            tk.Label(content, text=text, font=("Inter", 9), bg="#080808", fg="#555").pack()
+
         # Description
         tk.Label(content, text=metrics['description'], font=("Inter", 11), bg="#080808", fg="#888", wraplength=400, pady=15).pack()
+        if metrics.get('contrast_ratio'):
+            bound = ">" if self.logic.black_level.get("contrast_is_lower_bound") else ""
+            tk.Label(content, text=f"Rasio kontras {bound}{metrics['contrast_ratio']:.0f}:1", font=("Inter", 10), bg="#080808", fg="#666").pack()
+        if metrics.get('gamut'):
+            coverage = "  •  ".join(f"{name} {stats['coverage']:.0f}%" for name, stats in metrics['gamut']['spaces'].items())
+            tk.Label(content, text=f"Cakupan gamut: {coverage}", font=("Inter", 10), bg="#080808", fg="#666").pack()
 
         # --- Save Location Section ---
         save_frame = tk.LabelFrame(content, text="Lokasi Penyimpanan Profil", font=("Arial", 9, "bold"), bg="#080808", fg="#ccc", padx=10, pady=8)
@@ -591,6 +740,10 @@ class CalibrationApp:
             # Save ICC profile
             icc_path = os.path.join(target_dir, icc_name)
             self.logic.generate_basic_icc(icc_path, wp_target=wp_val, gamma_target=gamma_val)
+            if self.history_session is not None:
+                from calibration_history import CalibrationHistory
+                with CalibrationHistory() as history:
+                    history.set_profile(self.history_session, icc_path)
             
             self.logic.reset() # Clear data
             
@@ -1,11 +1,19 @@
 import os
+import signal
+import subprocess
+import sys
 import Quartz
 import Cocoa
 from PyObjCTools import AppHelper
 from profile_manager import ProfileManager
 
+DRIFT_MONITOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "drift_monitor.py")
+
 class MuchMonitorMenuBar(Cocoa.NSObject):
     def applicationDidFinishLaunching_(self, notification):
+        # Background drift monitor process (drift_monitor.py), if started from the menu
+        self.monitor_process = None
+
         # Create the status bar item
         self.statusbar = Cocoa.NSStatusBar.systemStatusBar()
         self.statusitem = self.statusbar.statusItemWithLength_(Cocoa.NSVariableStatusItemLength)
@@ -46,6 +54,18 @@ class MuchMonitorMenuBar(Cocoa.NSObject):
                 self.menu.addItem_(item)
 
         self.menu.addItem_(Cocoa.NSMenuItem.separatorItem())
+
+        # Drift verification
+        checkItem = Cocoa.NSMenuItem.alloc().initWithTitle_action_keyEquivalent_("Check Calibration Now", "checkDrift:", "")
+        checkItem.setTarget_(self)
+        self.menu.addItem_(checkItem)
+
+        monitorItem = Cocoa.NSMenuItem.alloc().initWithTitle_action_keyEquivalent_("Automatic Drift Monitor", "toggleMonitor:", "")
+        monitorItem.setTarget_(self)
+        monitorItem.setState_(Cocoa.NSControlStateValueOn if self.monitorRunning() else Cocoa.NSControlStateValueOff)
+        self.menu.addItem_(monitorItem)
+
+        self.menu.addItem_(Cocoa.NSMenuItem.separatorItem())
         
         # System Settings Shortcut
         settingsItem = Cocoa.NSMenuItem.alloc().initWithTitle_action_keyEquivalent_("Open Display Settings...", "openSettings:", "")
@@ -76,6 +96,24 @@ class MuchMonitorMenuBar(Cocoa.NSObject):
     def refresh_(self, sender):
         self.updateMenu()
 
+    def monitorRunning(self):
+        return self.monitor_process is not None and self.monitor_process.poll() is None
+
+    def checkDrift_(self, sender):
+        # The running monitor checks on SIGUSR1; otherwise run a single check
+        if self.monitorRunning():
+            self.monitor_process.send_signal(signal.SIGUSR1)
+        else:
+            subprocess.Popen([sys.executable, DRIFT_MONITOR, "--once"])
+
+    def toggleMonitor_(self, sender):
+        if self.monitorRunning():
+            self.monitor_process.terminate()
+            self.monitor_process = None
+        else:
+            self.monitor_process = subprocess.Popen([sys.executable, DRIFT_MONITOR])
+        self.updateMenu()
+
 if __name__ == "__main__":
     app = Cocoa.NSApplication.sharedApplication()
     
@@ -1,48 +1,41 @@
 import tkinter as tk
-import tkinter as tk
-from tkinter import font
-from PIL import Image, ImageDraw, ImageTk
+from tkinter import messagebox
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from PIL import Image, ImageTk
+import pattern_renderer
+import gamma_estimation
+import pixel_defects
+import uniformity
 
 class MonitorTestSuite:
-    def __init__(self, root):
+    def __init__(self, root, camera=None):
         self.root = root
+        # Optional CameraHandler for the automated dead/stuck pixel scan
+        self.camera = camera
         self.window = None
         self.canvas = None
         self.current_test_index = 0
         
-        # Test sequences
-        self.tests = [
-            # 1. Start / Alignment
-            ("Alignment & Geometry", self.draw_alignment),
-            
-            # 2. Defective Pixels (Solids)
-            ("Dead Pixels: Black", lambda: self.draw_solid("#000000")),
-            ("Dead Pixels: White", lambda: self.draw_solid("#FFFFFF")),
-            ("Dead Pixels: Red",   lambda: self.draw_solid("#FF0000")),
-            ("Dead Pixels: Green", lambda: self.draw_solid("#00FF00")),
-            ("Dead Pixels: Blue",  lambda: self.draw_solid("#0000FF")),
-            
-            # 3. Uniformity (Grays)
-            ("Uniformity: 25% Gray", lambda: self.draw_solid("#404040")),
-            ("Uniformity: 50% Gray", lambda: self.draw_solid("#808080")),
-            ("Uniformity: 75% Gray", lambda: self.draw_solid("#C0C0C0")),
-            
-            # 4. Gradients
-            ("Gradients: RGB", self.draw_rgb_gradients),
-            ("Gradients: Grayscale", self.draw_gray_gradient),
-            
-            # 5. Sharpness
-            ("Sharpness & Text", self.draw_sharpness),
-            
-            # 6. Gamma (Simple Checkerboard)
-            ("Gamma Check (2.2)", self.draw_gamma_check),
-            
-            # --- Lagom Style Tests ---
-            ("Lagom: Black Level", self.draw_lagom_black_level),
-            ("Lagom: White Saturation", self.draw_lagom_white_saturation),
-            ("Lagom: Contrast Scales", self.draw_lagom_contrast),
-            ("Lagom: Gamma Calibration", self.draw_lagom_gamma_test) # Uses PIL
-        ]
+        # Test sequences: (name, pattern key), rendered by pattern_renderer
+        self.tests = list(pattern_renderer.CATALOGUE)
+
+        # Tk images of the shown pattern and its prefetched neighbours, keyed by
+        # (pattern, width, height); each is a full-screen copy (~44 MB at 5K)
+        self._photos = OrderedDict()
+        self._max_photos = 3
+
+        # Background pre-rendering of the neighbouring tests
+        self._jobs = queue.Queue()
+        self._ready = queue.Queue()
+        self._pending = set()
+        self._worker = None
+        self._polling = False
+        self._image_item = None
+        self._label_items = []
 
     def start(self):
         """Launches the fullscreen test window."""
@@ -59,6 +52,19 @@ class MonitorTestSuite:
         self.window.bind("<Left>", self.prev_test)
         self.window.bind("<Escape>", self.close)
         self.window.bind("<Button-1>", self.next_test) # Click to advance
+        self.window.bind("a", self.run_defect_scan)
+        self.window.bind("u", self.run_uniformity_scan)
+        self.window.bind("f", self.run_flat_field_capture)
+        self.window.bind("g", self.run_gamma_scan)
+        
+        self.screen_size = (self.window.winfo_screenwidth(), self.window.winfo_screenheight())
+        self._image_item = None
+        self._label_items = []
+        self._jobs = queue.Queue()
+        self._ready = queue.Queue()
+        self._pending = set()
+        self._worker = threading.Thread(target=self._render_worker, daemon=True)
+        self._worker.start()
         
         self.current_test_index = 0
         self.run_current_test()
@@ -70,6 +76,10 @@ class MonitorTestSuite:
         if self.window:
             self.window.destroy()
             self.window = None
+        if self._worker is not None:
+            self._jobs.put(None)
+            self._worker = None
+        self._pending.clear()
 
     def next_test(self, event=None):
         self.current_test_index = (self.current_test_index + 1) % len(self.tests)
@@ -83,353 +93,177 @@ class MonitorTestSuite:
         if not self.canvas:
             return
             
-        # Clear canvas
-        self.canvas.delete("all")
-        self.canvas.configure(bg="black") # Reset bg
-        
+        self.canvas.delete("defect_marker")
+
         # Get test info
-        name, func = self.tests[self.current_test_index]
+        name, pattern = self.tests[self.current_test_index]
         print(f"Running Test: {name}")
         
-        # Exec test
-        func()
+        # Swap in the (normally pre-rendered) pattern image
+        w, h = self.screen_size
+        photo = self.get_photo(pattern, w, h)
+        if self._image_item is None:
+            self._image_item = self.canvas.create_image(0, 0, image=photo, anchor="nw")
+            self.canvas.tag_lower(self._image_item)
+        else:
+            self.canvas.itemconfigure(self._image_item, image=photo)
         
         # Draw label (fades out ideally, but static small label is fine)
         self.drawing_label(name)
 
-    def drawing_label(self, text):
-        # Small text at top left with shadow for visibility
-        self.canvas.create_text(21, 21, text=text, anchor="nw", fill="black", font=("Arial", 12))
-        self.canvas.create_text(20, 20, text=text, anchor="nw", fill="white", font=("Arial", 12))
+        # Prepare the previous/next tests while this one is on screen
+        self.prefetch_neighbours()
 
-    def show_toast(self, text):
-        t = self.canvas.create_text(
-            self.window.winfo_screenwidth()//2, 
-            self.window.winfo_screenheight()//2,
-            text=text, fill="white", font=("Arial", 24, "bold"), justify=tk.CENTER
-        )
-        self.window.after(3000, lambda: self.canvas.delete(t))
+    def show_pattern_for_camera(self, pattern):
+        """Puts a pattern on screen without labels (they would read as defects) and tells the camera."""
+        w, h = self.screen_size
+        self.canvas.itemconfigure(self._image_item, image=self.get_photo(pattern, w, h))
+        for item in self._label_items:
+            self.canvas.itemconfigure(item, text="")
+        self.camera.set_displayed_image(pattern_renderer.render(pattern, w, h))
+        self.window.update()
 
-    # --- Test Patterns ---
-
-    def draw_solid(self, color):
-        self.canvas.configure(bg=color)
+    def run_defect_scan(self, event=None):
+        """Automated sweep over the Dead Pixels solids; found pixels are circled on the current test."""
+        if self.camera is None:
+            self.show_toast("Scan otomatis butuh kamera yang terhubung.")
+            return
+        self.canvas.delete("defect_marker")
+        result = pixel_defects.run_defect_sweep(self.camera, self.show_pattern_for_camera, self.screen_size)
+        self.run_current_test()
+        if result is None:
+            self.show_toast("Layar tidak ditemukan.\nArahkan kamera ke seluruh layar lalu tekan 'a' lagi.")
+            return
+        for (x, y), members in result:
+            kinds = "/".join(sorted({m.kind for m in members}))
+            print(f"Piksel {kinds} di ({x}, {y}) pada {len(members)} pola")
+            self.canvas.create_oval(x - 12, y - 12, x + 12, y + 12, outline="#FF00FF", width=2, tags="defect_marker")
+        self.show_toast(f"{len(result)} piksel bermasalah ditemukan." if result else "Tidak ada piksel mati/stuck.")
 
-    def draw_alignment(self):
-        w = self.window.winfo_screenwidth()
-        h = self.window.winfo_screenheight()
-        
-        # Grid lines
-        for x in range(0, w, 100):
-            self.canvas.create_line(x, 0, x, h, fill="#333333")
-        for y in range(0, h, 100):
-            self.canvas.create_line(0, y, w, y, fill="#333333")
-            
-        # Center Circle
-        cx, cy = w//2, h//2
-        r = min(w, h) // 3
-        self.canvas.create_oval(cx-r, cy-r, cx+r, cy+r, outline="white", width=2)
-        
-        # Crosshair
-        self.canvas.create_line(cx, 0, cx, h, fill="white", width=1)
-        self.canvas.create_line(0, cy, w, cy, fill="white", width=1)
-        
-        # Border
-        self.canvas.create_rectangle(2, 2, w-2, h-2, outline="red", width=2)
-        
-        # Circles in corners
-        r2 = 50
-        corners = [(r2, r2), (w-r2, r2), (w-r2, h-r2), (r2, h-r2)]
-        for x, y in corners:
-             self.canvas.create_oval(x-r2, y-r2, x+r2, y+r2, outline="yellow")
+    def run_uniformity_scan(self, event=None):
+        """Measures a 5x5 zone grid at the Uniformity gray levels and saves a heat map."""
+        if self.camera is None:
+            self.show_toast("Scan otomatis butuh kamera yang terhubung.")
+            return
+        flat_field = uniformity.load_flat_field(self.camera)
+        result = uniformity.measure_uniformity(self.camera, self.show_pattern_for_camera, self.screen_size,
+                                               flat_field=flat_field)
+        self.run_current_test()
+        if result is None:
+            self.show_toast("Layar tidak ditemukan.\nArahkan kamera ke seluruh layar lalu tekan 'u' lagi.")
+            return
+        out_dir = os.path.join(os.getcwd(), "calibration_output")
+        os.makedirs(out_dir, exist_ok=True)
+        path = os.path.join(out_dir, f"uniformity_{time.strftime('%Y%m%d_%H%M%S')}.png")
+        uniformity.render_heatmap(result, path)
+        print(f"Heat map uniformity disimpan: {path}")
+        worst = max(result["summary"], key=lambda s: s["max_delta_e"])
+        note = "" if flat_field is not None else "\nTanpa flat field: vignetting kamera ikut terukur (tekan 'f')."
+        self.show_toast(f"Uniformity: max dE {worst['max_delta_e']:.2f}, "
+                        f"max dL {worst['max_luminance_deviation']:.1f}%\nHeat map: {os.path.basename(path)}{note}")
 
-    def draw_rgb_gradients(self):
-        w = self.window.winfo_screenwidth()
-        h = self.window.winfo_screenheight()
-        
-        # Split height into 3 strips
-        strip_h = h // 3
-        
-        # Only draw steps for performance (drawing 1920 lines is slow in Tkinter)
-        steps = 256
-        step_w = w / steps
-        
-        for i in range(steps):
-            x1 = i * step_w
-            x2 = (i+1) * step_w
-            
-            # Red
-            hex_r = f"#{i:02x}0000"
-            self.canvas.create_rectangle(x1, 0, x2, strip_h, fill=hex_r, outline="")
-            
-            # Green
-            hex_g = f"#00{i:02x}00"
-            self.canvas.create_rectangle(x1, strip_h, x2, strip_h*2, fill=hex_g, outline="")
-            
-            # Blue
-            hex_b = f"#0000{i:02x}"
-            self.canvas.create_rectangle(x1, strip_h*2, x2, h, fill=hex_b, outline="")
+    def run_flat_field_capture(self, event=None):
+        """Records the camera's flat field (lens falloff) for the uniformity scan."""
+        if self.camera is None:
+            self.show_toast("Scan otomatis butuh kamera yang terhubung.")
+            return
+        if not messagebox.askokcancel("Flat Field", "Tutup lensa dengan kertas putih/diffuser yang disinari merata, "
+                                      "lalu tekan OK.", parent=self.window):
+            return
+        flat = uniformity.capture_flat_field(self.camera)
+        self.show_toast("Flat field tersimpan. Lepas diffuser lalu tekan 'u'." if flat is not None
+                        else "Gagal merekam flat field.")
 
-    def draw_gray_gradient(self):
-        w = self.window.winfo_screenwidth()
-        h = self.window.winfo_screenheight()
-        
-        steps = 256
-        step_w = w / steps
-        
-        for i in range(steps):
-            x1 = i * step_w
-            x2 = (i+1) * step_w
-            val = f"{i:02x}"
-            color = f"#{val}{val}{val}"
-            self.canvas.create_rectangle(x1, 0, x2, h, fill=color, outline="")
+    def run_gamma_scan(self, event=None):
+        """Reads per-channel gamma from one capture of the Lagom gamma pattern."""
+        if self.camera is None:
+            self.show_toast("Scan otomatis butuh kamera yang terhubung.")
+            return
+        estimates = gamma_estimation.measure_gamma(self.camera, self.show_pattern_for_camera, self.screen_size)
+        self.run_current_test()
+        if estimates is None:
+            self.show_toast("Layar tidak ditemukan.\nArahkan kamera ke seluruh layar lalu tekan 'g' lagi.")
+            return
+        text = "  ".join(f"{k} {v:.2f}" if v else f"{k} -" for k, v in estimates.items())
+        self.show_toast(f"Gamma: {text}")
 
-    def draw_sharpness(self):
-        w = self.window.winfo_screenwidth()
-        h = self.window.winfo_screenheight()
-        self.canvas.configure(bg="white")
-        
-        text = "The quick brown fox jumps over the lazy dog. 1234567890"
-        
-        sizes = [8, 10, 12, 14, 18, 24, 36, 48, 72]
-        y = 50
-        
-        for size in sizes:
-            f = font.Font(family="Helvetica", size=-size) # Negative for pixels
-            self.canvas.create_text(w//2, y, text=f"{size}px: {text}", font=f, fill="black")
-            y += size + 20
+    def get_photo(self, pattern, w, h):
+        """Tk image for a pattern, reused from a small LRU of recently shown ones."""
+        key = (pattern, w, h)
+        if key in self._photos:
+            self._photos.move_to_end(key)
+            return self._photos[key]
 
-    def draw_gamma_check(self):
-        w = self.window.winfo_screenwidth()
-        h = self.window.winfo_screenheight()
-        cx = w // 2
-        
-        try:
-            self.canvas.create_rectangle(0, 0, cx, h, fill="black")
-            self.canvas.create_rectangle(0, 0, cx, h, fill="white", stipple="gray50") # 50% dither
-        except:
-            self.canvas.create_rectangle(0, 0, cx, h, fill="#808080")
-            
-        self.canvas.create_text(cx//2, 50, text="Dithered 50%", fill="red", font=("Arial", 20))
-        
-        # Solid Grays
-        grays = [128, 160, 192]
-        section_h = h // len(grays)
-        for i, g in enumerate(grays):
-            color = f"#{g:02x}{g:02x}{g:02x}"
-            y1 = i * section_h
-            y2 = (i+1) * section_h
-            self.canvas.create_text(cx + 100, y1 + 50, text=f"Solid {g}", fill="white")
-            self.canvas.create_rectangle(cx, y1, w, y2, fill=color, outline="")
+        # Not prepared yet (e.g. very fast key repeat): render synchronously
+        photo = ImageTk.PhotoImage(Image.fromarray(pattern_renderer.render(pattern, w, h)))
+        self._store_photo(key, photo)
+        return photo
 
-    # --- Lagom Implementations ---
+    def _store_photo(self, key, photo):
+        self._photos[key] = photo
+        self._photos.move_to_end(key)
+        while len(self._photos) > self._max_photos:
+            self._photos.popitem(last=False)
 
-    def draw_lagom_black_level(self):
-        """Draws 20 dark gray squares on black background."""
-        w = self.window.winfo_screenwidth()
-        h = self.window.winfo_screenheight()
-        self.canvas.configure(bg="black")
-        
-        cols = 5
-        rows = 4
-        box_w = w // (cols + 2)
-        box_h = h // (rows + 2)
-        start_x = box_w
-        start_y = box_h
-        
-        value = 1
-        for r in range(rows):
-            for c in range(cols):
-                if value > 20: break
-                
-                x1 = start_x + c * box_w
-                y1 = start_y + r * box_h
-                x2 = x1 + box_w - 20
-                y2 = y1 + box_h - 20
-                
-                # Color (v, v, v)
-                hex_val = f"#{value:02x}{value:02x}{value:02x}"
-                self.canvas.create_rectangle(x1, y1, x2, y2, fill=hex_val, outline="white")
-                self.canvas.create_text(x1 + box_w//2, y1 + box_h//2, text=str(value), fill="white")
-                
-                value += 1
-                
-        self.canvas.create_text(w//2, 50, text="Black Level: Squares 1-5 might be invisible on untuned monitors.", fill="white", font=("Arial", 16))
+    def prefetch_neighbours(self):
+        w, h = self.screen_size
+        n = len(self.tests)
+        for offset in (1, -1):
+            pattern = self.tests[(self.current_test_index + offset) % n][1]
+            key = (pattern, w, h)
+            if key not in self._photos and key not in self._pending:
+                self._pending.add(key)
+                self._jobs.put(key)
+        if self._pending and not self._polling:
+            self._polling = True
+            self.window.after(15, self._collect_ready)
 
-    def draw_lagom_white_saturation(self):
-        """Draws light gray squares on white background."""
-        w = self.window.winfo_screenwidth()
-        h = self.window.winfo_screenheight()
-        self.canvas.configure(bg="white")
-        
-        # Lagom uses 200 - 254
-        # Let's do 12 squares: 200, 210 ... 250, 251, 252, 253, 254
-        values = [200, 210, 220, 230, 240, 245, 248, 250, 251, 252, 253, 254]
-        
-        cols = 4
-        rows = 3
-        box_w = w // (cols + 2)
-        box_h = h // (rows + 2)
-        start_x = box_w
-        start_y = box_h
-        
-        idx = 0
-        for r in range(rows):
-            for c in range(cols):
-                if idx >= len(values): break
-                v = values[idx]
-                
-                x1 = start_x + c * box_w
-                y1 = start_y + r * box_h
-                x2 = x1 + box_w - 20
-                y2 = y1 + box_h - 20
-                
-                hex_val = f"#{v:02x}{v:02x}{v:02x}"
-                # No outline, rely on contrast against white
-                self.canvas.create_rectangle(x1, y1, x2, y2, fill=hex_val, outline="")
-                self.canvas.create_text(x1 + box_w//2, y1 + box_h//2, text=str(v), fill="black")
-                
-                idx += 1
-        
-        self.canvas.create_text(w//2, 50, text="White Saturation: Can you see 254?", fill="black", font=("Arial", 16))
+    def _render_worker(self):
+        """Worker thread: renders patterns to PIL images (no Tk calls allowed here)."""
+        while True:
+            key = self._jobs.get()
+            if key is None:
+                return
+            try:
+                img = Image.fromarray(pattern_renderer.render(*key))
+            except Exception as e:
+                print(f"Pre-render gagal untuk {key[0]}: {e}")
+                img = None
+            self._ready.put((key, img))
 
-    def draw_lagom_contrast(self):
-        """Draws detailed step gradients for RGB."""
-        w = self.window.winfo_screenwidth()
-        h = self.window.winfo_screenheight()
-        self.canvas.configure(bg="black")
-        
-        # 3 Strips: R, G, B
-        strip_h = h // 3
-        
-        # 32 distinct steps: 0, 8, 16...
-        steps = 32
-        step_w = w / steps
-        val_step = 256 / steps
-        
-        for i in range(steps):
-            v_int = int(i * val_step)
-            if v_int > 255: v_int = 255
-            v_hex = f"{v_int:02x}"
-            
-            x1 = i * step_w
-            x2 = (i+1) * step_w
-            
-            # Red Strip
-            self.canvas.create_rectangle(x1, 0, x2, strip_h, fill=f"#{v_hex}0000", outline="")
-            
-            # Green Strip
-            self.canvas.create_rectangle(x1, strip_h, x2, strip_h*2, fill=f"#00{v_hex}00", outline="")
-            
-            # Blue Strip
-            self.canvas.create_rectangle(x1, strip_h*2, x2, h, fill=f"#0000{v_hex}", outline="")
-            
-            # Labels occasionally
-            if i % 4 == 0:
-                 self.canvas.create_text(x1+5, strip_h-10, text=str(v_int), fill="white", anchor="nw")
+    def _collect_ready(self):
+        """Tk thread: turns finished renders into Tk images, polling only while work is pending."""
+        self._polling = False
+        if not self.window:
+            return
+        while True:
+            try:
+                key, img = self._ready.get_nowait()
+            except queue.Empty:
+                break
+            self._pending.discard(key)
+            if img is not None and key not in self._photos:
+                # The current image was touched just before, so two prefetches never evict it
+                self._store_photo(key, ImageTk.PhotoImage(img))
+        if self._pending:
+            self._polling = True
+            self.window.after(15, self._collect_ready)
 
-    def draw_lagom_gamma_test(self):
-        """
-        Draws precise Gamma calibration bands using PIL.
-        (Gray, Red, Green, Blue)
-        """
-        w = self.window.winfo_screenwidth()
-        h = self.window.winfo_screenheight()
-        self.canvas.configure(bg="black")
-        
-        # Create a new PIL image
-        img = Image.new("RGB", (w, h), (0, 0, 0))
-        pixels = img.load()
-        draw = ImageDraw.Draw(img)
-        
-        strips = 4
-        strip_w = w // strips
-        
-        # Define Strip Colors (R, G, B factors)
-        configs = [
-            (1, 1, 1, "Gray"),
-            (1, 0, 0, "Red"),
-            (0, 1, 0, "Green"),
-            (0, 0, 1, "Blue")
+    def drawing_label(self, text):
+        # Small text at top left with shadow for visibility
+        if self._label_items:
+            for item in self._label_items:
+                self.canvas.itemconfigure(item, text=text)
+            return
+        self._label_items = [
+            self.canvas.create_text(21, 21, text=text, anchor="nw", fill="black", font=("Arial", 12)),
+            self.canvas.create_text(20, 20, text=text, anchor="nw", fill="white", font=("Arial", 12)),
         ]
-        
-        # For each pixel row, determine dither value and solid gradient value
-        # Dither: Alternating 0 and 255 lines (50% luminance physically)
-        # Gradient: 0 at top? to 255 at bottom?
-        # Lagom usually puts 'Target 50% luminance' (Gammas) at specific heights.
-        
-        # Let's map Y (height) to Value (0-255).
-        # Top = 255, Bottom = 0? Or other way? 
-        # Usually blending point for 2.2 is somewhat high.
-        
-        for x in range(w):
-            col_idx = x // strip_w
-            if col_idx >= 4: col_idx = 3
-            
-            rf, gf, bf, name = configs[col_idx]
-            
-            # Determine if this x is part of the 'solid' column or 'dither' column?
-            # Lagom interleaves them or puts them side-by-side.
-            # Simpler: 25% of strip width is Solid Gradient, 75% is Dither Background?
-            
-            in_strip_x = x % strip_w
-            is_solid_bar = (in_strip_x > strip_w * 0.3) and (in_strip_x < strip_w * 0.7)
-            
-            if is_solid_bar:
-                # Solid Gradient (0-255)
-                # Let's make Top=255, Bottom=0
-                val = int(255 * (1 - (x / w))) # Wait, Y is not available in outer loop logic for pixels easily if we loop y inside
-                pass
-            else:
-                pass
-                
-        # Optimization: Don't loop pixels in Python! Too slow.
-        # Use simple Draws.
-        
-        for i, (rf, gf, bf, name) in enumerate(configs):
-            x_start = i * strip_w
-            x_end = (i+1) * strip_w
-            cx = x_start + strip_w // 2
-            
-            # 1. Fill Background with Dither (Scanlines)
-            # Draw lines.
-            for y in range(0, h, 2):
-                # Black line (already 0)
-                # White line (255) colorized
-                c = (255*rf, 255*gf, 255*bf)
-                draw.line([(x_start, y), (x_end, y)], fill=c)
-                
-            # 2. Draw Solid Gradient in Middle
-            # We want to find where Dither (approx 50% light) matches Gradient.
-            # Gradient goes from 0 to 255 (Top to Bottom).
-            grad_w = int(strip_w * 0.3)
-            gx1 = cx - grad_w // 2
-            gx2 = cx + grad_w // 2
-            
-            # Draw gradient via lines
-            for y in range(h):
-                val = int(255 * (y / h)) # 0 at top, 255 at bottom.
-                c = (int(val*rf), int(val*gf), int(val*bf))
-                draw.line([(gx1, y), (gx2, y)], fill=c)
-                
-            # 3. Draw Gamma Markers
-            # Formula: 0.5 = (Val / 255) ^ Gamma
-            # (0.5)^(1/Gamma) = Val/255
-            # Val = 255 * (0.5)^(1/Gamma)
-            # Y corresponds to Val (y = h * (Val/255))
-            
-            gammas = [1.8, 2.2, 2.4]
-            for g in gammas:
-                target_val = 255 * (0.5**(1/g))
-                y_pos = int(h * (target_val / 255))
-                
-                # Draw marker text
-                draw.text((gx2 + 5, y_pos - 5), f"{g}", fill=(255,255,255))
-                draw.line([(gx2, y_pos), (gx2+10, y_pos)], fill=(255,255,255))
-                
-        # Convert to Tkinter
-        self.tk_gamma_img = ImageTk.PhotoImage(img) # Keep ref
-        self.canvas.create_image(0, 0, image=self.tk_gamma_img, anchor="nw")
-        
-        self.canvas.create_text(w//2, 30, text="Gamma Calibration: The solid bar should blend into the stripes at 2.2", fill="white", font=("Arial", 16), justify=tk.CENTER)
 
+    def show_toast(self, text):
+        t = self.canvas.create_text(
+            self.window.winfo_screenwidth()//2, 
+            self.window.winfo_screenheight()//2,
+            text=text, fill="white", font=("Arial", 24, "bold"), justify=tk.CENTER
+        )
+        self.window.after(3000, lambda: self.canvas.delete(t))
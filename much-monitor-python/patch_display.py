@@ -0,0 +1,60 @@
+"""
+Patch displays for runs outside the main window (drift checks, headless CLI).
+
+A display shows a solid patch (show_patch) or a full-screen test pattern
+(show_pattern, a pattern_renderer key) and tells the camera what is on screen,
+as CalibrationApp.show_patch does. NullDisplay draws nothing: with the
+simulated camera the frames follow what the camera is told.
+"""
+import pattern_renderer
+
+
+class NullDisplay:
+    def __init__(self, camera, size=(1920, 1080)):
+        self.camera = camera
+        self.size = size
+
+    def show_patch(self, rgb):
+        self.camera.set_displayed_patch(tuple(rgb))
+
+    def show_pattern(self, pattern):
+        self.camera.set_displayed_image(pattern_renderer.render(pattern, *self.size))
+
+    def close(self):
+        pass
+
+
+class TkPatchWindow(NullDisplay):
+    """Full-screen, topmost Tk window; exists only as long as the display is open."""
+    def __init__(self, camera):
+        import tkinter as tk
+        self.root = tk.Tk()
+        self.root.attributes("-fullscreen", True)
+        self.root.attributes("-topmost", True)
+        self.root.configure(bg="black", cursor="none")
+        self.canvas = tk.Canvas(self.root, bg="black", highlightthickness=0)
+        self.canvas.pack(fill=tk.BOTH, expand=True)
+        self.root.update()
+        self._photo = None
+        super().__init__(camera, (self.root.winfo_screenwidth(), self.root.winfo_screenheight()))
+
+    def show_patch(self, rgb):
+        self.canvas.delete("pattern")
+        self.canvas.configure(bg='#%02x%02x%02x' % tuple(rgb))
+        self.root.update()
+        super().show_patch(rgb)
+
+    def show_pattern(self, pattern):
+        from PIL import Image, ImageTk
+        img = pattern_renderer.render(pattern, *self.size)
+        self._photo = ImageTk.PhotoImage(Image.fromarray(img))
+        self.canvas.delete("pattern")
+        self.canvas.create_image(0, 0, image=self._photo, anchor="nw", tags="pattern")
+        self.root.update()
+        self.camera.set_displayed_image(img)
+
+    def close(self):
+        self.root.destroy()
+
+
+DISPLAYS = {"null": NullDisplay, "tk": TkPatchWindow}
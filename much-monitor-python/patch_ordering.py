@@ -0,0 +1,191 @@
+"""
+Patch ordering and adaptive settling.
+
+Every patch change costs settle time: the panel relaxes towards the new level
+roughly exponentially (time to reach `tolerance` grows with ln of the jump)
+and the camera's auto exposure chases the change in log luminance. The
+ordering is an open-path TSP on that cost, solved with nearest neighbour
+followed by 2-opt; each 2-opt pass evaluates all segment reversals from one
+position in a single vectorized step. The cost is symmetric, which keeps
+2-opt exact (a real panel is usually slower to darken than to brighten).
+"""
+import time
+import numpy as np
+from color_math import SRGB_TO_XYZ, srgb_to_linear
+
+
+def patch_luminance(patches):
+    """Relative luminance Y (0-1) of 0-255 RGB patches, vectorized."""
+    return srgb_to_linear(np.asarray(patches, dtype=float) / 255.0) @ SRGB_TO_XYZ[1]
+
+
+class SettleModel:
+    """
+    Predicted settle time (s) of a patch change, learned from observed waits:
+      t = panel_tau * ln(1 + |dY| / tolerance) + exposure_tau * |d ln Y|
+    """
+    def __init__(self, panel_tau=0.03, exposure_tau=0.15, tolerance=0.005, floor=0.01, untrained_wait=0.6,
+                 min_wait=0.1):
+        self.panel_tau = panel_tau
+        self.exposure_tau = exposure_tau
+        self.tolerance = tolerance
+        self.floor = floor  # luminance floor for the log (near-black patches)
+        self.untrained_wait = untrained_wait  # conservative wait until the taus are fitted
+        self.min_wait = min_wait
+        self._fit = []  # (panel term, exposure term, observed time)
+
+    @property
+    def fitted(self):
+        return len(self._fit) >= 4
+
+    def wait_floor(self):
+        """Minimum wait before looking for a stable reading: the old fixed wait until fitted."""
+        return self.min_wait if self.fitted else self.untrained_wait
+
+    def _terms(self, y_from, y_to):
+        panel = np.log1p(np.abs(y_to - y_from) / self.tolerance)
+        exposure = np.abs(np.log(np.maximum(y_to, self.floor)) - np.log(np.maximum(y_from, self.floor)))
+        return panel, exposure
+
+    def cost_matrix(self, patches):
+        y = patch_luminance(patches)
+        panel, exposure = self._terms(y[:, None], y[None, :])
+        return self.panel_tau * panel + self.exposure_tau * exposure
+
+    def observe(self, prev_rgb, next_rgb, elapsed, keep=40):
+        """Records a measured settle time and refits both time constants (non-negative least squares)."""
+        y = patch_luminance([prev_rgb, next_rgb])
+        panel, exposure = self._terms(y[0], y[1])
+        self._fit.append((float(panel), float(exposure), float(elapsed)))
+        self._fit = self._fit[-keep:]
+        if not self.fitted:
+            return
+        A = np.array(self._fit)
+        coef = np.linalg.lstsq(A[:, :2], A[:, 2], rcond=None)[0]
+        if np.any(coef < 0):
+            # One term cannot explain the data: fit the other alone
+            col = int(np.argmax(coef))
+            coef = np.zeros(2)
+            coef[col] = max(float(A[:, col] @ A[:, 2] / max(A[:, col] @ A[:, col], 1e-12)), 0.0)
+        self.panel_tau, self.exposure_tau = float(coef[0]), float(coef[1])
+
+
+def path_cost(order, cost):
+    order = np.asarray(order)
+    return float(cost[order[:-1], order[1:]].sum())
+
+
+def nearest_neighbour(cost, start=0):
+    n = len(cost)
+    order = [start]
+    free = np.ones(n, dtype=bool)
+    free[start] = False
+    for _ in range(n - 1):
+        row = np.where(free, cost[order[-1]], np.inf)
+        nxt = int(np.argmin(row))
+        order.append(nxt)
+        free[nxt] = False
+    return np.array(order)
+
+
+def two_opt(order, cost, max_passes=50):
+    """Open-path 2-opt with a fixed first patch. Reverses order[i..j] while that lowers the cost."""
+    order = np.array(order)
+    n = len(order)
+    if n < 4:
+        return order
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, n - 1):
+            a, first = order[i - 1], order[i]
+            js = np.arange(i + 1, n)
+            last = order[js]
+            after = np.append(order[js[:-1] + 1], -1)  # no edge after the end of the path
+            has_next = after >= 0
+            after_idx = np.where(has_next, after, 0)
+            delta = (cost[a, last] - cost[a, first]
+                     + np.where(has_next, cost[first, after_idx] - cost[last, after_idx], 0.0))
+            k = int(np.argmin(delta))
+            if delta[k] < -1e-12:
+                j = js[k]
+                order[i:j + 1] = order[i:j + 1][::-1]
+                improved = True
+        if not improved:
+            break
+    return order
+
+
+def order_patches(patches, model=None, start=None):
+    """
+    Reorders `patches` (0-255 RGB) to minimise total predicted settle time.
+    `start` is the patch currently on screen (not part of the result); by default
+    the path starts at the first patch. Duplicates are kept.
+    """
+    patches = [tuple(p) for p in patches]
+    if len(patches) < 3:
+        return patches
+    model = model or SettleModel()
+    nodes = patches if start is None else [tuple(start)] + patches
+    cost = model.cost_matrix(nodes)
+    order = two_opt(nearest_neighbour(cost, 0), cost)
+    if start is not None:
+        order = order[1:] - 1
+    return [patches[i] for i in order]
+
+
+def wait_until_settled(camera, min_wait=0.1, max_wait=2.0, tolerance=0.75, stable_reads=3, region_size=100,
+                       changed_at=None):
+    """
+    Waits at least `min_wait`, then reads frames until `stable_reads` consecutive
+    fresh frames (exposed after the patch change) all stay within `tolerance`
+    (0-255 units) of the first of them, or until `max_wait`. Comparing against
+    the start of the run rather than the previous frame keeps a slow transition
+    or a buffer of stale frames from passing as stable.
+
+    Returns the settle time: from the change (`changed_at`, default the camera's
+    patch_changed_at or now) to the exposure of the first frame of the stable
+    run, so the model learns the real time and not the time we chose to wait.
+    None when nothing was stable by `max_wait`: that time is only a lower bound
+    and must not be fed to SettleModel.observe.
+    """
+    now = time.monotonic()
+    if changed_at is None:
+        changed_at = getattr(camera, "patch_changed_at", None) or now
+    deadline = changed_at + max_wait
+    time.sleep(max(changed_at + min_wait - now, 0.0))
+    reference = None
+    run_start = None
+    stable = 0
+    while time.monotonic() < deadline:
+        t, frame = camera.read_timed()
+        if frame is None:
+            break
+        if abs(t - time.monotonic()) > max_wait + 1.0:
+            # Device timestamps on another clock: the read time is the best we have
+            t = time.monotonic()
+        if t < changed_at:
+            continue  # exposed before the change (buffered frame)
+        mean = np.asarray(camera.center_roi(frame, region_size).reshape(-1, frame.shape[-1]).mean(axis=0))
+        if reference is not None and np.abs(mean - reference).max() < tolerance:
+            stable += 1
+            if stable >= stable_reads:
+                return max(run_start - changed_at, 0.0)
+        else:
+            reference, run_start, stable = mean, t, 1
+    return None
+
+
+if __name__ == "__main__":
+    from patch_sets import standard_patches
+
+    patches, _ = standard_patches()
+
+    model = SettleModel()
+    cost = model.cost_matrix(patches)
+    t0 = time.perf_counter()
+    ordered = order_patches(patches, model)
+    ms = (time.perf_counter() - t0) * 1000
+    index = {p: i for i, p in enumerate(patches)}
+    before = path_cost(np.arange(len(patches)), cost)
+    after = path_cost([index[p] for p in ordered], cost)
+    print(f"{len(patches)} patch: settle {before:.1f}s -> {after:.1f}s ({ms:.0f} ms)")
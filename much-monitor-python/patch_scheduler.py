@@ -0,0 +1,176 @@
+"""
+Active patch selection: measure the colours the current fit knows least about.
+
+After a few seed patches, every candidate in the pool is scored by
+- the prediction uncertainty of a forward model (target -> captured) fitted
+  with the same features as the CCM, sigma * sqrt(f(x)' G^-1 f(x)), taken
+  through the Jacobian of Lab so it is in delta E, and
+- the CIEDE2000 error of already measured patches nearby (Gaussian kernel in
+  linear target RGB), so regions the model gets wrong attract samples.
+The run stops when the cross-validated delta E of the CCM reaches the target
+and no candidate scores above it, when the cross-validated error stops
+improving while already near the target, or at `max_patches`. A plateau far
+above the target (a display the model has trouble with) keeps measuring.
+"""
+import numpy as np
+from color_fitting import expand_features, cross_validate, linear_to_lab
+from color_math import srgb_to_linear, delta_e_2000
+
+SEED_PATCHES = [
+    (255, 255, 255), (0, 0, 0), (255, 0, 0), (0, 255, 0), (0, 0, 255),
+    (128, 128, 128), (0, 255, 255), (255, 0, 255), (255, 255, 0),
+]
+
+
+def default_pool(levels=6):
+    """RGB grid with `levels` steps per channel (216 colours by default)."""
+    steps = np.round(np.linspace(0, 255, levels)).astype(int)
+    grid = np.stack(np.meshgrid(steps, steps, steps, indexing="ij"), axis=-1).reshape(-1, 3)
+    return [tuple(int(v) for v in rgb) for rgb in grid]
+
+
+def lab_jacobian(linear, eps=1e-4):
+    """(N, 3, 3) d Lab / d linear RGB by forward differences, vectorized."""
+    base = linear_to_lab(linear)
+    steps = linear[:, None, :] + eps * np.eye(3)[None]
+    return (linear_to_lab(steps) - base[:, None, :]).transpose(0, 2, 1) / eps
+
+
+class PatchScheduler:
+    """
+    Chooses the next patch for a CalibrationLogic. Call next_patch(), measure it
+    and record it in the logic (or skip(rgb) if the capture failed), repeat
+    until next_patch() returns None.
+    """
+    def __init__(self, logic, pool=None, seeds=SEED_PATCHES, target_error=1.0,
+                 min_patches=12, max_patches=63, patience=8, plateau_patches=25, plateau_margin=1.5,
+                 kernel_width=0.15):
+        self.logic = logic
+        self.pool = list(dict.fromkeys(default_pool() if pool is None else pool))
+        self.seeds = [tuple(s) for s in seeds]
+        self.target_error = target_error
+        self.min_patches = min_patches
+        self.max_patches = max_patches
+        self.patience = patience
+        # A plateau only ends the run once the 2nd-order models are eligible in
+        # the cross-validated selection (enough samples for 10 terms per fold)
+        self.plateau_patches = plateau_patches
+        # ...and only while the estimate is within plateau_margin x target_error
+        self.plateau_margin = plateau_margin
+        self.kernel_width = kernel_width
+        self.tried = set()
+        self.history = []  # cross-validated delta E after each fitted step
+        self.stop_reason = None
+
+    def skip(self, rgb):
+        self.tried.add(tuple(rgb))
+
+    def _measured(self):
+        return [tuple(r['target']) for r in self.logic.results]
+
+    def _arrays(self):
+        targets = np.array([r['target'] for r in self.logic.results], dtype=float)
+        captured = self.logic.captured_linear([r['captured'] for r in self.logic.results])
+        return srgb_to_linear(targets / 255.0), captured
+
+    def expected_error(self):
+        """Cross-validated mean CIEDE2000 of the current CCM model (outliers weighted out)."""
+        fit = self.logic.ccm_fit
+        if fit is None:
+            return None
+        target_lin, captured_lin = self._arrays()
+        terms = expand_features(captured_lin[:1], fit.model).shape[1]
+        folds = min(5, len(target_lin))
+        if len(target_lin) * (folds - 1) / folds <= terms:
+            return None
+        errors = cross_validate(captured_lin, target_lin, fit.model, fit.weights, folds)
+        return float(np.average(errors, weights=fit.weights))
+
+    def candidate_scores(self, candidates):
+        """Score (delta E) of each candidate rgb: predicted uncertainty + nearby measured error."""
+        fit = self.logic.ccm_fit
+        target_lin, captured_lin = self._arrays()
+        cand_lin = srgb_to_linear(np.asarray(candidates, dtype=float) / 255.0)
+
+        # Forward surrogate target -> captured, same features as the CCM
+        F = expand_features(target_lin, fit.model)
+        w = fit.weights
+        p = F.shape[1]
+        gram = (F * w[:, None]).T @ F + 1e-9 * np.eye(p)
+        coef = np.linalg.solve(gram, (F * w[:, None]).T @ captured_lin)
+        dof = max(w.sum() - p, 1.0)
+        sigma2 = float((w[:, None] * (F @ coef - captured_lin) ** 2).sum() / (dof * 3))
+        Fc = expand_features(cand_lin, fit.model)
+        leverage = np.einsum("cp,pq,cq->c", Fc, np.linalg.inv(gram), Fc)
+        # Isotropic per-channel std; its size in Lab is sqrt(trace(J J')) * std
+        jac = lab_jacobian(cand_lin)
+        uncertainty = np.sqrt(sigma2 * leverage * np.einsum("cij,cij->c", jac, jac))
+
+        # Measured CCM errors spread onto their neighbourhood
+        corrected = expand_features(captured_lin, fit.model) @ fit.ccm
+        errors = delta_e_2000(linear_to_lab(corrected), linear_to_lab(target_lin))
+        d2 = ((cand_lin[:, None, :] - target_lin[None, :, :]) ** 2).sum(axis=2)
+        kernel = np.exp(-d2 / (2 * self.kernel_width ** 2)) * w[None, :]
+        local = (kernel @ errors) / np.maximum(kernel.sum(axis=1), 1e-12)
+        return uncertainty + local
+
+    def next_patch(self):
+        measured = set(self._measured())
+        n = len(measured)
+        for seed in self.seeds:
+            if seed not in measured and seed not in self.tried:
+                self.tried.add(seed)
+                return seed
+        if n >= self.max_patches:
+            self.stop_reason = "max_patches"
+            return None
+        candidates = [c for c in self.pool if c not in measured and c not in self.tried]
+        if not candidates:
+            self.stop_reason = "pool_exhausted"
+            return None
+        if self.logic.compute_ccm() is None:
+            self.tried.add(candidates[0])
+            return candidates[0]
+
+        estimate = self.expected_error()
+        self.history.append(estimate)
+        scores = self.candidate_scores(candidates)
+        if n >= self.min_patches and estimate is not None:
+            if estimate <= self.target_error and scores.max() <= self.target_error:
+                self.stop_reason = "target_reached"
+                return None
+            recent = [e for e in self.history[-(self.patience + 1):] if e is not None]
+            near_target = estimate <= self.plateau_margin * self.target_error
+            if (near_target and n >= self.plateau_patches and len(recent) > self.patience
+                    and recent[-1] > 0.95 * recent[0]):
+                self.stop_reason = "converged"
+                return None
+        choice = candidates[int(np.argmax(scores))]
+        self.tried.add(choice)
+        return choice
+
+
+if __name__ == "__main__":
+    from calibration_logic import CalibrationLogic
+    from color_math import linear_to_srgb
+
+    def simulate(curve, noise, rng):
+        def capture(rgb):
+            linear = srgb_to_linear(np.array(rgb) / 255.0)
+            mixed = curve(linear) @ np.array([[0.92, 0.05, 0.01], [0.06, 0.90, 0.04], [0.02, 0.05, 0.95]])
+            return tuple(np.clip(linear_to_srgb(mixed) * 255 + rng.normal(0, noise, 3), 0, 255))
+        return capture
+
+    for name, curve in (("linear", lambda x: x), ("nonlinear", lambda x: x ** 1.15 + 0.05 * x * x[[1, 2, 0]])):
+        rng = np.random.default_rng(0)
+        capture = simulate(curve, 0.8, rng)
+        logic = CalibrationLogic()
+        scheduler = PatchScheduler(logic)
+        while True:
+            rgb = scheduler.next_patch()
+            if rgb is None:
+                break
+            logic.record_sample(rgb, capture(rgb))
+        metrics = logic.get_performance_metrics()
+        print(f"{name:9s}: {len(logic.results)} patch ({scheduler.stop_reason}), model {metrics['ccm_model']}, "
+              f"error {metrics['avg_corrected']:.2f}, CV dE {scheduler.expected_error():.2f}")
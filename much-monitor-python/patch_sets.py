@@ -0,0 +1,135 @@
+"""
+Patch sets for the measurement loop, as generators of 0-255 RGB tuples.
+
+Sources are Argyll .ti1 files (RGB_R/G/B in 0-100), CSV files and the built-in
+generators below. Everything streams: a 3000-patch set is read one row at a
+time and handed to the loop in chunks, so memory does not grow with the set.
+
+Specs accepted by open_patch_set:
+  "gray:33"   33-step grey wedge
+  "grid:9"    9 x 9 x 9 RGB cube
+  "ramps:17"  17-step R, G, B ramps plus a grey ramp
+  path        .ti1 / .csv file
+"""
+import csv
+import os
+from itertools import islice
+from cgats import CGATSReader
+
+
+def _level(i, steps):
+    return int(round(i * 255 / (steps - 1))) if steps > 1 else 255
+
+
+def gray_steps(steps=21):
+    for i in range(steps):
+        v = _level(i, steps)
+        yield (v, v, v)
+
+
+def cube_grid(levels=9):
+    for r in range(levels):
+        for g in range(levels):
+            for b in range(levels):
+                yield (_level(r, levels), _level(g, levels), _level(b, levels))
+
+
+def channel_ramps(steps=17, gray=True):
+    """Per-channel ramps from black (black itself once), optionally plus a grey ramp."""
+    yield (0, 0, 0)
+    for channel in range(3 + bool(gray)):
+        for i in range(1, steps):
+            v = _level(i, steps)
+            yield (v, v, v) if channel == 3 else tuple(v if c == channel else 0 for c in range(3))
+
+
+def from_ti1(path):
+    """Device RGB of every set in an Argyll .ti1 (or any CGATS file with RGB_R/G/B in 0-100)."""
+    with CGATSReader(path) as reader:
+        idx = reader.field_index("RGB_R", "RGB_G", "RGB_B")
+        for row in reader.rows():
+            yield tuple(int(round(float(row[i]) * 2.55)) for i in idx)
+
+
+def from_csv(path):
+    """
+    Three RGB columns per row. A header naming RGB_R/RGB_G/RGB_B means Argyll's
+    0-100 scale; R/G/B or no header means 0-255. Other columns are ignored.
+    """
+    with open(path, newline="") as f:
+        rows = csv.reader(f)
+        first = next(rows, None)
+        if first is None:
+            return
+        try:
+            values = [float(v) for v in first[:3]]
+            idx, scale = [0, 1, 2], 1.0
+            yield tuple(int(round(v)) for v in values)
+        except ValueError:
+            names = [n.strip().upper() for n in first]
+            if "RGB_R" in names:
+                idx, scale = [names.index(n) for n in ("RGB_R", "RGB_G", "RGB_B")], 2.55
+            else:
+                idx, scale = [names.index(n) for n in ("R", "G", "B")], 1.0
+        for row in rows:
+            if row:
+                yield tuple(int(round(float(row[i]) * scale)) for i in idx)
+
+
+# Macbeth-style standard colours
+MACBETH = [
+    (115, 82, 68), (194, 150, 130), (98, 122, 157), (129, 149, 65), (146, 128, 181), (121, 192, 185),
+    (214, 126, 44), (80, 91, 166), (193, 130, 140), (94, 60, 108), (157, 188, 64), (224, 163, 46),
+    (56, 61, 150), (70, 148, 73), (175, 54, 60), (231, 199, 31), (187, 86, 149), (8, 133, 161)
+]
+
+
+def standard_patches(gray=21):
+    """
+    The default run: (Macbeth + R, G, B, C, M, Y sweeps at 25-100% + grey wedge,
+    grey wedge alone). `gray` steps in the wedge.
+    """
+    sweeps = [tuple(int(c * s) for c in b)
+              for b in [(255, 0, 0), (0, 255, 0), (0, 0, 255), (0, 255, 255), (255, 0, 255), (255, 255, 0)]
+              for s in [0.25, 0.5, 0.75, 1.0]]
+    grayscale = [(int(i * 255 / (gray - 1)),) * 3 for i in range(gray)]
+    return MACBETH + sweeps + grayscale, grayscale
+
+
+def open_patch_set(spec):
+    """Returns (generator of RGB tuples, total count or None if the file does not say)."""
+    kind, _, arg = spec.partition(":")
+    if kind == "gray":
+        return gray_steps(int(arg)), int(arg)
+    if kind == "grid":
+        return cube_grid(int(arg)), int(arg) ** 3
+    if kind == "ramps":
+        return channel_ramps(int(arg)), 1 + 4 * (int(arg) - 1)
+    if not os.path.exists(spec):
+        raise ValueError(f"Unknown patch set: {spec}")
+    if spec.lower().endswith(".csv"):
+        return from_csv(spec), None
+    with CGATSReader(spec) as reader:
+        total = reader.number_of_sets
+    return from_ti1(spec), total
+
+
+def chunked(patches, size=256):
+    """Yields lists of up to `size` patches (e.g. to order each chunk for settling)."""
+    patches = iter(patches)
+    while True:
+        chunk = list(islice(patches, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+if __name__ == "__main__":
+    import sys
+    import tracemalloc
+    spec = sys.argv[1] if len(sys.argv) > 1 else "grid:13"
+    tracemalloc.start()
+    patches, total = open_patch_set(spec)
+    n = sum(len(c) for c in chunked(patches))
+    peak = tracemalloc.get_traced_memory()[1]
+    print(f"{spec}: {n} patch (perkiraan {total}), puncak memori {peak / 1024:.0f} KiB")
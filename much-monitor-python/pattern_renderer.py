@@ -0,0 +1,300 @@
+"""
+Renders the monitor test patterns as uint8 RGB arrays (H x W x 3).
+Pixel work is done with NumPy broadcasting; only text goes through PIL.
+render() caches the last few results per (pattern, width, height): the
+pattern on screen and its neighbours. A 5K frame is about 44 MB, so one-off
+renders (exports) use render_uncached().
+"""
+from functools import lru_cache
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# (Title shown in the suite, pattern key)
+CATALOGUE = [
+    # 1. Start / Alignment
+    ("Alignment & Geometry", "alignment"),
+
+    # 2. Defective Pixels (Solids)
+    ("Dead Pixels: Black", "solid:000000"),
+    ("Dead Pixels: White", "solid:FFFFFF"),
+    ("Dead Pixels: Red", "solid:FF0000"),
+    ("Dead Pixels: Green", "solid:00FF00"),
+    ("Dead Pixels: Blue", "solid:0000FF"),
+
+    # 3. Uniformity (Grays)
+    ("Uniformity: 25% Gray", "solid:404040"),
+    ("Uniformity: 50% Gray", "solid:808080"),
+    ("Uniformity: 75% Gray", "solid:C0C0C0"),
+
+    # 4. Gradients
+    ("Gradients: RGB", "rgb_gradients"),
+    ("Gradients: Grayscale", "gray_gradient"),
+
+    # 5. Sharpness
+    ("Sharpness & Text", "sharpness"),
+
+    # 6. Gamma (Simple Checkerboard)
+    ("Gamma Check (2.2)", "gamma_check"),
+
+    # --- Lagom Style Tests ---
+    ("Lagom: Black Level", "lagom_black_level"),
+    ("Lagom: White Saturation", "lagom_white_saturation"),
+    ("Lagom: Contrast Scales", "lagom_contrast"),
+    ("Lagom: Gamma Calibration", "lagom_gamma"),
+]
+
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+
+_FONT_FILES = ["Arial.ttf", "Helvetica.ttc", "DejaVuSans.ttf"]
+
+
+@lru_cache(maxsize=32)
+def _font(size):
+    for name in _FONT_FILES:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1
+        return ImageFont.load_default()
+
+
+_MEASURE = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+
+
+def _draw_texts(img, texts):
+    """
+    texts: iterable of (x, y, text, fill, size, anchor) using PIL anchors ('mm', 'la', ...).
+    Each label is drawn into a crop around its bounding box only, so text costs
+    the same at 1080p and 5K.
+    """
+    h, w = img.shape[:2]
+    for x, y, text, fill, size, anchor in texts:
+        font = _font(size)
+        left, top, right, bottom = _MEASURE.textbbox((x, y), text, font=font, anchor=anchor)
+        x1, y1 = max(0, int(left) - 1), max(0, int(top) - 1)
+        x2, y2 = min(w, int(right) + 2), min(h, int(bottom) + 2)
+        if x2 <= x1 or y2 <= y1:
+            continue
+        crop = Image.fromarray(img[y1:y2, x1:x2])
+        ImageDraw.Draw(crop).text((x - x1, y - y1), text, fill=fill, font=font, anchor=anchor)
+        img[y1:y2, x1:x2] = np.asarray(crop)
+    return img
+
+
+def _filled(width, height, rgb):
+    """Solid image; filled row-wise, which is much faster than broadcasting the last axis."""
+    img = np.empty((height, width, 3), np.uint8)
+    img.reshape(height, width * 3)[:] = np.tile(np.asarray(rgb, np.uint8), width)
+    return img
+
+
+def _ring(img, cx, cy, r, width, color):
+    """Circle outline, computed only inside its bounding box."""
+    h, w = img.shape[:2]
+    x1, x2 = max(0, cx - r - width), min(w, cx + r + width + 1)
+    y1, y2 = max(0, cy - r - width), min(h, cy + r + width + 1)
+    yy, xx = np.ogrid[y1:y2, x1:x2]
+    d2 = (xx - cx) ** 2 + (yy - cy) ** 2
+    inner, outer = max(0.0, r - width / 2) ** 2, (r + width / 2) ** 2
+    img[y1:y2, x1:x2][(d2 >= inner) & (d2 <= outer)] = color
+
+
+def _step_values(width, steps):
+    """Per-column value of a `steps`-step ramp stretched across `width` pixels."""
+    idx = (np.arange(width) * steps) // width
+    return (idx * 256 // steps).clip(0, 255).astype(np.uint8)
+
+
+def _strips(width, height, values):
+    """Three horizontal strips (R, G, B) of the per-column `values`."""
+    img = np.zeros((height, width, 3), np.uint8)
+    bounds = [0, height // 3, 2 * (height // 3), height]
+    for c in range(3):
+        img[bounds[c]:bounds[c + 1], :, c] = values
+    return img
+
+
+def render_solid(width, height, hex_color):
+    return _filled(width, height, tuple(int(hex_color[i:i + 2], 16) for i in (0, 2, 4)))
+
+
+def render_alignment(width, height):
+    img = np.zeros((height, width, 3), np.uint8)
+    w, h = width, height
+
+    # Grid lines
+    img[:, ::100] = 0x33
+    img[::100, :] = 0x33
+
+    # Center Circle
+    cx, cy = w // 2, h // 2
+    _ring(img, cx, cy, min(w, h) // 3, 2, WHITE)
+
+    # Crosshair
+    img[:, cx] = WHITE
+    img[cy, :] = WHITE
+
+    # Border
+    img[1:3, 1:w - 1] = img[h - 3:h - 1, 1:w - 1] = (255, 0, 0)
+    img[1:h - 1, 1:3] = img[1:h - 1, w - 3:w - 1] = (255, 0, 0)
+
+    # Circles in corners
+    r2 = 50
+    for x, y in [(r2, r2), (w - r2, r2), (w - r2, h - r2), (r2, h - r2)]:
+        _ring(img, x, y, r2, 1, (255, 255, 0))
+    return img
+
+
+def render_rgb_gradients(width, height):
+    return _strips(width, height, _step_values(width, 256))
+
+
+def render_gray_gradient(width, height):
+    img = np.empty((height, width, 3), np.uint8)
+    img.reshape(height, width * 3)[:] = np.repeat(_step_values(width, 256), 3)
+    return img
+
+
+def render_sharpness(width, height):
+    img = _filled(width, height, WHITE)
+    text = "The quick brown fox jumps over the lazy dog. 1234567890"
+    texts = []
+    y = 50
+    for size in [8, 10, 12, 14, 18, 24, 36, 48, 72]:
+        texts.append((width // 2, y, f"{size}px: {text}", BLACK, size, "mm"))
+        y += size + 20
+    return _draw_texts(img, texts)
+
+
+def render_gamma_check(width, height):
+    w, h = width, height
+    cx = w // 2
+    img = np.zeros((h, w, 3), np.uint8)
+
+    # 50% dither (checkerboard) on the left half, written as two alternating row templates
+    row = np.repeat((np.arange(cx) & 1) * 255, 3).astype(np.uint8).reshape(cx, 3)
+    img[0::2, :cx] = row
+    img[1::2, :cx] = 255 - row
+
+    # Solid Grays
+    grays = [128, 160, 192]
+    section_h = h // len(grays)
+    texts = [(cx // 2, 50, "Dithered 50%", (255, 0, 0), 20, "mm")]
+    for i, g in enumerate(grays):
+        y1 = i * section_h
+        y2 = (i + 1) * section_h if i < len(grays) - 1 else h
+        img[y1:y2, cx:] = g
+        texts.append((cx + 100, y1 + 50, f"Solid {g}", WHITE, 12, "mm"))
+    return _draw_texts(img, texts)
+
+
+def _square_grid(width, height, values, cols, rows, bg, outline, label_fill, title, title_fill):
+    img = _filled(width, height, bg)
+    box_w = width // (cols + 2)
+    box_h = height // (rows + 2)
+    texts = []
+    for i, v in enumerate(values[:cols * rows]):
+        r, c = divmod(i, cols)
+        x1 = box_w + c * box_w
+        y1 = box_h + r * box_h
+        x2 = x1 + box_w - 20
+        y2 = y1 + box_h - 20
+        img[y1:y2, x1:x2] = v
+        if outline is not None:
+            img[y1, x1:x2] = img[y2 - 1, x1:x2] = outline
+            img[y1:y2, x1] = img[y1:y2, x2 - 1] = outline
+        texts.append((x1 + box_w // 2, y1 + box_h // 2, str(v), label_fill, 12, "mm"))
+    texts.append((width // 2, 50, title, title_fill, 16, "mm"))
+    return _draw_texts(img, texts)
+
+
+def render_lagom_black_level(width, height):
+    return _square_grid(width, height, list(range(1, 21)), 5, 4, BLACK, WHITE, WHITE,
+                        "Black Level: Squares 1-5 might be invisible on untuned monitors.", WHITE)
+
+
+def render_lagom_white_saturation(width, height):
+    values = [200, 210, 220, 230, 240, 245, 248, 250, 251, 252, 253, 254]
+    return _square_grid(width, height, values, 4, 3, WHITE, None, BLACK,
+                        "White Saturation: Can you see 254?", BLACK)
+
+
+def render_lagom_contrast(width, height):
+    steps = 32
+    img = _strips(width, height, _step_values(width, steps))
+    strip_h = height // 3
+    step_w = width / steps
+    texts = [(int(i * step_w) + 5, strip_h - 10, str(int(i * 256 / steps)), WHITE, 12, "la")
+             for i in range(0, steps, 4)]
+    return _draw_texts(img, texts)
+
+
+LAGOM_GAMMA_STRIPS = [(1, 1, 1, "Gray"), (1, 0, 0, "Red"), (0, 1, 0, "Green"), (0, 0, 1, "Blue")]
+LAGOM_GAMMA_MARKERS = [1.8, 2.2, 2.4]
+
+
+def lagom_gamma_layout(width, height):
+    """Per strip: (x_start, x_end, solid bar x1, solid bar x2) in screen pixels."""
+    strip_w = width // len(LAGOM_GAMMA_STRIPS)
+    grad_w = int(strip_w * 0.3)
+    layout = []
+    for i in range(len(LAGOM_GAMMA_STRIPS)):
+        x_start = i * strip_w
+        cx = x_start + strip_w // 2
+        layout.append((x_start, x_start + strip_w, cx - grad_w // 2, cx + grad_w // 2 + 1))
+    return layout
+
+
+def render_lagom_gamma(width, height):
+    """Scanline dither strips (50% light) with a solid 0-255 gradient bar in each."""
+    w, h = width, height
+    img = np.zeros((h, w, 3), np.uint8)
+    ramp = (255 * np.arange(h) // h).astype(np.uint8)[:, None]  # 0 at top, 255 at bottom
+    texts = []
+    for (rf, gf, bf, name), (x0, x1, gx1, gx2) in zip(LAGOM_GAMMA_STRIPS, lagom_gamma_layout(w, h)):
+        factors = np.array([rf, gf, bf], np.uint8)
+        # 1. Dither background: every other line fully on
+        img[0::2, x0:x1] = np.tile(255 * factors, (x1 - x0, 1))
+        # 2. Solid gradient in the middle
+        img[:, gx1:gx2] = ramp[..., None] * factors
+        # 3. Markers: 0.5 = (Val / 255) ^ Gamma
+        for g in LAGOM_GAMMA_MARKERS:
+            y_pos = int(h * (0.5 ** (1 / g)))
+            img[y_pos, gx2:gx2 + 10] = WHITE
+            texts.append((gx2 + 12, y_pos, f"{g}", WHITE, 11, "lm"))
+    texts.append((w // 2, 30, "Gamma Calibration: The solid bar should blend into the stripes at 2.2", WHITE, 16, "mm"))
+    return _draw_texts(img, texts)
+
+
+_RENDERERS = {
+    "alignment": render_alignment,
+    "rgb_gradients": render_rgb_gradients,
+    "gray_gradient": render_gray_gradient,
+    "sharpness": render_sharpness,
+    "gamma_check": render_gamma_check,
+    "lagom_black_level": render_lagom_black_level,
+    "lagom_white_saturation": render_lagom_white_saturation,
+    "lagom_contrast": render_lagom_contrast,
+    "lagom_gamma": render_lagom_gamma,
+}
+
+
+def render_uncached(pattern, width, height):
+    """Returns the pattern as a new uint8 RGB array of shape (height, width, 3)."""
+    if pattern.startswith("solid:"):
+        return render_solid(width, height, pattern.split(":", 1)[1])
+    if pattern in _RENDERERS:
+        return _RENDERERS[pattern](width, height)
+    raise KeyError(f"Unknown test pattern: {pattern}")
+
+
+@lru_cache(maxsize=3)
+def render(pattern, width, height):
+    """Cached, read-only render_uncached(): the current pattern and the previous/next one."""
+    img = render_uncached(pattern, width, height)
+    img.setflags(write=False)
+    return img
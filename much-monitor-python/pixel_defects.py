@@ -0,0 +1,237 @@
+"""
+Camera-assisted dead/stuck pixel detection for the "Dead Pixels" solid tests.
+
+The red border of the alignment pattern locates the screen in the camera frame
+(a homography), then every solid pattern is captured, a median-filtered local
+background is subtracted and small isolated outliers are mapped back to screen
+pixel coordinates.
+"""
+import time
+from collections import namedtuple
+import cv2
+import numpy as np
+import pattern_renderer
+
+SOLID_PATTERNS = [key for name, key in pattern_renderer.CATALOGUE if name.startswith("Dead Pixels")]
+
+PixelDefect = namedtuple("PixelDefect", ["screen_xy", "camera_xy", "kind", "delta_rgb", "score", "area", "pattern"])
+
+
+class ScreenGeometry:
+    """Camera <-> screen mapping found from one capture of the alignment pattern."""
+    def __init__(self, camera_corners, screen_size, frame_shape, margin=4):
+        self.screen_size = screen_size
+        self.camera_corners = np.asarray(camera_corners, dtype=np.float32)
+        w, h = screen_size
+        # Corners are on the centre line of the 2 px border (pixels 1-2, centres on integers)
+        screen_corners = np.array([(1.5, 1.5), (w - 2.5, 1.5), (w - 2.5, h - 2.5), (1.5, h - 2.5)], dtype=np.float32)
+        self.to_screen = cv2.getPerspectiveTransform(self.camera_corners, screen_corners)
+        self.to_camera = np.linalg.inv(self.to_screen)
+
+        # Analysis window: bounding box of the screen, plus a mask that keeps the
+        # bezel edge (a huge "outlier" for the median filter) out of the results
+        x, y, bw, bh = cv2.boundingRect(self.camera_corners)
+        fh, fw = frame_shape[:2]
+        self.x1, self.y1 = max(0, x), max(0, y)
+        self.x2, self.y2 = min(fw, x + bw), min(fh, y + bh)
+        mask = np.zeros((self.y2 - self.y1, self.x2 - self.x1), np.uint8)
+        cv2.fillConvexPoly(mask, np.rint(self.camera_corners - (self.x1, self.y1)).astype(np.int32), 255)
+        self.mask = cv2.erode(mask, np.ones((2 * margin + 1, 2 * margin + 1), np.uint8)) > 0
+
+        # Camera pixels per screen pixel, used to size the filter and the blob limit
+        self.scale = float(np.linalg.norm(self.camera_corners[1] - self.camera_corners[0]) / (w - 4))
+
+    def crop(self, frame):
+        return frame[self.y1:self.y2, self.x1:self.x2]
+
+    def camera_to_screen(self, points):
+        pts = np.asarray(points, dtype=np.float32).reshape(-1, 1, 2)
+        return cv2.perspectiveTransform(pts, self.to_screen).reshape(-1, 2)
+
+
+def locate_screen(frame, screen_size, min_area_fraction=0.05):
+    """
+    Finds the screen in a capture of the alignment pattern via its red border.
+    Returns a ScreenGeometry, or None if the border is not visible.
+    """
+    bgr = frame.astype(np.int16)
+    b, g, r = bgr[..., 0], bgr[..., 1], bgr[..., 2]
+    red = ((r > 80) & (r - g > 50) & (r - b > 50)).astype(np.uint8) * 255
+    closed = cv2.morphologyEx(red, cv2.MORPH_CLOSE, np.ones((5, 5), np.uint8))
+
+    contours, _ = cv2.findContours(closed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    outline = max(contours, key=cv2.contourArea)
+    if cv2.contourArea(outline) < min_area_fraction * frame.shape[0] * frame.shape[1]:
+        return None
+
+    # Extreme points along the diagonals are the rough corners, keystone included
+    pts = outline.reshape(-1, 2).astype(np.float32)
+    s, d = pts.sum(axis=1), pts[:, 0] - pts[:, 1]
+    rough = np.array([pts[np.argmin(s)], pts[np.argmax(d)], pts[np.argmax(s)], pts[np.argmin(d)]])
+    return ScreenGeometry(_refine_corners(red, rough), screen_size, frame.shape)
+
+
+def _refine_corners(red, rough, band=6):
+    """
+    Sub-pixel corners: fits a line through the red pixels along each side (the
+    border's centre line) and intersects neighbouring sides.
+    """
+    ys, xs = np.nonzero(red)
+    pts = np.stack([xs, ys], axis=1).astype(np.float32)
+    lines = []
+    for i in range(4):
+        a, b = rough[i], rough[(i + 1) % 4]
+        direction = (b - a) / np.linalg.norm(b - a)
+        rel = pts - a
+        along = rel @ direction
+        across = rel[:, 0] * direction[1] - rel[:, 1] * direction[0]
+        # Stay clear of the corners, where the other side's pixels would bias the fit
+        length = np.linalg.norm(b - a)
+        keep = (np.abs(across) <= band) & (along > 0.05 * length) & (along < 0.95 * length)
+        if keep.sum() < 10:
+            return rough
+        vx, vy, x0, y0 = cv2.fitLine(pts[keep], cv2.DIST_HUBER, 0, 0.01, 0.01).ravel()
+        lines.append((np.array([x0, y0]), np.array([vx, vy])))
+
+    corners = []
+    for i in range(4):
+        (p1, d1), (p2, d2) = lines[i - 1], lines[i]
+        t = np.linalg.solve(np.stack([d1, -d2], axis=1), p2 - p1)[0]
+        corners.append(p1 + t * d1)
+    return np.array(corners, dtype=np.float32)
+
+
+def capture_average(camera, frames=4):
+    """Mean of `frames` consecutive frames (uint8), to push sensor noise below the defects."""
+    acc = None
+    n = 0
+    for _ in range(frames):
+        frame = camera.get_frame()
+        if frame is None:
+            continue
+        acc = frame.astype(np.float32) if acc is None else acc + frame
+        n += 1
+    if acc is None:
+        return None
+    return np.clip(np.rint(acc / n), 0, 255).astype(np.uint8)
+
+
+def detect_defects(frame, geometry, pattern="", threshold=6.0, min_delta=12, max_pixels=3):
+    """
+    Flags isolated outliers in a capture of a solid pattern.
+    threshold: in robust sigmas (MAD of the background residual) per channel.
+    min_delta: minimum absolute deviation in 8-bit levels.
+    max_pixels: blobs larger than this many screen pixels (dust, mura) are ignored.
+    """
+    roi = geometry.crop(frame)
+    ksize = max(5, int(3 * geometry.scale) * 2 + 1)
+    residual = roi.astype(np.int16) - cv2.medianBlur(roi, ksize)
+
+    # Robust noise scale from a sparse sample of the screen area
+    sample = residual[::4, ::4][geometry.mask[::4, ::4]]
+    sigma = np.maximum(1.4826 * np.median(np.abs(sample), axis=0), 0.5)
+    score = (np.abs(residual) / sigma.astype(np.float32)).max(axis=2)
+    hits = (score > threshold) & (np.abs(residual).max(axis=2) >= min_delta) & geometry.mask
+
+    count, labels, stats, centroids = cv2.connectedComponentsWithStats(hits.astype(np.uint8), connectivity=8)
+    max_area = max(4, int(round(max_pixels * geometry.scale ** 2 * 2)))
+    defects = []
+    for i in range(1, count):
+        area = stats[i, cv2.CC_STAT_AREA]
+        if area > max_area:
+            continue
+        x, y, bw, bh = stats[i, :4]
+        blob = labels[y:y + bh, x:x + bw] == i
+        delta = residual[y:y + bh, x:x + bw][blob].mean(axis=0)[::-1]  # -> RGB
+        cx, cy = centroids[i][0] + geometry.x1, centroids[i][1] + geometry.y1
+        sx, sy = geometry.camera_to_screen([(cx, cy)])[0]
+        defects.append(PixelDefect(
+            screen_xy=(int(round(sx)), int(round(sy))),
+            camera_xy=(float(cx), float(cy)),
+            kind="stuck" if delta.sum() > 0 else "dead",
+            delta_rgb=tuple(float(v) for v in delta),
+            score=float(score[y:y + bh, x:x + bw][blob].max()),
+            area=int(area),
+            pattern=pattern,
+        ))
+    return defects
+
+
+def merge_defects(defects, radius=1.5):
+    """Groups detections of the same screen pixel across patterns: [(screen_xy, [PixelDefect, ...])]."""
+    groups = []
+    for d in sorted(defects, key=lambda d: -d.score):
+        for xy, members in groups:
+            if abs(xy[0] - d.screen_xy[0]) <= radius and abs(xy[1] - d.screen_xy[1]) <= radius:
+                members.append(d)
+                break
+        else:
+            groups.append((d.screen_xy, [d]))
+    return sorted(groups, key=lambda g: (g[0][1], g[0][0]))
+
+
+def capture_geometry(camera, show_pattern, screen_size, settle=0.5, frames=4):
+    """Shows the alignment pattern and locates the screen in the camera frame (or None)."""
+    show_pattern("alignment")
+    time.sleep(settle)
+    frame = capture_average(camera, frames)
+    geometry = locate_screen(frame, screen_size) if frame is not None else None
+    if geometry is None:
+        print("Layar tidak ditemukan (border merah pola alignment tidak terlihat).")
+    else:
+        print(f"Layar ditemukan: {geometry.scale:.2f} px kamera per px layar")
+    return geometry
+
+
+def run_defect_sweep(camera, show_pattern, screen_size, patterns=SOLID_PATTERNS, settle=0.5, frames=4):
+    """
+    Full automated sweep. `show_pattern(key)` must put the pattern on screen (and
+    tell the camera via set_displayed_image). Returns merged defects, or None when
+    the screen could not be located.
+    """
+    geometry = capture_geometry(camera, show_pattern, screen_size, settle, frames)
+    if geometry is None:
+        return None
+    if geometry.scale < 1.0:
+        print("Warning: Kamera terlalu jauh, piksel tunggal mungkin tidak terdeteksi.")
+
+    found = []
+    for pattern in patterns:
+        show_pattern(pattern)
+        time.sleep(settle)
+        frame = capture_average(camera, frames)
+        if frame is None:
+            print(f"Warning: Tidak ada frame untuk {pattern}")
+            continue
+        t0 = time.perf_counter()
+        defects = detect_defects(frame, geometry, pattern)
+        print(f"{pattern}: {len(defects)} kandidat ({(time.perf_counter() - t0) * 1000:.0f} ms)")
+        found.extend(defects)
+    return merge_defects(found)
+
+
+if __name__ == "__main__":
+    # Simulated sweep with known defects injected into the panel
+    from camera_handler import CameraHandler
+    from camera_simulator import SimulatedCamera, SimulatedCapture, SimulatedDisplay
+
+    screen = (1280, 720)
+    truth = {(100, 80): (0, 0, 0), (640, 360): (255, 255, 255), (1001, 500): (255, 0, 0), (333, 650): (0, 0, 0)}
+    sim = SimulatedCapture(SimulatedDisplay(resolution=screen, defects=truth),
+                           SimulatedCamera(width=1920, height=1080, noise_sigma=2.0))
+    handler = CameraHandler(backend=sim)
+    handler.start()
+
+    def show(pattern):
+        handler.set_displayed_image(pattern_renderer.render(pattern, *screen))
+
+    t0 = time.perf_counter()
+    merged = run_defect_sweep(handler, show, screen, settle=0.0)
+    handler.stop()
+    print(f"Sweep selesai dalam {time.perf_counter() - t0:.2f}s")
+    for xy, members in merged or []:
+        kinds = ", ".join(f"{m.kind}@{m.pattern}" for m in members)
+        print(f"  piksel {xy}: {kinds}")
+    print(f"Ground truth: {sorted(truth)}")
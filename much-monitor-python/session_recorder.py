@@ -0,0 +1,189 @@
+import os
+import struct
+import time
+import numpy as np
+
+# File layout: 64-byte header followed by fixed-size records
+# (timestamp f8, displayed patch 3 x i2, frame H x W x C u1).
+MAGIC = b"MMSESS01"
+HEADER_FMT = "<8sIII"
+HEADER_SIZE = 64
+GROW_RECORDS = 64
+
+
+def record_dtype(frame_shape):
+    return np.dtype([
+        ("timestamp", "<f8"),
+        ("patch", "<i2", (3,)),
+        ("frame", "u1", tuple(frame_shape)),
+    ])
+
+
+def _read_header(path):
+    with open(path, "rb") as f:
+        magic, h, w, c = struct.unpack(HEADER_FMT, f.read(struct.calcsize(HEADER_FMT)))
+    if magic != MAGIC:
+        raise ValueError(f"Not a session recording: {path}")
+    return (h, w, c)
+
+
+class SessionRecorder:
+    """
+    Appends every captured frame, its timestamp and the patch on screen to a
+    memory-mapped file. The file grows in chunks and is trimmed on close; a
+    crashed session keeps every record written before the crash.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._dtype = None
+        self._map = None
+        self._capacity = 0
+
+    def _open(self, frame_shape):
+        if len(frame_shape) == 2:
+            frame_shape = (*frame_shape, 1)
+        self._dtype = record_dtype(frame_shape)
+        with open(self.path, "wb") as f:
+            f.write(struct.pack(HEADER_FMT, MAGIC, *frame_shape).ljust(HEADER_SIZE, b"\0"))
+        self._grow()
+
+    def _grow(self):
+        if self._map is not None:
+            self._map.flush()
+            self._map = None
+        self._capacity += GROW_RECORDS
+        with open(self.path, "r+b") as f:
+            f.truncate(HEADER_SIZE + self._capacity * self._dtype.itemsize)
+        self._map = np.memmap(self.path, dtype=self._dtype, mode="r+", offset=HEADER_SIZE, shape=(self._capacity,))
+
+    def append(self, frame, patch=None, timestamp=None):
+        if self._dtype is None:
+            self._open(frame.shape)
+        if self.count >= self._capacity:
+            self._grow()
+        rec = self._map[self.count]
+        rec["timestamp"] = time.time() if timestamp is None else timestamp
+        rec["patch"] = patch if patch is not None else (-1, -1, -1)
+        rec["frame"] = frame.reshape(self._dtype["frame"].shape)
+        self.count += 1
+
+    def close(self):
+        if self._map is None:
+            return
+        self._map.flush()
+        self._map = None
+        with open(self.path, "r+b") as f:
+            f.truncate(HEADER_SIZE + self.count * self._dtype.itemsize)
+
+
+class SessionReplay:
+    """
+    Feeds a recorded session back as a cv2.VideoCapture-like backend for
+    CameraHandler. Frames are read straight from the memory map (no copy of
+    the file into RAM). With `realtime=True` frames are paced by their
+    recorded timestamps, otherwise they are served as fast as they are read.
+    """
+    def __init__(self, path, realtime=False, loop=False):
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+        self.frame_shape = _read_header(path)
+        dtype = record_dtype(self.frame_shape)
+        n = (os.path.getsize(path) - HEADER_SIZE) // dtype.itemsize
+        records = np.memmap(path, dtype=dtype, mode="r", offset=HEADER_SIZE, shape=(n,)) if n else np.zeros(0, dtype)
+
+        # Unused tail of a crashed recording has zero timestamps
+        valid = np.flatnonzero(records["timestamp"] > 0)
+        self.records = records[:valid[-1] + 1] if len(valid) else records[:0]
+        self.timestamps = self.records["timestamp"]
+        self.patches = self.records["patch"]
+        self.position = 0
+        self._opened = False
+        self._clock_base = None
+
+    def __len__(self):
+        return len(self.records)
+
+    def isOpened(self):
+        return self._opened
+
+    def start(self):
+        self._opened = len(self.records) > 0
+        self.position = 0
+        self._clock_base = None
+        return self._opened
+
+    def release(self):
+        self._opened = False
+
+    def set_patch(self, rgb):
+        """
+        Jumps to the next frame recorded while `rgb` was on screen, searching from
+        the start of the recording when it only appears earlier (patches replayed
+        in another order). Warns and stays put when `rgb` was never recorded.
+        """
+        hits = np.flatnonzero(np.all(self.patches == np.asarray(rgb), axis=1))
+        if not len(hits):
+            print(f"Warning: patch {tuple(rgb)} tidak ada di rekaman {self.path}")
+            return
+        ahead = hits[hits >= self.position]
+        self.position = int(ahead[0] if len(ahead) else hits[0])
+        self._clock_base = None
+
+    def read(self, image=None):
+        if not self._opened:
+            return False, None
+        if self.position >= len(self.records):
+            if not self.loop:
+                return False, None
+            self.position = 0
+            self._clock_base = None
+
+        if self.realtime:
+            now = time.monotonic()
+            if self._clock_base is None:
+                self._clock_base = now - self.timestamps[self.position]
+            wait = self.timestamps[self.position] + self._clock_base - now
+            if wait > 0:
+                time.sleep(wait)
+
+        frame = self.records[self.position]["frame"]
+        self.position += 1
+        if frame.shape[2] == 1:
+            frame = frame[..., 0]
+        if image is not None:
+            np.copyto(image, frame)
+            frame = image
+        return True, frame
+
+    def get(self, prop):
+        import cv2
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.frame_shape[1])
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.frame_shape[0])
+        if prop == cv2.CAP_PROP_FPS and len(self.timestamps) > 1:
+            return float((len(self.timestamps) - 1) / (self.timestamps[-1] - self.timestamps[0]))
+        return 0.0
+
+    def set(self, prop, value):
+        return False
+
+    def frames_for_patch(self, rgb):
+        """Every frame recorded while `rgb` was displayed (a view when they are contiguous)."""
+        idx = np.flatnonzero(np.all(self.patches == np.asarray(rgb), axis=1))
+        if len(idx) and idx[-1] - idx[0] + 1 == len(idx):
+            return self.records["frame"][idx[0]:idx[-1] + 1]
+        return self.records["frame"][idx]
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 2:
+        print("Usage: python session_recorder.py <session.mmsess>")
+        sys.exit(1)
+    replay = SessionReplay(sys.argv[1])
+    duration = replay.timestamps[-1] - replay.timestamps[0] if len(replay) else 0
+    unique = np.unique(replay.patches, axis=0) if len(replay) else []
+    print(f"{len(replay)} frames {replay.frame_shape}, {duration:.1f}s, {len(unique)} distinct patches")
@@ -17,6 +17,9 @@ class SimpleICCGenerator:
         self.red_xyz = (0.4360, 0.2225, 0.0139)
         self.green_xyz = (0.3851, 0.7169, 0.0971)
         self.blue_xyz = (0.1431, 0.0606, 0.7139)
+
+        # Media black point; ideal black unless measured
+        self.black_xyz = (0.0, 0.0, 0.0)
         
     def set_white_point(self, xyz):
         """Set measured media white point."""
@@ -28,6 +31,10 @@ class SimpleICCGenerator:
         self.green_xyz = g
         self.blue_xyz = b
         
+    def set_black_point(self, xyz):
+        """Set measured media black point (same scale as the white point)."""
+        self.black_xyz = xyz
+
     def set_gamma(self, gamma):
         self.gamma = gamma
         
@@ -49,8 +56,8 @@ class SimpleICCGenerator:
         wtpt_data = self._make_xyz_number(self.d50_xyz)
         tags.append(('wtpt', wtpt_data))
         
-        # 4. 'bkpt' - Media Black Point (Optional, typically 0,0,0)
-        bkpt_data = self._make_xyz_number((0,0,0))
+        # 4. 'bkpt' - Media Black Point (measured if set_black_point was called)
+        bkpt_data = self._make_xyz_number(self.black_xyz)
         tags.append(('bkpt', bkpt_data))
         
         # 5. rXYZ, gXYZ, bXYZ - Primary Matrix
@@ -0,0 +1,222 @@
+"""
+Screen uniformity from one wide capture per gray level.
+
+The screen is located with the alignment pattern (see pixel_defects), every
+camera pixel is assigned to a zone of an M x N grid once, and zone means for a
+whole frame are then a single bincount. Each zone is reported as luminance
+relative to the centre zone and CIEDE2000 difference from the centre.
+Without a flat field the camera's own lens falloff reads as non-uniformity;
+capture_flat_field records one per camera (cached next to its response).
+"""
+import os
+import time
+import cv2
+import numpy as np
+from color_math import SRGB_TO_XYZ, srgb_to_linear, xyz_to_lab, delta_e_2000
+from pixel_defects import capture_average, capture_geometry
+from camera_response import CameraResponse
+
+UNIFORMITY_LEVELS = (64, 128, 192)  # the "Uniformity: 25/50/75% Gray" solids
+
+
+class ZoneMap:
+    """Zone index (or -1) for every camera pixel inside the screen, for a rows x cols grid."""
+    def __init__(self, geometry, grid=(5, 5), fill=0.6):
+        self.geometry = geometry
+        self.rows, self.cols = grid
+        w, h = geometry.screen_size
+        crop_h, crop_w = geometry.y2 - geometry.y1, geometry.x2 - geometry.x1
+        yy, xx = np.mgrid[geometry.y1:geometry.y2, geometry.x1:geometry.x2]
+        screen = geometry.camera_to_screen(np.stack([xx.ravel(), yy.ravel()], axis=1))
+
+        # Position inside the zone in [0, 1); only the central `fill` part is measured
+        zx, zy = screen[:, 0] / (w / self.cols), screen[:, 1] / (h / self.rows)
+        col, row = np.floor(zx).astype(int), np.floor(zy).astype(int)
+        margin = (1.0 - fill) / 2
+        inside = ((col >= 0) & (col < self.cols) & (row >= 0) & (row < self.rows)
+                  & (np.abs(zx - col - 0.5) < 0.5 - margin) & (np.abs(zy - row - 0.5) < 0.5 - margin))
+        self.labels = np.where(inside, row * self.cols + col, -1).reshape(crop_h, crop_w)
+        self._valid = self.labels.ravel() >= 0
+        self._index = self.labels.ravel()[self._valid]
+        self.counts = np.bincount(self._index, minlength=self.rows * self.cols)
+
+    def zone_means(self, values):
+        """values: (crop_h, crop_w, C) -> (rows, cols, C) zone means."""
+        flat = values.reshape(-1, values.shape[-1])[self._valid]
+        sums = np.stack([np.bincount(self._index, weights=flat[:, c], minlength=self.counts.size)
+                         for c in range(flat.shape[1])], axis=1)
+        return (sums / np.maximum(self.counts, 1)[:, None]).reshape(self.rows, self.cols, -1)
+
+
+def linearize_frame(frame_bgr, response=None):
+    """uint8 BGR frame -> float32 linear RGB, through the camera response if one is characterized."""
+    if response is not None:
+        return response.linearize(frame_bgr)
+    lut = srgb_to_linear(np.arange(256) / 255.0).astype(np.float32)
+    return lut[frame_bgr[..., ::-1]]
+
+
+def analyze_uniformity(frames, zones, levels, response=None, flat_field=None):
+    """
+    frames: one BGR capture per gray level. flat_field: optional camera-frame gain
+    map (H x W) of the lens falloff; without it vignetting reads as non-uniformity.
+    Returns a dict with per-zone relative luminance, delta E and a per-level summary.
+    """
+    g = zones.geometry
+    zone_xyz = []
+    for frame in frames:
+        linear = linearize_frame(g.crop(frame), response)
+        if flat_field is not None:
+            ff = g.crop(np.asarray(flat_field, dtype=np.float32))
+            linear = linear / (ff[..., None] if ff.ndim == 2 else ff)
+        zone_xyz.append(zones.zone_means(linear) @ SRGB_TO_XYZ.T)
+    zone_xyz = np.array(zone_xyz)                                  # (L, rows, cols, 3)
+
+    cr, cc = zones.rows // 2, zones.cols // 2
+    centre = zone_xyz[:, cr, cc]                                    # (L, 3)
+    white = centre[np.argmax(centre[:, 1])]
+    luminance = zone_xyz[..., 1] / centre[:, None, None, 1]
+    lab = xyz_to_lab(zone_xyz, white)
+    delta_e = delta_e_2000(lab, lab[:, cr:cr + 1, cc:cc + 1])
+
+    summary = []
+    for i, level in enumerate(levels):
+        dev = np.abs(luminance[i] - 1.0)
+        worst = np.unravel_index(np.argmax(delta_e[i]), delta_e[i].shape)
+        summary.append({
+            "level": level,
+            "max_luminance_deviation": float(dev.max() * 100),
+            "mean_delta_e": float(delta_e[i].sum() / (delta_e[i].size - 1)),
+            "max_delta_e": float(delta_e[i].max()),
+            "worst_zone": (int(worst[0]), int(worst[1])),
+        })
+    return {
+        "grid": (zones.rows, zones.cols),
+        "levels": list(levels),
+        "luminance": luminance,
+        "delta_e": delta_e,
+        "summary": summary,
+        "flat_field_corrected": flat_field is not None,
+    }
+
+
+def flat_field_path(camera_name, resolution):
+    directory, name = os.path.split(CameraResponse.cache_path(camera_name, resolution))
+    return os.path.join(directory, "flat_" + os.path.splitext(name)[0] + ".npy")
+
+
+def capture_flat_field(camera, frames=16, blur=0.03, save=True):
+    """
+    Lens falloff (H x W, 1.0 at the brightest) of the camera looking at an evenly
+    lit diffuser, e.g. white paper held over the lens towards an even light. The
+    luminance is blurred by `blur` x the frame width to smooth out the diffuser's
+    texture. Cached per camera + resolution.
+    """
+    frame = capture_average(camera, frames)
+    if frame is None:
+        return None
+    y = linearize_frame(frame, camera.response) @ SRGB_TO_XYZ[1].astype(np.float32)
+    y = cv2.GaussianBlur(y, (0, 0), max(blur * y.shape[1], 1.0))
+    if y.max() <= 0:
+        return None
+    flat = y / y.max()
+    if save:
+        path = flat_field_path(camera.camera_name, camera.get_resolution())
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.save(path, flat)
+        print(f"Flat field disimpan: {path}")
+    return flat
+
+
+def load_flat_field(camera):
+    """Cached flat field of this camera + resolution, or None."""
+    path = flat_field_path(camera.camera_name, camera.get_resolution())
+    if not os.path.exists(path):
+        return None
+    flat = np.load(path)
+    width, height = camera.get_resolution()
+    return flat if flat.shape == (int(height), int(width)) else None
+
+
+def measure_uniformity(camera, show_pattern, screen_size, levels=UNIFORMITY_LEVELS, grid=(5, 5),
+                       settle=0.5, frames=4, flat_field=None, geometry=None):
+    """
+    Locates the screen (unless `geometry` is given), captures each gray level once
+    and analyzes all zones. `show_pattern(key)` is the same callback as for the
+    pixel defect sweep. Returns the analyze_uniformity dict, or None.
+    """
+    geometry = geometry or capture_geometry(camera, show_pattern, screen_size, settle, frames)
+    if geometry is None:
+        return None
+    zones = ZoneMap(geometry, grid)
+
+    captures = []
+    for v in levels:
+        show_pattern(f"solid:{v:02X}{v:02X}{v:02X}")
+        time.sleep(settle)
+        frame = capture_average(camera, frames)
+        if frame is None:
+            print(f"Warning: Tidak ada frame untuk level {v}")
+            return None
+        captures.append(frame)
+    return analyze_uniformity(captures, zones, levels, camera.response, flat_field)
+
+
+def render_heatmap(result, path=None, cell=110, max_delta_e=4.0):
+    """
+    BGR heat map of delta E from centre, one panel per gray level, with delta E
+    and luminance deviation printed in each zone. Written to `path` when given.
+    """
+    rows, cols = result["grid"]
+    panels = []
+    for i, level in enumerate(result["levels"]):
+        de = result["delta_e"][i]
+        scale = np.clip(de / max(max_delta_e, float(de.max())) * 255, 0, 255).astype(np.uint8)
+        heat = cv2.applyColorMap(cv2.resize(scale, (cols * cell, rows * cell), interpolation=cv2.INTER_NEAREST),
+                                 cv2.COLORMAP_JET)
+        for r in range(rows):
+            for c in range(cols):
+                x, y = c * cell + 8, r * cell + cell // 2
+                lum = (result["luminance"][i, r, c] - 1.0) * 100
+                for text, ty in ((f"dE {de[r, c]:.1f}", y - 6), (f"{lum:+.1f}%", y + 16)):
+                    # Dark outline keeps the label readable on every colour of the map
+                    cv2.putText(heat, text, (x, ty), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 3, cv2.LINE_AA)
+                    cv2.putText(heat, text, (x, ty), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1, cv2.LINE_AA)
+        title = np.zeros((36, cols * cell, 3), np.uint8)
+        s = result["summary"][i]
+        note = "" if result.get("flat_field_corrected") else " (no flat field)"
+        cv2.putText(title, f"Level {level}: max dE {s['max_delta_e']:.2f}, max dL {s['max_luminance_deviation']:.1f}%{note}",
+                    (8, 24), cv2.FONT_HERSHEY_SIMPLEX, 0.55, (255, 255, 255), 1, cv2.LINE_AA)
+        panels.append(np.vstack([title, heat]))
+        panels.append(np.zeros((rows * cell + 36, 10, 3), np.uint8))
+    img = np.hstack(panels[:-1])
+    if path:
+        cv2.imwrite(path, img)
+    return img
+
+
+if __name__ == "__main__":
+    # Simulated panel with a slightly bluish, darker edge
+    from camera_handler import CameraHandler
+    from camera_simulator import SimulatedCamera, SimulatedCapture, SimulatedDisplay
+    import pattern_renderer
+
+    screen = (1280, 720)
+    sim = SimulatedCapture(SimulatedDisplay(resolution=screen, edge_falloff=(0.12, 0.12, 0.06)),
+                           SimulatedCamera(width=1920, height=1080))
+    handler = CameraHandler(backend=sim)
+    handler.start()
+
+    def show(pattern):
+        handler.set_displayed_image(pattern_renderer.render(pattern, *screen))
+
+    t0 = time.perf_counter()
+    # The simulator knows its own lens falloff; a real setup would use a flat-field capture
+    result = measure_uniformity(handler, show, screen, settle=0.0, flat_field=sim.camera.vignette[..., 0])
+    handler.stop()
+    print(f"5x5 x {len(result['levels'])} level selesai dalam {time.perf_counter() - t0:.2f}s")
+    for s in result["summary"]:
+        print(f"  Level {s['level']}: max dL {s['max_luminance_deviation']:.1f}%, "
+              f"mean dE {s['mean_delta_e']:.2f}, max dE {s['max_delta_e']:.2f} di zona {s['worst_zone']}")
+    render_heatmap(result, "uniformity_heatmap.png")
+    print("Heat map: uniformity_heatmap.png")
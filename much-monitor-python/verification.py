@@ -0,0 +1,141 @@
+"""
+Verification on held-out patches, stopped as soon as the grade is settled.
+
+The CCM's error on its own fitting samples is training error. After the model
+is built, patches it has not seen are measured in random order and corrected
+with the CCM; their errors (same encoded-RGB units as the grade) feed one
+Wald SPRT per grade limit L:
+  H0: mean error = L - d  vs  H1: mean error = L + d,  d = margin * L
+  log LR = (2 d / sigma^2) * sum(e_i - L)
+with sigma the running standard deviation. The limits are ordered, so
+"below L" settles every higher limit and "above L" every lower one; the run
+stops once each limit is settled, with `max_patches` as a cap.
+"""
+import numpy as np
+from calibration_logic import GRADE_LIMITS, GRADES, grade_for
+from patch_scheduler import default_pool
+
+
+class SequentialVerifier:
+    """
+    Call next_patch(), measure it and pass the capture to add() (or skip(rgb)
+    if the capture failed) until next_patch() returns None, then result().
+    Verified samples are not added to the logic's fitting samples.
+    """
+    def __init__(self, logic, pool=None, limits=GRADE_LIMITS, alpha=0.05, beta=0.05, margin=0.15,
+                 min_patches=6, max_patches=40, sigma_floor=0.5, seed=0):
+        self.logic = logic
+        if logic.ccm_fit is None:
+            logic.compute_ccm()
+        self.limits = np.asarray(limits, dtype=float)
+        self.upper = np.log((1 - beta) / alpha)   # accept H1: above the limit
+        self.lower = np.log(beta / (1 - alpha))   # accept H0: below the limit
+        self.margin = margin
+        self.min_patches = min_patches
+        self.max_patches = max_patches
+        self.sigma_floor = sigma_floor
+        measured = set(tuple(r['target']) for r in logic.results)
+        candidates = [p for p in dict.fromkeys(default_pool(5) if pool is None else pool) if tuple(p) not in measured]
+        order = np.random.default_rng(seed).permutation(len(candidates))
+        self.queue = [tuple(candidates[i]) for i in order]
+        self.targets = []
+        self.errors = []
+        self.stop_reason = None
+
+    def skip(self, rgb):
+        pass  # already taken off the queue
+
+    def add(self, rgb, captured):
+        """Error (encoded RGB, as in the grade) of the CCM on one held-out capture."""
+        corrected = self.logic.apply_ccm(captured)
+        error = float(np.linalg.norm(np.asarray(rgb, dtype=float) - corrected))
+        self.targets.append(tuple(rgb))
+        self.errors.append(error)
+        return error
+
+    def log_likelihood_ratios(self):
+        errors = np.asarray(self.errors)
+        sigma = max(float(np.std(errors, ddof=1)) if len(errors) > 1 else 0.0, self.sigma_floor)
+        delta = self.margin * self.limits
+        return 2 * delta / sigma ** 2 * (errors.sum() - len(errors) * self.limits)
+
+    def decisions(self):
+        """Per limit: -1 settled below, +1 settled above, 0 open (ordering applied)."""
+        if len(self.errors) < self.min_patches:
+            return np.zeros(len(self.limits), dtype=int)
+        llr = self.log_likelihood_ratios()
+        above = llr >= self.upper
+        below = llr <= self.lower
+        # Above a limit means above every lower one; below means below every higher one
+        above = np.maximum.accumulate(above[::-1])[::-1]
+        below = np.maximum.accumulate(below)
+        return np.where(above & ~below, 1, np.where(below & ~above, -1, 0))
+
+    def settled(self):
+        return bool(np.all(self.decisions() != 0))
+
+    def next_patch(self):
+        if self.settled():
+            self.stop_reason = "settled"
+            return None
+        if len(self.errors) >= self.max_patches:
+            self.stop_reason = "max_patches"
+            return None
+        if not self.queue:
+            self.stop_reason = "pool_exhausted"
+            return None
+        return self.queue.pop(0)
+
+    def result(self):
+        """Verification summary: the grade counts the limits settled above (the mean decides if unsettled)."""
+        if not self.errors:
+            return None
+        avg = float(np.mean(self.errors))
+        decisions = self.decisions()
+        grade, desc = GRADES[int(np.sum(decisions > 0))] if np.all(decisions != 0) else grade_for(avg)
+        return {
+            "patches": len(self.errors),
+            "avg": avg,
+            "max": float(np.max(self.errors)),
+            "grade": grade,
+            "description": desc,
+            "settled": bool(np.all(decisions != 0)),
+            "decisions": decisions.tolist(),
+            "stop_reason": self.stop_reason,
+            "targets": self.targets,
+            "errors": self.errors,
+        }
+
+
+if __name__ == "__main__":
+    from calibration_logic import CalibrationLogic
+    from color_math import srgb_to_linear, linear_to_srgb
+    from patch_scheduler import PatchScheduler
+
+    def simulate(noise, bias, rng):
+        def capture(rgb):
+            linear = srgb_to_linear(np.array(rgb) / 255.0)
+            mixed = linear ** (1.0 + bias) @ np.array([[0.92, 0.05, 0.01], [0.06, 0.90, 0.04], [0.02, 0.05, 0.95]])
+            return tuple(np.clip(linear_to_srgb(mixed) * 255 + rng.normal(0, noise, 3), 0, 255))
+        return capture
+
+    for noise, bias in ((0.5, 0.0), (2.0, 0.05), (3.0, 0.25)):
+        rng = np.random.default_rng(1)
+        capture = simulate(noise, bias, rng)
+        logic = CalibrationLogic()
+        scheduler = PatchScheduler(logic)
+        while True:
+            rgb = scheduler.next_patch()
+            if rgb is None:
+                break
+            logic.record_sample(rgb, capture(rgb))
+        training = logic.get_performance_metrics()
+        verifier = SequentialVerifier(logic)
+        while True:
+            rgb = verifier.next_patch()
+            if rgb is None:
+                break
+            verifier.add(rgb, capture(rgb))
+        result = verifier.result()
+        print(f"noise {noise}, bias {bias}: training {training['avg_corrected']:.2f} ({training['grade']}), "
+              f"verified {result['avg']:.2f} ({result['grade']}) after {result['patches']} patch [{result['stop_reason']}]")